@@ -1,53 +1,282 @@
 import os
-import openai
+import time
+import asyncio
+import contextvars
 from dotenv import load_dotenv
 
+from embeddings import EmbeddingBatcher, get_embeddings, get_embeddings_sync
+from completion_cache import get_default_cache, make_cache_key
+from llm_client import AsyncLLMClient, create_backend, get_default_client
+from project_analyzer import ProjectAnalyzer
+from prompt_budget import (PROMPT_CHUNK_TOKENS, PROMPT_MAX_INPUT_TOKENS, BudgetReport, count_tokens, dedupe_lines,
+                           fit_to_budget, normalize_whitespace, split_chunks)
+from rate_limiter import create_scheduler
+from server.database.cache import project_analysis_key
+from server.metrics import observe_llm_call
+
 load_dotenv()
 
+SUMMARIZE_TEMPLATE = "Summarize the following text: {}"
+COMBINE_SUMMARIES_TEMPLATE = "Combine these partial summaries into one summary: {}"
+
 class AgentGPT:
-    def __init__(self, api_key):
-        openai.api_key = api_key
+    def __init__(self, api_key, cache=None, max_input_tokens=PROMPT_MAX_INPUT_TOKENS):
+        self.api_key = api_key
+        self.cache = cache if cache is not None else get_default_cache()
+        self.max_input_tokens = max_input_tokens
+
+    @property
+    def openai(self):
+        # Imported on first use: the openai package (and aiohttp under it) adds ~200ms to startup
+        import openai
+        openai.api_key = self.api_key
+        return openai
+
+    def _cache_lookup(self, model, messages, params):
+        # Every helper runs at temperature=0, so identical prompts give identical answers
+        if self.cache is None:
+            return None, None
+        key = make_cache_key(model, messages, params)
+        return key, self.cache.get(key)
+
+    def build_prompt(self, template, text, model="gpt-3.5-turbo", report=None):
+        """Fill `template` ("...{}") with `text`, compacted so the prompt fits max_input_tokens."""
+        budget = self.max_input_tokens - count_tokens(template.format(""), model)
+        prompt = template.format(fit_to_budget(text, budget, model, report))
+        if report is not None:
+            report.prompt_tokens += count_tokens(prompt, model)
+        return prompt
 
     def get_completion(self, prompt, model="gpt-3.5-turbo"):
         messages = [{"role": "user", "content": prompt}]
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=messages,
-            temperature=0,
-        )
-        return response.choices[0].message["content"]
+        key, cached = self._cache_lookup(model, messages, {"temperature": 0})
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
+        try:
+            response = self.openai.ChatCompletion.create(
+                model=model,
+                messages=messages,
+                temperature=0,
+            )
+        except Exception:
+            observe_llm_call("chat", model, "failed", time.perf_counter() - started)
+            raise
+        usage = response.get("usage", {})
+        observe_llm_call("chat", model, "completed", time.perf_counter() - started,
+                         usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        content = response.choices[0].message["content"]
+        if key is not None:
+            self.cache.set(key, content)
+        return content
 
     def get_embedding(self, text, model="text-embedding-ada-002"):
         text = text.replace("\n", " ")
-        return openai.Embedding.create(input=[text], model=model)['data'][0]['embedding']
+        return self.openai.Embedding.create(input=[text], model=model)['data'][0]['embedding']
+
+    def get_embeddings(self, texts, model="text-embedding-ada-002"):
+        return get_embeddings_sync(self.openai.Embedding.create, texts, model=model)
 
     def process_task(self, task):
-        prompt = f"Process the following task: {task}"
+        prompt = self.build_prompt("Process the following task: {}", task)
         return self.get_completion(prompt)
 
     def answer_question(self, question):
-        prompt = f"Answer the following question: {question}"
+        prompt = self.build_prompt("Answer the following question: {}", question)
         return self.get_completion(prompt)
 
     def generate_code(self, description):
-        prompt = f"Generate code for the following description: {description}"
+        prompt = self.build_prompt("Generate code for the following description: {}", description)
         return self.get_completion(prompt)
 
     def analyze_data(self, data):
-        prompt = f"Analyze the following data: {data}"
+        prompt = self.build_prompt("Analyze the following data: {}", data)
         return self.get_completion(prompt)
 
     def summarize_text(self, text):
-        prompt = f"Summarize the following text: {text}"
+        prompt = self.build_prompt(SUMMARIZE_TEMPLATE, text)
         return self.get_completion(prompt)
 
     def generate_ideas(self, topic):
-        prompt = f"Generate ideas related to the following topic: {topic}"
+        prompt = self.build_prompt("Generate ideas related to the following topic: {}", topic)
         return self.get_completion(prompt)
 
     def explain_concept(self, concept):
-        prompt = f"Explain the following concept in simple terms: {concept}"
+        prompt = self.build_prompt("Explain the following concept in simple terms: {}", concept)
         return self.get_completion(prompt)
 
-# Initialize the agent
-agent = AgentGPT(api_key=os.getenv("OPENAI_API_KEY"))
\ No newline at end of file
+class AsyncAgentGPT(AgentGPT):
+    # Same prompt helpers as AgentGPT; they return awaitables because the two
+    # primitives below are coroutines, so the event loop is never blocked.
+    def __init__(self, api_key=None, client=None, cache=None, max_input_tokens=PROMPT_MAX_INPUT_TOKENS):
+        if client is None and api_key:
+            client = AsyncLLMClient(create_backend(api_key), scheduler=create_scheduler())
+        elif client is None:
+            client = get_default_client()
+        self.client = client
+        self.cache = cache if cache is not None else get_default_cache()
+        self.max_input_tokens = max_input_tokens
+        self._batchers = {}
+
+    async def get_completion(self, prompt, model="gpt-3.5-turbo"):
+        messages = [{"role": "user", "content": prompt}]
+        key, cached = self._cache_lookup(model, messages, {"temperature": 0})
+        if cached is not None:
+            return cached
+        content = await self._complete(prompt, model)
+        if key is not None:
+            self.cache.set(key, content)
+        return content
+
+    async def _complete(self, prompt, model="gpt-3.5-turbo"):
+        response = await self.client.chat_completion([{"role": "user", "content": prompt}], model=model, temperature=0)
+        return response["choices"][0]["message"]["content"]
+
+    async def stream_completion(self, prompt, model="gpt-3.5-turbo"):
+        """Yield the completion in chunks; a cached answer comes back as a single chunk."""
+        messages = [{"role": "user", "content": prompt}]
+        key, cached = self._cache_lookup(model, messages, {"temperature": 0})
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        async for chunk in self.client.stream_chat_completion(messages, model=model, temperature=0):
+            parts.append(chunk)
+            yield chunk
+        # Only a stream that ran to the end is cached
+        if key is not None:
+            self.cache.set(key, "".join(parts))
+
+    async def stream_chunked(self, template, text, model="gpt-3.5-turbo", chunk_tokens=PROMPT_CHUNK_TOKENS, report=None):
+        """Run `template` over `text` split into chunks that each fit one prompt.
+
+        Yields ("chunk", {"index", "total", "content"}) events in input order as the
+        completions arrive (they run concurrently, bounded by the client), then
+        ("done", report). Text that fits one prompt is sent whole as a single chunk.
+        """
+        report = report if report is not None else BudgetReport(model)
+        budget = min(chunk_tokens, self.max_input_tokens - count_tokens(template.format(""), model))
+        tokens = count_tokens(text, model)
+        report.input_tokens += tokens
+        if tokens <= budget:
+            chunks = [text]
+        else:
+            chunks = split_chunks(dedupe_lines(normalize_whitespace(text)), budget, model)
+        prompts = [template.format(chunk) for chunk in chunks]
+        report.chunks += len(prompts)
+        report.prompt_tokens += sum(count_tokens(prompt, model) for prompt in prompts)
+        pending = [asyncio.ensure_future(self.get_completion(prompt, model)) for prompt in prompts]
+        try:
+            for index, future in enumerate(pending):
+                content = await future
+                report.record_output(content)
+                yield "chunk", {"index": index, "total": len(pending), "content": content}
+        finally:
+            # A client that disconnects mid-stream should not keep the remaining chunks running
+            for future in pending:
+                future.cancel()
+        yield "done", report.as_dict()
+
+    async def summarize_long_text(self, text, model="gpt-3.5-turbo"):
+        """Summarize text of any length: chunk summaries are merged by one more call. Returns (summary, report)."""
+        report = BudgetReport(model)
+        parts = []
+        async for event, data in self.stream_chunked(SUMMARIZE_TEMPLATE, text, model, report=report):
+            if event == "chunk":
+                parts.append(data["content"])
+        if len(parts) == 1:
+            return parts[0], report.as_dict()
+        prompt = self.build_prompt(COMBINE_SUMMARIES_TEMPLATE, "\n\n".join(parts), model)
+        report.prompt_tokens += count_tokens(prompt, model)
+        summary = await self.get_completion(prompt, model)
+        report.record_output(summary)
+        return summary, report.as_dict()
+
+    async def get_embedding(self, text, model="text-embedding-ada-002"):
+        # Concurrent single-text calls are coalesced into one upstream request
+        batcher = self._batchers.get(model)
+        if batcher is None:
+            batcher = self._batchers[model] = EmbeddingBatcher(self.client, model=model)
+        return await batcher.embed(text)
+
+    async def get_embeddings(self, texts, model="text-embedding-ada-002"):
+        return await get_embeddings(self.client, texts, model=model)
+
+class ADAPTAgent(AsyncAgentGPT):
+    def __init__(self, api_key=None, client=None, db_manager=None, cache=None):
+        super().__init__(api_key=api_key, client=client, cache=cache)
+        self.db_manager = db_manager
+        # The analyzer caches every call under a content hash itself, so it gets the uncached primitive
+        self.analyzer = ProjectAnalyzer(self._complete, cache=self.cache)
+
+    async def _run_db(self, func, *args):
+        # Await AsyncDatabaseManager directly; run a synchronous DatabaseManager off the event loop
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args)
+        loop = asyncio.get_running_loop()
+        # Copy the context so the request's correlation id reaches log records written in the thread
+        return await loop.run_in_executor(None, contextvars.copy_context().run, func, *args)
+
+    async def process_query(self, query, user_id):
+        response = await self.answer_question(query)
+        return {"query": query, "response": response}
+
+    async def stream_query(self, query, user_id):
+        """Streaming process_query: yields ("token", {"content": text}) events, then ("done", {...})."""
+        async for chunk in self.stream_completion(self.build_prompt("Answer the following question: {}", query)):
+            yield "token", {"content": chunk}
+        yield "done", {"query": query}
+
+    async def create_task(self, project_id, description, user_id):
+        plan = await self.process_task(description)
+        result = {"project_id": project_id, "description": description, "plan": plan}
+        if self.db_manager is not None:
+            title = description.strip().splitlines()[0][:100] if description.strip() else "Agent task"
+            task = await self._run_db(self.db_manager.create_task, title, plan, user_id, project_id)
+            result["task_id"] = task.id
+        return result
+
+    async def stream_create_task(self, project_id, description, user_id):
+        """Streaming create_task: yields the plan as ("token", {"content": text}) events; the task is
+        saved once the plan is complete and its id is sent in the final ("done", {...})."""
+        parts = []
+        async for chunk in self.stream_completion(self.build_prompt("Process the following task: {}", description)):
+            parts.append(chunk)
+            yield "token", {"content": chunk}
+        result = {"project_id": project_id, "description": description}
+        if self.db_manager is not None:
+            title = description.strip().splitlines()[0][:100] if description.strip() else "Agent task"
+            task = await self._run_db(self.db_manager.create_task, title, "".join(parts), user_id, project_id)
+            result["task_id"] = task.id
+        yield "done", result
+
+    async def analyze_project(self, project_id, progress=None):
+        if self.db_manager is None:
+            raise RuntimeError("ADAPTAgent.analyze_project requires a db_manager")
+        result_cache = getattr(self.db_manager, "cache", None)
+        if result_cache is None:
+            return await self._analyze_project(project_id, progress)
+        # The database managers drop this entry whenever the project's tasks or knowledge change
+        return await result_cache.aget_or_set(project_analysis_key(project_id),
+                                              lambda: self._analyze_project(project_id, progress))
+
+    async def _analyze_project(self, project_id, progress=None):
+        project = await self._run_db(self.db_manager.get_project_by_id, project_id)
+        if project is None:
+            return {"project_id": project_id, "analysis": None}
+        tasks, knowledge = await asyncio.gather(
+            self._run_db(self.db_manager.get_tasks_by_project, project_id),
+            self._run_db(self.db_manager.get_knowledge_by_project, project_id),
+        )
+        analysis, stats = await self.analyzer.analyze(project, tasks, knowledge, progress)
+        return {"project_id": project_id, "analysis": analysis, "stats": stats}
+
+_agent = None
+
+
+def get_agent():
+    """Return the shared synchronous agent, creating it on first use."""
+    global _agent
+    if _agent is None:
+        _agent = AgentGPT(api_key=os.getenv("OPENAI_API_KEY"))
+    return _agent
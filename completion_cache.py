@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "1024"))
+COMPLETION_CACHE_TTL_SECONDS = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "86400"))
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH")
+COMPLETION_CACHE_MAX_DISK_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_DISK_ENTRIES", "100000"))
+# A disk hit only rewrites the entry's access time once it is this old, so most reads stay reads
+COMPLETION_CACHE_TOUCH_SECONDS = float(os.getenv("COMPLETION_CACHE_TOUCH_SECONDS", "300"))
+# Also keep completions in the shared result cache (server.database.cache) so workers reuse each other's answers
+COMPLETION_CACHE_SHARED = os.getenv("COMPLETION_CACHE_SHARED", "false").lower() == "true"
+SHARED_KEY_PREFIX = "completion:"
+
+
+def make_cache_key(model, messages, params=None):
+    # Leading and trailing whitespace never changes a temperature=0 answer in practice,
+    # so strip it; whitespace inside the content (code, tables) is kept verbatim.
+    normalized = {
+        "model": model,
+        "messages": [{"role": m["role"], "content": m["content"].strip()} for m in messages],
+        "params": params or {},
+    }
+    payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheTier:
+    """Completions on disk, trimmed to `max_entries` least recently used rows.
+
+    Counting and trimming the table happens once every `evict_every` writes
+    (1% of `max_entries` by default), so the table may briefly hold that many
+    extra rows; other processes sharing the file write to it too, so a local
+    row counter could not be trusted. Access times used for the LRU order are
+    only refreshed on hits once older than `touch_after` seconds.
+    """
+
+    def __init__(self, path, max_entries=COMPLETION_CACHE_MAX_DISK_ENTRIES, evict_every=None,
+                 touch_after=COMPLETION_CACHE_TOUCH_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_after = touch_after
+        self.evict_every = evict_every or max(1, max_entries // 100)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completion_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_completion_cache_accessed_at ON completion_cache (accessed_at)")
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM completion_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM completion_cache WHERE key = ?", (key,))
+                return None
+            if now - accessed_at >= self.touch_after:
+                self._conn.execute("UPDATE completion_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+
+    def set(self, key, value, expires_at, now):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completion_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM completion_cache WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM completion_cache").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM completion_cache WHERE key IN "
+                "(SELECT key FROM completion_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completion_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CompletionCache:
+    """Tiered (in-memory LRU, optional shared cache, optional SQLite) cache for deterministic completions."""
+
+    def __init__(self, max_entries=COMPLETION_CACHE_MAX_ENTRIES, ttl=COMPLETION_CACHE_TTL_SECONDS,
+                 path=None, max_disk_entries=COMPLETION_CACHE_MAX_DISK_ENTRIES, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.shared = shared
+        self.disk = SQLiteCacheTier(path, max_disk_entries) if path else None
+        self.hits = 0
+        self.shared_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+        if self.shared is not None:
+            value = self.shared.get(SHARED_KEY_PREFIX + key)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.shared_hits += 1
+                    self._store(key, value, now + self.ttl)
+                return value
+        if self.disk is not None:
+            value = self.disk.get(key, now)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store(key, value, now + self.ttl)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now + self.ttl)
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY_PREFIX + key, value, self.ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, now + self.ttl, now)
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every tier's entries, including the shared tier's for every worker."""
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.invalidate_prefix(SHARED_KEY_PREFIX)
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None and COMPLETION_CACHE_ENABLED:
+        shared = None
+        if COMPLETION_CACHE_SHARED:
+            from server.database.database_manager import get_db_manager
+            shared = get_db_manager().cache
+        _default_cache = CompletionCache(path=COMPLETION_CACHE_PATH, shared=shared)
+    return _default_cache
@@ -0,0 +1 @@
+# Puts the repository root on sys.path so tests import `server.*` like the app and benchmarks do
@@ -0,0 +1,160 @@
+import asyncio
+import os
+
+import numpy as np
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "512"))
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "100000"))
+EMBEDDING_BATCH_WAIT_SECONDS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")) / 1000
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; good enough for batching
+    return len(text) // 4 + 1
+
+
+def chunk_texts(texts, max_batch_size=EMBEDDING_MAX_BATCH_SIZE, max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS):
+    """Yield (start_index, texts) chunks that respect the item and token limits."""
+    start = 0
+    chunk = []
+    chunk_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if chunk and (len(chunk) >= max_batch_size or chunk_tokens + tokens > max_batch_tokens):
+            yield start, chunk
+            start, chunk, chunk_tokens = i, [], 0
+        chunk.append(text)
+        chunk_tokens += tokens
+    if chunk:
+        yield start, chunk
+
+
+def _fill_matrix(matrix, start, response):
+    for item in response["data"]:
+        matrix[start + item["index"]] = item["embedding"]
+
+
+def _empty_matrix():
+    return np.empty((0, 0), dtype=np.float32)
+
+
+async def get_embeddings(client, texts, model=EMBEDDING_MODEL, max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+                         max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS):
+    """Embed `texts` with as few upstream calls as possible; returns a (n, dim) float32 matrix."""
+    texts = [text.replace("\n", " ") for text in texts]
+    if not texts:
+        return _empty_matrix()
+    chunks = list(chunk_texts(texts, max_batch_size, max_batch_tokens))
+    responses = await asyncio.gather(*(client.embedding(chunk, model=model) for _, chunk in chunks))
+    dim = len(responses[0]["data"][0]["embedding"])
+    matrix = np.empty((len(texts), dim), dtype=np.float32)
+    for (start, _), response in zip(chunks, responses):
+        _fill_matrix(matrix, start, response)
+    return matrix
+
+
+def get_embeddings_sync(create, texts, model=EMBEDDING_MODEL, max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+                        max_batch_tokens=EMBEDDING_MAX_BATCH_TOKENS):
+    # `create` is a synchronous callable such as openai.Embedding.create
+    texts = [text.replace("\n", " ") for text in texts]
+    if not texts:
+        return _empty_matrix()
+    matrix = None
+    for start, chunk in chunk_texts(texts, max_batch_size, max_batch_tokens):
+        response = create(input=chunk, model=model)
+        if matrix is None:
+            matrix = np.empty((len(texts), len(response["data"][0]["embedding"])), dtype=np.float32)
+        _fill_matrix(matrix, start, response)
+    return matrix
+
+
+def _cancel_pending(batch):
+    for _, future in batch:
+        if not future.done():
+            future.cancel()
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embedding calls into one upstream request."""
+
+    def __init__(self, client, model=EMBEDDING_MODEL, max_batch_size=EMBEDDING_MAX_BATCH_SIZE,
+                 max_wait=EMBEDDING_BATCH_WAIT_SECONDS):
+        self.client = client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        # Flushes in flight; the event loop only keeps weak references to tasks
+        self._flushes = set()
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text):
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self.requests += 1
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        batch = []
+        try:
+            while True:
+                batch = [await queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # Flush in the background so the next batch starts collecting immediately
+                task = loop.create_task(self._flush(batch))
+                self._flushes.add(task)
+                task.add_done_callback(self._flushes.discard)
+                batch = []
+        except BaseException:
+            # Stopped (aclose, loop shutdown): callers still collecting or queued would wait forever
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            _cancel_pending(batch)
+            raise
+
+    async def _flush(self, batch):
+        self.batches += 1
+        try:
+            matrix = await get_embeddings(self.client, [text for text, _ in batch], model=self.model)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        except BaseException:
+            _cancel_pending(batch)
+            raise
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(matrix[i])
+
+    async def aclose(self):
+        tasks = list(self._flushes)
+        if self._worker is not None:
+            tasks.append(self._worker)
+            self._worker = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
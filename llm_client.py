@@ -0,0 +1,463 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+
+import httpx
+
+from prompt_budget import count_tokens
+from rate_limiter import (LLM_RATE_LIMIT_RETRIES, RequestDropped, TokenBucket, create_scheduler,
+                          retry_after_from_headers)
+from server.metrics import observe_llm_call
+
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+class LLMRateLimitError(LLMError):
+    """The upstream answered 429; `retry_after` is how long it asked us to wait, in seconds."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMDeadlineExceeded(LLMError):
+    """Dropped by the rate-limit scheduler: the call could not be sent before its deadline."""
+
+
+class OpenAIBackend:
+    """Talks to the OpenAI REST API over a single pooled httpx.AsyncClient."""
+
+    def __init__(self, api_key, base_url=OPENAI_API_BASE, timeout=LLM_TIMEOUT_SECONDS,
+                 connect_timeout=LLM_CONNECT_TIMEOUT_SECONDS, max_connections=LLM_MAX_CONNECTIONS):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections)
+        self._client = None
+        # Called with (model, headers) for every response, e.g. RateLimitScheduler.update_from_headers
+        self.rate_limit_listener = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+        return self._client
+
+    def _check_response(self, model, response):
+        if self.rate_limit_listener is not None:
+            self.rate_limit_listener(model, response.headers)
+        if response.status_code == 429:
+            raise LLMRateLimitError(f"OpenAI rate limit for {model}: {response.text}",
+                                    retry_after_from_headers(response.headers))
+
+    async def _post(self, path, payload):
+        response = await self._get_client().post(path, json=payload)
+        self._check_response(payload["model"], response)
+        if response.status_code >= 400:
+            raise LLMError(f"OpenAI request to {path} failed with {response.status_code}: {response.text}")
+        return response.json()
+
+    async def chat(self, model, messages, **params):
+        return await self._post("/chat/completions", {"model": model, "messages": messages, **params})
+
+    async def embed(self, model, inputs):
+        return await self._post("/embeddings", {"model": model, "input": inputs})
+
+    async def stream_chat(self, model, messages, **params):
+        # Leaving the `async with` early (generator closed or cancelled) drops the
+        # connection, which makes OpenAI stop generating for this request.
+        payload = {"model": model, "messages": messages, **params, "stream": True}
+        async with self._get_client().stream("POST", "/chat/completions", json=payload) as response:
+            if response.status_code >= 400:
+                await response.aread()
+            self._check_response(model, response)
+            if response.status_code >= 400:
+                raise LLMError(f"OpenAI stream request failed with {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                content = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeLLMBackend:
+    """Offline stand-in that answers deterministically after a fixed latency."""
+
+    def __init__(self, latency=0.05, embedding_dim=1536, token_latency=0.01, prompt_token_latency=0.0,
+                 max_completion_words=None, requests_per_minute=None, tokens_per_minute=None, burst_seconds=1.0):
+        # chat() takes latency + prompt tokens * prompt_token_latency (prefill), so long prompts are slower;
+        # max_completion_words caps the echoed answer the way max_tokens would.
+        # With requests_per_minute / tokens_per_minute set it enforces quotas like OpenAI: calls over
+        # them fail with LLMRateLimitError, and every answer reports x-ratelimit-* headers.
+        self.latency = latency
+        self.embedding_dim = embedding_dim
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.max_completion_words = max_completion_words
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self._quotas = {}
+        self.calls = 0
+        self.rate_limited = 0
+        self.streams_cancelled = 0
+        self.rate_limit_listener = None
+
+    def _check_quota(self, model, tokens):
+        if self.requests_per_minute is None and self.tokens_per_minute is None:
+            return
+        if model not in self._quotas:
+            self._quotas[model] = {
+                kind: TokenBucket(limit / 60, limit / 60 * self.burst_seconds)
+                for kind, limit in (("requests", self.requests_per_minute), ("tokens", self.tokens_per_minute))
+                if limit is not None
+            }
+        buckets = self._quotas[model]
+        cost = {"requests": 1, "tokens": tokens}
+        now = time.monotonic()
+        wait = max(bucket.wait_time(cost[kind], now) for kind, bucket in buckets.items())
+        if wait <= 0:
+            for kind, bucket in buckets.items():
+                bucket.consume(cost[kind], now)
+        headers = {}
+        for kind, bucket in buckets.items():
+            level = bucket.available(now)
+            headers[f"x-ratelimit-limit-{kind}"] = str(round(bucket.rate * 60))
+            headers[f"x-ratelimit-remaining-{kind}"] = str(max(0, int(level)))
+            headers[f"x-ratelimit-reset-{kind}"] = f"{max(0.0, bucket.capacity - level) / bucket.rate:.3f}s"
+        if wait > 0:
+            self.rate_limited += 1
+            headers["retry-after"] = f"{wait:.3f}"
+        if self.rate_limit_listener is not None:
+            self.rate_limit_listener(model, headers)
+        if wait > 0:
+            raise LLMRateLimitError(f"Fake rate limit for {model}", wait)
+
+    async def chat(self, model, messages, **params):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        self._check_quota(model, count_tokens(prompt, model) + params.get("max_tokens", 0))
+        await asyncio.sleep(self.latency + (len(prompt) // 4) * self.prompt_token_latency)
+        content = f"[{model}] {prompt}"
+        if self.max_completion_words is not None:
+            content = " ".join(content.split()[:self.max_completion_words])
+        return {
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(content.split()),
+                      "total_tokens": len(prompt.split()) + len(content.split())},
+        }
+
+    async def stream_chat(self, model, messages, **params):
+        # Same answer as chat(), one word per chunk: `latency` to the first token, then `token_latency` each
+        self.calls += 1
+        self._check_quota(model, count_tokens(messages[-1]["content"], model) + params.get("max_tokens", 0))
+        finished = False
+        try:
+            await asyncio.sleep(self.latency)
+            words = f"[{model}] {messages[-1]['content']}".split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(self.token_latency)
+                yield word if i == len(words) - 1 else word + " "
+            finished = True
+        finally:
+            if not finished:
+                self.streams_cancelled += 1
+
+    async def embed(self, model, inputs):
+        self.calls += 1
+        self._check_quota(model, sum(count_tokens(text, model) for text in inputs))
+        await asyncio.sleep(self.latency)
+        return {
+            "model": model,
+            "data": [{"index": i, "embedding": fake_embedding(text, self.embedding_dim)} for i, text in enumerate(inputs)],
+        }
+
+    async def aclose(self):
+        pass
+
+
+def fake_embedding(text, dim):
+    # Expand a SHA-256 digest into `dim` floats in [-1, 1) so equal texts get equal vectors
+    values = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend((b - 128) / 128.0 for b in digest)
+        counter += 1
+    return values[:dim]
+
+
+def create_backend(api_key=None, backend=None):
+    backend = backend or LLM_BACKEND
+    if backend == "fake":
+        return FakeLLMBackend()
+    if backend == "openai":
+        return OpenAIBackend(api_key or os.getenv("OPENAI_API_KEY"))
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+class StreamStats:
+    """Outcome counts and time-to-first-token / duration samples for streamed completions."""
+
+    def __init__(self, max_samples=4096):
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.chunks = 0
+        self._ttft = deque(maxlen=max_samples)
+        self._durations = deque(maxlen=max_samples)
+
+    def record_first_token(self, seconds):
+        self._ttft.append(seconds)
+
+    def record_end(self, outcome, seconds):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        self._durations.append(seconds)
+
+    @staticmethod
+    def _percentile(samples, p):
+        samples = sorted(samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def stats(self):
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "ttft_p50_ms": round(self._percentile(self._ttft, 50) * 1000, 1),
+            "ttft_p99_ms": round(self._percentile(self._ttft, 99) * 1000, 1),
+            "duration_p50_ms": round(self._percentile(self._durations, 50) * 1000, 1),
+        }
+
+
+class AsyncLLMClient:
+    """Bounds concurrent upstream calls per process and enforces an overall timeout.
+
+    With a `scheduler` (rate_limiter.RateLimitScheduler) every call first waits
+    for upstream quota; a call the upstream still answers with 429 is re-queued
+    up to `rate_limit_retries` times, within the same deadline.
+    """
+
+    def __init__(self, backend, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT_SECONDS, scheduler=None,
+                 rate_limit_retries=LLM_RATE_LIMIT_RETRIES):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.rate_limit_retries = rate_limit_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.stream_stats = StreamStats()
+        if scheduler is not None:
+            backend.rate_limit_listener = scheduler.update_from_headers
+
+    def _estimate_tokens(self, model, messages, params):
+        completion = params.get("max_tokens") or self.scheduler.expected_completion_tokens
+        return sum(count_tokens(m["content"], model) for m in messages) + completion
+
+    async def _admit(self, model, tokens, attempt, error=None):
+        """Wait for quota before attempt number `attempt`; re-raises `error` (a 429) once retries run out."""
+        if self.scheduler is None:
+            if error is not None:
+                raise error
+            return
+        if error is not None:
+            self.scheduler.rate_limited(model, error.retry_after)
+            if attempt > self.rate_limit_retries:
+                raise error
+        try:
+            await self.scheduler.acquire(model, tokens)
+        except RequestDropped as e:
+            raise LLMDeadlineExceeded(str(e)) from e
+
+    async def _call(self, operation, model, coro_factory, tokens=0):
+        attempt, error = 0, None
+        while True:
+            await self._admit(model, tokens, attempt, error)
+            try:
+                return await self._send(operation, model, coro_factory)
+            except LLMRateLimitError as e:
+                attempt, error = attempt + 1, e
+
+    async def _send(self, operation, model, coro_factory):
+        async with self._semaphore:
+            self.in_flight += 1
+            started = time.perf_counter()
+            outcome = "failed"
+            usage = {}
+            try:
+                response = await asyncio.wait_for(coro_factory(), self.timeout)
+                outcome = "completed"
+                usage = response.get("usage") or {}
+                return response
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise LLMTimeoutError(f"LLM call exceeded {self.timeout}s")
+            except LLMRateLimitError:
+                outcome = "rate_limited"
+                raise
+            finally:
+                self.in_flight -= 1
+                observe_llm_call(operation, model, outcome, time.perf_counter() - started,
+                                 usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+
+    async def chat_completion(self, messages, model="gpt-3.5-turbo", **params):
+        tokens = self._estimate_tokens(model, messages, params) if self.scheduler is not None else 0
+        return await self._call("chat", model, lambda: self.backend.chat(model, messages, **params), tokens)
+
+    async def embedding(self, inputs, model="text-embedding-ada-002"):
+        tokens = sum(count_tokens(text, model) for text in inputs) if self.scheduler is not None else 0
+        return await self._call("embedding", model, lambda: self.backend.embed(model, inputs), tokens)
+
+    async def stream_chat_completion(self, messages, model="gpt-3.5-turbo", **params):
+        """Yield completion text chunks as the upstream produces them.
+
+        The upstream is read only as fast as the caller consumes chunks, so a slow
+        client applies backpressure instead of buffering the answer here; closing
+        the generator (e.g. on client disconnect) cancels the upstream call. The
+        concurrency slot is held for the whole stream. For OpenAI the timeout
+        applies per read (httpx), not to the whole stream. A 429 is retried only
+        before the first chunk.
+        """
+        tokens = self._estimate_tokens(model, messages, params) if self.scheduler is not None else 0
+        attempt, error = 0, None
+        while True:
+            await self._admit(model, tokens, attempt, error)
+            stream = self._stream(model, messages, params)
+            started = False
+            try:
+                async for chunk in stream:
+                    started = True
+                    yield chunk
+                return
+            except LLMRateLimitError as e:
+                if started:
+                    raise
+                attempt, error = attempt + 1, e
+            finally:
+                await stream.aclose()
+
+    async def _stream(self, model, messages, params):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.stream_stats.started += 1
+            started = time.perf_counter()
+            outcome = "cancelled"
+            parts = []
+            stream = self.backend.stream_chat(model, messages, **params)
+            try:
+                async for chunk in stream:
+                    if not parts:
+                        self.stream_stats.record_first_token(time.perf_counter() - started)
+                    parts.append(chunk)
+                    self.stream_stats.chunks += 1
+                    yield chunk
+                outcome = "completed"
+            except Exception:
+                outcome = "failed"
+                raise
+            finally:
+                await stream.aclose()
+                self.in_flight -= 1
+                self.stream_stats.record_end(outcome, time.perf_counter() - started)
+                # Streamed responses carry no usage, so tokens are counted locally
+                observe_llm_call("stream", model, outcome, time.perf_counter() - started,
+                                 sum(count_tokens(m["content"], model) for m in messages),
+                                 count_tokens("".join(parts), model) if parts else 0)
+
+    async def aclose(self):
+        if self.scheduler is not None:
+            await self.scheduler.aclose()
+        await self.backend.aclose()
+
+
+_default_client = None
+
+
+def get_default_client(api_key=None):
+    # One client per process so every agent shares the same connection pool and limiter
+    global _default_client
+    if _default_client is None:
+        _default_client = AsyncLLMClient(create_backend(api_key), scheduler=create_scheduler())
+    return _default_client
+
+
+async def close_default_client():
+    global _default_client
+    if _default_client is not None:
+        await _default_client.aclose()
+        _default_client = None
+
+
+async def benchmark_throughput(client, total_requests=500, concurrency=64):
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(i)
+    latencies = []
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            await client.chat_completion([{"role": "user", "content": f"benchmark request {i}"}])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "max_concurrency": client.max_concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total_requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    async def _main():
+        for limit in (1, 8, 32):
+            client = AsyncLLMClient(FakeLLMBackend(latency=0.05), max_concurrency=limit)
+            print(await benchmark_throughput(client, total_requests=200))
+
+    asyncio.run(_main())
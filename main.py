@@ -1,6 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from server.api_routes import router
+from server.logging_config import configure_logging
+
+configure_logging()
+
 app = FastAPI()
 
 # CORS middleware setup
@@ -12,6 +17,8 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+app.include_router(router)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to ADAPT-Agent-GPT API"}
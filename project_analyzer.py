@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import os
+import time
+
+from prompt_budget import count_tokens, truncate_tokens
+
+ANALYSIS_SINGLE_PROMPT_TOKENS = int(os.getenv("ANALYSIS_SINGLE_PROMPT_TOKENS", "3000"))
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "1500"))
+ANALYSIS_MAX_PARALLEL = int(os.getenv("ANALYSIS_MAX_PARALLEL", "8"))
+
+# Part of every cache key; bump it when the prompts below change so old summaries are not reused
+SUMMARY_PROMPT_VERSION = "1"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def task_line(task):
+    return f"- [{task.status}] {task.title}: {task.description or ''}"
+
+
+def knowledge_line(knowledge):
+    return f"- ({knowledge.tags or 'untagged'}) {knowledge.content}"
+
+
+def chunk_lines(lines, max_tokens=ANALYSIS_CHUNK_TOKENS, target_items=None, model="gpt-3.5-turbo"):
+    """Split lines into chunks of at most `max_tokens` (a longer line is truncated).
+
+    Besides the token limit, a chunk also ends after any line whose hash is 0
+    mod `target_items`. Because those boundaries depend on content rather than
+    position, editing, adding or removing a line only changes the chunks around
+    it and the cached summaries of all other chunks stay valid. By default
+    `target_items` aims at half the budget, so most chunks end on a content
+    boundary rather than the token limit. Tokens are counted for `model`.
+    """
+    counts = [count_tokens(line, model) for line in lines]
+    if target_items is None:
+        average_tokens = max(1.0, sum(counts) / len(lines)) if lines else 1
+        target_items = max(2, int(max_tokens / 2 / average_tokens))
+    chunks, chunk, chunk_tokens = [], [], 0
+    for line, tokens in zip(lines, counts):
+        if tokens > max_tokens:
+            line = truncate_tokens(line, max_tokens, model)
+            tokens = count_tokens(line, model)
+        if chunk and chunk_tokens + tokens > max_tokens:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+        chunk.append(line)
+        chunk_tokens += tokens
+        if int(content_hash(line)[:8], 16) % target_items == 0:
+            chunks.append(chunk)
+            chunk, chunk_tokens = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class ProjectAnalyzer:
+    """Analyzes a project's tasks and linked knowledge, map-reduce style when they don't fit one prompt.
+
+    Map: chunks are summarized concurrently (at most `max_parallel` at once).
+    Reduce: summaries are merged in groups until they fit one prompt, which
+    produces the analysis. Every completion is cached under a hash of its
+    prompt, so re-analysis only recomputes the chunks that changed and the
+    merges above them.
+
+    `complete` is a coroutine function taking a prompt and returning the text.
+    """
+
+    def __init__(self, complete, cache=None, model="gpt-3.5-turbo", single_prompt_tokens=ANALYSIS_SINGLE_PROMPT_TOKENS,
+                 chunk_tokens=ANALYSIS_CHUNK_TOKENS, target_items=None, max_parallel=ANALYSIS_MAX_PARALLEL):
+        self.complete = complete
+        self.cache = cache
+        self.model = model
+        self.single_prompt_tokens = single_prompt_tokens
+        self.chunk_tokens = chunk_tokens
+        self.target_items = target_items
+        self.max_parallel = max_parallel
+
+    async def _cached_completion(self, prompt, stats):
+        key = f"analysis:{SUMMARY_PROMPT_VERSION}:{self.model}:{content_hash(prompt)}"
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                stats["cached_calls"] += 1
+                return cached
+        result = await self.complete(prompt)
+        stats["llm_calls"] += 1
+        if self.cache is not None:
+            self.cache.set(key, result)
+        return result
+
+    async def _bounded_map(self, prompts, stats, on_done=None):
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def run(prompt):
+            async with semaphore:
+                result = await self._cached_completion(prompt, stats)
+            if on_done is not None:
+                on_done()
+            return result
+
+        return await asyncio.gather(*(run(prompt) for prompt in prompts))
+
+    def _groups(self, summaries):
+        # Greedy groups within the chunk budget, at least two summaries each so every level shrinks
+        groups, group, group_tokens = [], [], 0
+        for summary in summaries:
+            tokens = count_tokens(summary, self.model)
+            if len(group) >= 2 and group_tokens + tokens > self.chunk_tokens:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(summary)
+            group_tokens += tokens
+        if group:
+            if len(group) == 1 and groups:
+                groups[-1].append(group[0])
+            else:
+                groups.append(group)
+        return groups
+
+    async def analyze(self, project, tasks, knowledge=(), progress=None):
+        """Returns (analysis, stats)."""
+        started = time.perf_counter()
+        stats = {"mode": "single", "chunks": 0, "levels": 0, "llm_calls": 0, "cached_calls": 0}
+        header = f"Project: {project.name}\nDescription: {project.description or ''}"
+        task_lines = [task_line(t) for t in tasks]
+        knowledge_lines = [knowledge_line(k) for k in knowledge]
+
+        data = header + "\nTasks:\n" + "\n".join(task_lines)
+        if knowledge_lines:
+            data += "\nKnowledge:\n" + "\n".join(knowledge_lines)
+        if count_tokens(data, self.model) <= self.single_prompt_tokens:
+            analysis = await self._cached_completion(f"Analyze the following data: {data}", stats)
+            stats["seconds"] = round(time.perf_counter() - started, 3)
+            return analysis, stats
+
+        stats["mode"] = "map_reduce"
+        prompts = []
+        for label, lines in (("tasks", task_lines), ("knowledge entries", knowledge_lines)):
+            for chunk in chunk_lines(lines, self.chunk_tokens, self.target_items, self.model):
+                prompts.append(f"Summarize the following {label} of project {project.name}, keeping statuses, "
+                               f"blockers, risks and key facts:\n" + "\n".join(chunk))
+        stats["chunks"] = len(prompts)
+        done = 0
+
+        def chunk_done():
+            nonlocal done
+            done += 1
+            if progress is not None:
+                progress(80 * done // len(prompts))
+
+        summaries = await self._bounded_map(prompts, stats, chunk_done)
+        while len(summaries) > 1 and count_tokens("\n\n".join(summaries), self.model) > self.single_prompt_tokens:
+            stats["levels"] += 1
+            summaries = await self._bounded_map(
+                [f"Combine these partial summaries of project {project.name} into one summary:\n\n" + "\n\n".join(g)
+                 for g in self._groups(summaries)],
+                stats,
+            )
+        if progress is not None:
+            progress(90)
+        analysis = await self._cached_completion(
+            f"Analyze the following data: {header}\nSummaries:\n" + "\n\n".join(summaries), stats
+        )
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        return analysis, stats
@@ -0,0 +1,196 @@
+import os
+import re
+import time
+from collections import Counter
+
+from embeddings import estimate_tokens
+
+PROMPT_MAX_INPUT_TOKENS = int(os.getenv("PROMPT_MAX_INPUT_TOKENS", "3000"))
+PROMPT_CHUNK_TOKENS = int(os.getenv("PROMPT_CHUNK_TOKENS", "2000"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+_encodings = {}
+
+
+def _encoding(model):
+    # tiktoken is optional; without it token counts fall back to estimate_tokens
+    if model not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model] = None
+        else:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except KeyError:
+                _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    encoding = _encoding(model)
+    if encoding is None:
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        cut = text[:max(0, max_tokens - 1) * 4]
+        # Prefer ending on a word boundary when there is one nearby
+        space = cut.rfind(" ", len(cut) - 40)
+        return cut[:space] if space > 0 else cut
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def normalize_whitespace(text):
+    """Collapse runs of spaces within lines and of blank lines between them."""
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def dedupe_lines(text):
+    """Drop repeated non-blank lines (case-insensitive), keeping the first occurrence."""
+    seen = set()
+    kept = []
+    for line in text.splitlines():
+        key = line.strip().lower()
+        if key:
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def split_sentences(text):
+    sentences = []
+    for paragraph in text.splitlines():
+        sentences.extend(s for s in _SENTENCE_END.split(paragraph.strip()) if s)
+    return sentences
+
+
+def extractive_summary(text, max_tokens, model="gpt-3.5-turbo"):
+    """Keep the sentences richest in the text's frequent words, in their original order, within `max_tokens`."""
+    sentences = split_sentences(text)
+    words = [[w for w in _WORD.findall(s.lower()) if len(w) > 3] for s in sentences]
+    frequency = Counter(w for sentence_words in words for w in sentence_words)
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: sum(frequency[w] for w in words[i]) / (len(words[i]) or 1),
+        reverse=True,
+    )
+    chosen, used = [], 0
+    for i in ranked:
+        tokens = count_tokens(sentences[i], model) + 1
+        if used + tokens <= max_tokens:
+            chosen.append(i)
+            used += tokens
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def _hard_split(text, max_tokens, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        size = max(1, max_tokens - 1) * 4
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    tokens = encoding.encode(text)
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def split_chunks(text, max_tokens, model="gpt-3.5-turbo"):
+    """Split text into chunks of at most `max_tokens`, breaking between paragraphs, then sentences."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if not paragraph.strip():
+            continue
+        if count_tokens(paragraph, model) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in split_sentences(paragraph):
+            if count_tokens(sentence, model) <= max_tokens:
+                units.append(sentence)
+            else:
+                units.extend(_hard_split(sentence, max_tokens, model))
+    chunks, chunk, chunk_tokens = [], [], 0
+    for unit in units:
+        tokens = count_tokens(unit, model) + 1
+        if chunk and chunk_tokens + tokens > max_tokens:
+            chunks.append("\n\n".join(chunk))
+            chunk, chunk_tokens = [], 0
+        chunk.append(unit)
+        chunk_tokens += tokens
+    if chunk:
+        chunks.append("\n\n".join(chunk))
+    return chunks
+
+
+class BudgetReport:
+    """Token and latency accounting for one agent request."""
+
+    def __init__(self, model="gpt-3.5-turbo"):
+        self.model = model
+        self.started = time.perf_counter()
+        self.input_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.compaction = []
+        self.chunks = 0
+        self.llm_calls = 0
+        self.first_output_seconds = None
+
+    def record_output(self, content):
+        self.llm_calls += 1
+        self.completion_tokens += count_tokens(content, self.model)
+        if self.first_output_seconds is None:
+            self.first_output_seconds = round(time.perf_counter() - self.started, 3)
+
+    def as_dict(self):
+        return {
+            "model": self.model,
+            "tokenizer": "estimate" if _encoding(self.model) is None else "tiktoken",
+            "input_tokens": self.input_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "compaction": self.compaction,
+            "chunks": self.chunks,
+            "llm_calls": self.llm_calls,
+            "first_output_seconds": self.first_output_seconds,
+            "seconds": round(time.perf_counter() - self.started, 3),
+        }
+
+
+def fit_to_budget(text, max_tokens, model="gpt-3.5-turbo", report=None):
+    """Compact `text` to at most `max_tokens`, applying the cheapest, least lossy steps first.
+
+    Input that already fits is returned untouched. Otherwise whitespace is
+    normalized and repeated lines dropped; if that is not enough the most
+    representative sentences are extracted, and as a last resort the text is
+    truncated.
+    """
+    tokens = count_tokens(text, model)
+    if report is not None:
+        report.input_tokens += tokens
+    steps = (
+        ("normalize", normalize_whitespace),
+        ("dedupe", dedupe_lines),
+        ("extract", lambda t: extractive_summary(t, max_tokens, model)),
+        ("truncate", lambda t: truncate_tokens(t, max_tokens, model)),
+    )
+    for name, step in steps:
+        if tokens <= max_tokens:
+            break
+        compacted = step(text)
+        if not compacted.strip():
+            # Extraction found no sentence that fits; truncate the text as it was
+            continue
+        compacted_tokens = count_tokens(compacted, model)
+        if report is not None:
+            report.compaction.append({"step": name, "tokens_before": tokens, "tokens_after": compacted_tokens})
+        text, tokens = compacted, compacted_tokens
+    return text
@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import itertools
+import os
+import re
+import time
+from contextvars import ContextVar
+
+LLM_SCHEDULER_ENABLED = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+# Starting quotas per model; the upstream's x-ratelimit-* headers replace them after the first response
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "3500"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "90000"))
+# Largest burst, as seconds of quota; it halves after each 429 and grows back on successful responses
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "6"))
+# Charged for a completion when the call sets no max_tokens
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "256"))
+LLM_INTERACTIVE_DEADLINE_SECONDS = float(os.getenv("LLM_INTERACTIVE_DEADLINE_SECONDS", "30"))
+LLM_BACKGROUND_DEADLINE_SECONDS = float(os.getenv("LLM_BACKGROUND_DEADLINE_SECONDS", "600"))
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+# Fraction of each quota a job worker process may spend; the rest of every burst is left to interactive calls
+LLM_BACKGROUND_SHARE = float(os.getenv("LLM_BACKGROUND_SHARE", "0.5"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Dispatch order within one scheduler: background calls only go out while no interactive call is
+# waiting in the same process. Job worker processes have their own scheduler, capped by process_share.
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+_DEFAULT_DEADLINES = {INTERACTIVE: LLM_INTERACTIVE_DEADLINE_SECONDS, BACKGROUND: LLM_BACKGROUND_DEADLINE_SECONDS}
+
+# Share of each quota the schedulers created in this process may spend (limit_process_share)
+_process_share = 1.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class LLMRequestContext:
+    __slots__ = ("user_id", "priority", "deadline")
+
+    def __init__(self, user_id, priority, deadline):
+        self.user_id = user_id
+        self.priority = priority
+        self.deadline = deadline
+
+
+# Who the current task's upstream calls are for; set once per request or job, like correlation_id
+llm_request_context = ContextVar("llm_request_context", default=None)
+
+
+def set_llm_request_context(user_id=None, priority=INTERACTIVE, timeout=None):
+    """Tag the model calls made from the current task; they are dropped if not sent within `timeout` seconds."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+    timeout = _DEFAULT_DEADLINES[priority] if timeout is None else timeout
+    llm_request_context.set(LLMRequestContext(user_id, priority, time.monotonic() + timeout))
+
+
+def limit_process_share(share):
+    """Cap schedulers created from now on in this process to `share` of each upstream quota.
+
+    Job worker processes call this so their background calls, which no
+    interactive queue in the API process can hold back, leave the rest of the
+    quota to interactive requests.
+    """
+    global _process_share
+    if not 0 < share <= 1:
+        raise ValueError("share must be in (0, 1]")
+    _process_share = share
+
+
+def parse_duration(value):
+    """Seconds in an OpenAI reset header ("20ms", "6s", "1m30s") or a plain number; None if unparseable."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts) if parts else None
+
+
+def retry_after_from_headers(headers, default=1.0):
+    retry_after = parse_duration(headers.get("retry-after"))
+    if retry_after is None:
+        resets = [parse_duration(headers.get(f"x-ratelimit-reset-{kind}")) for kind in ("requests", "tokens")]
+        resets = [reset for reset in resets if reset is not None]
+        retry_after = max(resets) if resets else default
+    return retry_after
+
+
+class RequestDropped(Exception):
+    """The call could not be sent before its deadline; it was dropped without reaching the upstream."""
+
+
+class TokenBucket:
+    """Refills `rate` units per second up to `capacity`.
+
+    A request larger than the capacity is admitted once the bucket is full and
+    leaves it in debt, so oversized prompts are slowed down rather than stuck.
+    With `share` below 1 the bucket only spends that fraction of the quota the
+    headers report, and never the last (1 - share) of a burst that remains.
+    """
+
+    def __init__(self, rate, capacity, share=1.0):
+        self.share = share
+        self.rate = rate
+        self.capacity = capacity
+        self.max_capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now):
+        self._refill(now)
+        return self.level
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def consume(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def sync(self, limit_per_minute, remaining, now, burst_seconds):
+        # `remaining` also counts other processes spending the same key, e.g. the other uvicorn workers
+        self._refill(now)
+        reserve = (1 - self.share) * limit_per_minute / 60 * burst_seconds
+        self.rate = max(limit_per_minute * self.share, 1) / 60
+        self.max_capacity = max(1.0, self.rate * burst_seconds)
+        self.capacity = min(self.max_capacity, self.capacity + self.max_capacity / 50)
+        self.level = min(self.level, remaining - reserve, self.capacity)
+
+    def shrink(self):
+        self.capacity = max(1.0, self.capacity / 2)
+        self.level = min(self.level, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "user_id", "priority", "deadline")
+
+    def __init__(self, future, tokens, user_id, priority, deadline):
+        self.future = future
+        self.tokens = tokens
+        self.user_id = user_id
+        self.priority = priority
+        self.deadline = deadline
+
+
+class _ModelQueue:
+    """Quota buckets and waiting calls of one model.
+
+    Within a priority, calls are ordered by start-time fair queuing weighted by
+    tokens: each user's calls get consecutive virtual start tags, so a user
+    with a burst of large prompts cannot starve users sending a few small ones.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, burst_seconds, share=1.0):
+        requests_per_minute *= share
+        tokens_per_minute *= share
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * burst_seconds),
+                                    share)
+        self.tokens = TokenBucket(tokens_per_minute / 60, max(1.0, tokens_per_minute / 60 * burst_seconds), share)
+        self.paused_until = 0.0
+        self.heaps = {priority: [] for priority in PRIORITIES}
+        self.queued_tokens = {priority: 0 for priority in PRIORITIES}
+        self.virtual_time = 0.0
+        self.last_finish = {}
+        self.wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        self.task = None
+        self.stats = {"granted": 0, "dropped": 0, "rate_limited": 0}
+
+    def push(self, waiter, seq):
+        start = max(self.virtual_time, self.last_finish.get(waiter.user_id, 0.0))
+        self.last_finish[waiter.user_id] = start + waiter.tokens
+        heapq.heappush(self.heaps[waiter.priority], (start, seq, waiter))
+        self.queued_tokens[waiter.priority] += waiter.tokens
+
+    def _remove(self, priority):
+        start, _, waiter = heapq.heappop(self.heaps[priority])
+        self.queued_tokens[priority] -= waiter.tokens
+        return start, waiter
+
+    def head(self):
+        """The next call to send, skipping calls whose caller went away."""
+        for priority in PRIORITIES:
+            heap = self.heaps[priority]
+            while heap and heap[0][2].future.done():
+                self._remove(priority)
+            if heap:
+                return heap[0][2]
+        return None
+
+    def pop(self):
+        for priority in PRIORITIES:
+            if self.heaps[priority]:
+                start, waiter = self._remove(priority)
+                self.virtual_time = max(self.virtual_time, start)
+                if len(self.last_finish) > 1024:
+                    # Users whose tags are behind virtual time start from it anyway
+                    self.last_finish = {u: f for u, f in self.last_finish.items() if f > self.virtual_time}
+                return waiter
+
+    def delay(self, tokens, now):
+        return max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def estimated_wait(self, waiter, now):
+        # Quota needed by the calls that go out first, including this one
+        ahead = [INTERACTIVE] if waiter.priority == INTERACTIVE else PRIORITIES
+        calls = sum(len(self.heaps[p]) for p in ahead) + 1
+        tokens = sum(self.queued_tokens[p] for p in ahead) + waiter.tokens
+        return max(self.paused_until - now,
+                   (calls - self.requests.available(now)) / self.requests.rate,
+                   (tokens - self.tokens.available(now)) / self.tokens.rate)
+
+
+class RateLimitScheduler:
+    """Admits model calls within per-model request and token quotas.
+
+    Calls wait in per-model queues: interactive before background, fair across
+    users within a priority. A call whose deadline cannot be met is dropped
+    with RequestDropped, either when it arrives behind too much queued work or
+    once it reaches the head of the queue, instead of being sent late.
+    Response headers re-tune the quotas (update_from_headers) and a 429
+    pauses the model (rate_limited). `share` caps the scheduler to that
+    fraction of every quota (see limit_process_share).
+    """
+
+    def __init__(self, requests_per_minute=LLM_REQUESTS_PER_MINUTE, tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+                 burst_seconds=LLM_RATE_BURST_SECONDS, expected_completion_tokens=LLM_EXPECTED_COMPLETION_TOKENS,
+                 share=1.0):
+        self.share = share
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self.expected_completion_tokens = expected_completion_tokens
+        self._models = {}
+        self._seq = itertools.count()
+
+    def _model(self, model):
+        state = self._models.get(model)
+        if state is None or state.loop is not asyncio.get_running_loop():
+            state = self._models[model] = _ModelQueue(self.requests_per_minute, self.tokens_per_minute,
+                                                      self.burst_seconds, self.share)
+        return state
+
+    async def acquire(self, model, tokens):
+        """Wait until a call of `tokens` (prompt plus expected completion) may be sent to `model`."""
+        context = llm_request_context.get()
+        if context is None:
+            context = LLMRequestContext(None, INTERACTIVE, time.monotonic() + LLM_INTERACTIVE_DEADLINE_SECONDS)
+        state = self._model(model)
+        now = time.monotonic()
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), tokens, context.user_id, context.priority,
+                         context.deadline)
+        if now + state.estimated_wait(waiter, now) > waiter.deadline:
+            state.stats["dropped"] += 1
+            raise RequestDropped(f"{model} quota cannot fit this call before its deadline")
+        state.push(waiter, next(self._seq))
+        state.wakeup.set()
+        if state.task is None or state.task.done():
+            state.task = asyncio.ensure_future(self._dispatch(state))
+        # Cancelling this await (client gone) marks the future done, so the dispatcher skips it
+        await waiter.future
+
+    async def _dispatch(self, state):
+        # Runs while calls are queued; the next acquire() starts it again
+        while True:
+            waiter = state.head()
+            if waiter is None:
+                return
+            now = time.monotonic()
+            delay = state.delay(waiter.tokens, now)
+            if delay <= 0:
+                state.pop()
+                state.requests.consume(1, now)
+                state.tokens.consume(waiter.tokens, now)
+                state.stats["granted"] += 1
+                waiter.future.set_result(None)
+                continue
+            if now + delay > waiter.deadline:
+                state.pop()
+                state.stats["dropped"] += 1
+                waiter.future.set_exception(RequestDropped("Deadline passed while waiting for upstream quota"))
+                continue
+            # Wake early for arrivals that may go first, or when headers change the quota
+            state.wakeup.clear()
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def update_from_headers(self, model, headers):
+        state = self._models.get(model)
+        if state is None:
+            return
+        now = time.monotonic()
+        for kind, bucket in (("requests", state.requests), ("tokens", state.tokens)):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if limit is not None and remaining is not None:
+                bucket.sync(int(limit), int(remaining), now, self.burst_seconds)
+        state.wakeup.set()
+
+    def rate_limited(self, model, retry_after):
+        """The upstream answered 429: hold every call to `model` for `retry_after` and halve the bursts."""
+        state = self._model(model)
+        state.paused_until = max(state.paused_until, time.monotonic() + retry_after)
+        state.requests.shrink()
+        state.tokens.shrink()
+        state.stats["rate_limited"] += 1
+        state.wakeup.set()
+
+    def stats(self):
+        return {
+            model: {
+                **state.stats,
+                "queued": {priority: len(heap) for priority, heap in state.heaps.items()},
+                "requests_per_minute": round(state.requests.rate * 60),
+                "tokens_per_minute": round(state.tokens.rate * 60),
+                "paused_s": round(max(0.0, state.paused_until - time.monotonic()), 3),
+            }
+            for model, state in self._models.items()
+        }
+
+    async def aclose(self):
+        tasks = [state.task for state in self._models.values() if state.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._models.clear()
+
+
+def create_scheduler():
+    return RateLimitScheduler(share=_process_share) if LLM_SCHEDULER_ENABLED else None
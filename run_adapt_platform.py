@@ -1,52 +1,94 @@
-import subprocess
+import argparse
+import asyncio
+import logging
 import os
 import json
+import socket
 import sys
 
+from supervisor import Child, Supervisor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Number of uvicorn processes serving main:app; each one is supervised and restarted on its own
+API_WORKERS = int(os.getenv('API_WORKERS', str(os.cpu_count() or 1)))
+API_HOST = os.getenv('API_HOST', '0.0.0.0')
+API_PORT = int(os.getenv('API_PORT', '8000'))
+SUPERVISOR_STATUS_HOST = os.getenv('SUPERVISOR_STATUS_HOST', '127.0.0.1')
+SUPERVISOR_STATUS_PORT = int(os.getenv('SUPERVISOR_STATUS_PORT', '8099'))
+COMPONENTS = ('server', 'client', 'api', 'agent_system')
+
 def load_shared_config():
-    with open('shared_config.json', 'r') as f:
+    with open(os.path.join(ROOT, 'shared_config.json'), 'r') as f:
         return json.load(f)
 
-def start_server(config):
-    os.chdir(config['ADAPT_AGENT_GPT_SERVER_PATH'])
-    subprocess.Popen(['npm', 'start'])
-    os.chdir(config['ADAPT_AGENT_GPT_CLIENT_PATH'])
-    subprocess.Popen(['npm', 'start'])
-    os.chdir('/home/x/ADAPT/Projects/ADAPT-Agent-GPT')  # Return to the root directory
+def api_socket(host, port):
+    # Bound once here and inherited by every worker, so the kernel spreads connections across them
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
 
-def start_adapt_agent_system(config):
-    sys.path.append(config['ADAPT_AGENT_SYSTEM_PATH'])
-    from run_adapt_system import main as run_adapt_system
-    run_adapt_system()
+def configure_result_cache(api_workers):
+    # memory and fake caches are per process: one worker's invalidations would never reach its
+    # siblings, which would keep serving stale project data until the TTL ran out
+    current = os.getenv('CACHE_BACKEND', 'memory')
+    if api_workers > 1 and current in ('memory', 'fake'):
+        backend = 'redis' if os.getenv('REDIS_URL') else 'none'
+        os.environ['CACHE_BACKEND'] = backend
+        logging.info("CACHE_BACKEND=%s cannot be shared by %s API workers; using %s", current, api_workers, backend)
+
+def build_children(config, components, api_workers, api_sock=None):
+    children = []
+    if 'server' in components:
+        children.append(Child('server', ['npm', 'start'], cwd=config['ADAPT_AGENT_GPT_SERVER_PATH']))
+    if 'client' in components:
+        children.append(Child('client', ['npm', 'start'], cwd=config['ADAPT_AGENT_GPT_CLIENT_PATH']))
+    if 'api' in components:
+        for i in range(api_workers):
+            children.append(Child(f'api-{i}', [sys.executable, '-m', 'uvicorn', 'main:app', '--fd', str(api_sock.fileno())],
+                                  cwd=ROOT, pass_fds=(api_sock.fileno(),)))
+    if 'agent_system' in components:
+        # Run in its own process rather than imported here, so a crash is restarted instead of taking the platform down
+        children.append(Child('agent_system', [sys.executable, '-c', 'from run_adapt_system import main; main()'],
+                              cwd=config['ADAPT_AGENT_SYSTEM_PATH']))
+    return children
 
 def main():
+    parser = argparse.ArgumentParser(description="Start and supervise the ADAPT Platform components.")
+    parser.add_argument('--components', default=','.join(COMPONENTS),
+                        help=f"Comma-separated subset of: {', '.join(COMPONENTS)}")
+    parser.add_argument('--api-workers', type=int, default=API_WORKERS)
+    parser.add_argument('--status-port', type=int, default=SUPERVISOR_STATUS_PORT, help="0 disables the status endpoint")
+    args = parser.parse_args()
+    components = {c.strip() for c in args.components.split(',') if c.strip()}
+    unknown = components - set(COMPONENTS)
+    if unknown:
+        parser.error(f"Unknown components: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     print("Starting ADAPT Platform...")
-    
+
     # Load shared configuration
     config = load_shared_config()
-    
-    # Set environment variables from shared config
+
+    # Set environment variables from shared config; children inherit them
     for key, value in config.items():
         os.environ[key] = str(value)
-    
-    # Start ADAPT-Agent-GPT server and client
-    print("Starting ADAPT-Agent-GPT server and client...")
-    start_server(config)
-    
-    # Start ADAPT-Agent-System
-    print("Starting ADAPT-Agent-System...")
-    start_adapt_agent_system(config)
-    
-    print("ADAPT Platform is now running.")
+
+    api_workers = max(1, args.api_workers)
+    if 'api' in components:
+        configure_result_cache(api_workers)
+    api_sock = api_socket(API_HOST, API_PORT) if 'api' in components else None
+    children = build_children(config, components, api_workers, api_sock)
+    supervisor = Supervisor(children, status_host=SUPERVISOR_STATUS_HOST, status_port=args.status_port)
+
+    print(f"Supervising: {', '.join(child.name for child in children)}")
     print("Press Ctrl+C to stop all components.")
-    
-    try:
-        # Keep the script running
-        while True:
-            pass
-    except KeyboardInterrupt:
-        print("\nStopping ADAPT Platform...")
-        # Add any cleanup code here if necessary
+    asyncio.run(supervisor.run())
+    print("ADAPT Platform stopped.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,25 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import time
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi import Query as QueryParam
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+from pydantic import BaseModel, ValidationError
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
-from server.database.database_manager import DatabaseManager
-from agent import ADAPTAgent
+from server.database.database_manager import get_db_manager
+from server.database.async_database_manager import get_async_db_manager
+from server.auth_cache import user_cache, auth_latency
+from server.password_hashing import password_hasher, PasswordHashingOverloaded
+from server.jobs import get_job_queue, JobQueueFull, FINAL_STATUSES
+from server.logging_config import configure_logging, logging_stats, shutdown_logging
+from server.metrics import (PROFILER_ENABLED, InstrumentedRoute, install_query_metrics, profiler, render_metrics,
+                            require_metrics_access)
+from agent import SUMMARIZE_TEMPLATE, ADAPTAgent
+from llm_client import LLMDeadlineExceeded, LLMError, close_default_client
+from rate_limiter import INTERACTIVE, set_llm_request_context
 
-router = APIRouter()
-db_manager = DatabaseManager()
-agent = ADAPTAgent()
+router = APIRouter(route_class=InstrumentedRoute)
+install_query_metrics(Engine)
+db_manager = get_db_manager()
+async_db_manager = get_async_db_manager()
+agent = ADAPTAgent(db_manager=async_db_manager)
+job_queue = get_job_queue()
+
+@router.on_event("shutdown")
+async def close_llm_client():
+    await close_default_client()
+
+@router.on_event("startup")
+def start_logging():
+    configure_logging()
+
+@router.on_event("shutdown")
+def stop_logging():
+    shutdown_logging()
+
+@router.on_event("startup")
+async def warm_sql_backend():
+    # Create the engine and schema off the event loop before the first request needs them
+    await run_in_threadpool(db_manager.backends.get, 'sql')
+
+@router.on_event("shutdown")
+async def close_async_db():
+    await async_db_manager.dispose()
+    db_manager.close()
+
+@router.on_event("shutdown")
+def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@router.on_event("startup")
+def start_job_queue():
+    # Heartbeats this process's jobs and fails the ones left behind by a process that stopped
+    job_queue.start()
+
+@router.on_event("shutdown")
+async def shutdown_job_queue():
+    await job_queue.shutdown()
+
+@router.on_event("startup")
+def start_profiler():
+    if PROFILER_ENABLED:
+        profiler.start()
+
+@router.on_event("shutdown")
+def stop_profiler():
+    profiler.stop()
 
 # Security
 SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 # Pydantic models
@@ -36,6 +97,9 @@ class User(BaseModel):
     full_name: str = None
     disabled: bool = None
 
+    class Config:
+        orm_mode = True
+
 class UserInDB(User):
     hashed_password: str
 
@@ -56,21 +120,103 @@ class KnowledgeCreate(BaseModel):
 class Query(BaseModel):
     query: str
 
+class TextInput(BaseModel):
+    text: str
+
+class TaskBulkItem(BaseModel):
+    title: str
+    description: Optional[str] = None
+    status: Optional[str] = None
+    project_id: Optional[int] = None
+
+class KnowledgeBulkItem(BaseModel):
+    content: str
+    tags: Optional[str] = None
+    model: Optional[str] = None
+
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def get_db():
+    # One session per request, shared by the auth dependency and the route handler
+    async with async_db_manager.get_session() as session:
+        yield session
+
+async def verify_password(plain_password, hashed_password):
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHashingOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
 
-def authenticate_user(username: str, password: str):
-    user = db_manager.get_user_by_username(username)
+async def authenticate_user(username: str, password: str, session: AsyncSession = None):
+    user = await async_db_manager.get_user_by_username(username, session=session)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await verify_password(password, user.password_hash):
         return False
     return user
 
+def parse_fields(fields: str = None):
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+async def list_response(response: Response, list_func, stream_func, fields, cursor, limit, stream, session,
+                        **filters):
+    # Bodies stay plain JSON arrays; the keyset cursor for the next page goes in a header.
+    # stream=true returns NDJSON produced row by row from a server-side cursor.
+    fields = parse_fields(fields)
+    try:
+        if stream:
+            rows = stream_func(fields=fields, **filters)
+            lines = (json.dumps(row, default=str) + "\n" async for row in rows)
+            return StreamingResponse(lines, media_type="application/x-ndjson")
+        items, next_cursor = await list_func(fields=fields, cursor=cursor, limit=max(1, min(limit, 1000)),
+                                       session=session, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return items
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    # Starlette cancels the body generator when the client disconnects; closing
+    # `events` then closes the upstream LLM stream instead of letting it run on.
+    async def body():
+        try:
+            async for event, data in events:
+                yield sse_event(event, data)
+        except LLMError as e:
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(body(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def read_bulk_items(request: Request, item_model):
+    # Accepts either a JSON array or NDJSON (one JSON object per line)
+    body = (await request.body()).decode("utf-8").strip()
+    try:
+        if body.startswith("["):
+            raw_items = json.loads(body)
+        else:
+            raw_items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON or NDJSON body: {e}")
+    items = []
+    for i, raw in enumerate(raw_items):
+        try:
+            items.append(item_model(**raw).dict())
+        except (TypeError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=f"Item {i}: {e}")
+    return items
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -81,7 +227,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -95,15 +241,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db_manager.get_user_by_username(username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    return user
+    started = time.perf_counter()
+    try:
+        # Hot path: authenticated requests are served from the per-process user cache
+        user = user_cache.get(token_data.username)
+        if user is None:
+            db_user = await async_db_manager.get_user_by_username(username=token_data.username, session=db)
+            if db_user is None:
+                raise credentials_exception
+            user = user_cache.set(db_user)
+        return user
+    finally:
+        auth_latency.record(time.perf_counter() - started)
 
 # Routes
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(form_data.username, form_data.password, session=db)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -117,9 +271,9 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/users")
-async def create_user(username: str, email: str, password: str):
-    hashed_password = get_password_hash(password)
-    user = db_manager.create_user(username, email, hashed_password)
+async def create_user(username: str, email: str, password: str, db: AsyncSession = Depends(get_db)):
+    hashed_password = await get_password_hash(password)
+    user = await async_db_manager.create_user(username, email, hashed_password, session=db)
     return {"username": user.username, "email": user.email}
 
 @router.get("/users/me", response_model=User)
@@ -127,49 +281,227 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/projects")
-async def create_project(project: ProjectCreate, current_user: User = Depends(get_current_user)):
-    db_project = db_manager.create_project(project.name, project.description, current_user.id)
+async def create_project(project: ProjectCreate, current_user: User = Depends(get_current_user),
+                         db: AsyncSession = Depends(get_db)):
+    db_project = await async_db_manager.create_project(project.name, project.description, current_user.id, session=db)
     return {"id": db_project.id, "name": db_project.name, "description": db_project.description}
 
 @router.get("/projects")
-async def get_projects(current_user: User = Depends(get_current_user)):
-    projects = db_manager.get_projects_by_user(current_user.id)
-    return [{"id": p.id, "name": p.name, "description": p.description} for p in projects]
+async def get_projects(response: Response, fields: str = None, cursor: int = None, limit: int = 100,
+                       stream: bool = False, current_user: User = Depends(get_current_user),
+                       db: AsyncSession = Depends(get_db)):
+    return await list_response(response, async_db_manager.list_projects, async_db_manager.stream_projects,
+                         fields, cursor, limit, stream, db, user_id=current_user.id)
 
 @router.post("/tasks")
-async def create_task(task: TaskCreate, current_user: User = Depends(get_current_user)):
-    db_task = db_manager.create_task(task.title, task.description, current_user.id, task.project_id)
+async def create_task(task: TaskCreate, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    db_task = await async_db_manager.create_task(task.title, task.description, current_user.id, task.project_id, session=db)
     return {"id": db_task.id, "title": db_task.title, "description": db_task.description, "status": db_task.status}
 
+@router.post("/tasks/bulk")
+async def bulk_create_tasks(request: Request, batch_size: int = 1000, current_user: User = Depends(get_current_user)):
+    tasks = await read_bulk_items(request, TaskBulkItem)
+    return await run_in_threadpool(db_manager.bulk_create_tasks, tasks, current_user.id, max(1, min(batch_size, 50000)))
+
 @router.get("/tasks")
-async def get_tasks(project_id: int = None, current_user: User = Depends(get_current_user)):
-    if project_id:
-        tasks = db_manager.get_tasks_by_project(project_id)
-    else:
-        tasks = db_manager.get_tasks_by_user(current_user.id)
-    return [{"id": t.id, "title": t.title, "description": t.description, "status": t.status} for t in tasks]
+async def get_tasks(response: Response, project_id: int = None, fields: str = None, cursor: int = None,
+                    limit: int = 100, stream: bool = False, current_user: User = Depends(get_current_user),
+                    db: AsyncSession = Depends(get_db)):
+    return await list_response(response, async_db_manager.list_tasks, async_db_manager.stream_tasks,
+                         fields, cursor, limit, stream, db, user_id=current_user.id, project_id=project_id)
 
 @router.post("/knowledge")
-async def create_knowledge(knowledge: KnowledgeCreate, current_user: User = Depends(get_current_user)):
-    db_knowledge = db_manager.create_knowledge(knowledge.content, knowledge.tags, knowledge.model, current_user.id)
-    return {"id": db_knowledge.id, "content": db_knowledge.content, "tags": db_knowledge.tags, "model": db_knowledge.model}
+async def create_knowledge(knowledge: KnowledgeCreate, current_user: User = Depends(get_current_user),
+                           db: AsyncSession = Depends(get_db)):
+    db_knowledge, created = await async_db_manager.store_knowledge(knowledge.content, knowledge.tags, knowledge.model,
+                                                                   current_user.id, session=db)
+    # A duplicate is not stored: the response is the entry it merged into, with its content
+    return {"id": db_knowledge.id, "content": db_knowledge.content, "tags": db_knowledge.tags, "model": db_knowledge.model,
+            "merged": not created, "duplicate_of": None if created else db_knowledge.id}
+
+@router.post("/knowledge/bulk")
+async def bulk_create_knowledge(request: Request, batch_size: int = 1000, current_user: User = Depends(get_current_user)):
+    entries = await read_bulk_items(request, KnowledgeBulkItem)
+    return await run_in_threadpool(db_manager.bulk_create_knowledge, entries, current_user.id, max(1, min(batch_size, 50000)))
 
 @router.get("/knowledge")
-async def get_knowledge(current_user: User = Depends(get_current_user)):
-    knowledge_entries = db_manager.get_knowledge_entries(current_user.id)
-    return [{"id": k.id, "content": k.content, "tags": k.tags, "model": k.model} for k in knowledge_entries]
+async def get_knowledge(response: Response, fields: str = None, cursor: int = None, limit: int = 100,
+                        stream: bool = False, current_user: User = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    return await list_response(response, async_db_manager.list_knowledge, async_db_manager.stream_knowledge,
+                         fields, cursor, limit, stream, db, user_id=current_user.id)
+
+@router.get("/knowledge/search")
+async def search_knowledge(q: str, mode: str = "semantic", top_k: int = QueryParam(10, ge=1, le=100),
+                           tags: str = None, limit: int = QueryParam(50, ge=1, le=200),
+                           offset: int = QueryParam(0, ge=0), current_user: User = Depends(get_current_user),
+                           db: AsyncSession = Depends(get_db)):
+    if mode == "keyword":
+        entries = await async_db_manager.search_knowledge(q, current_user.id, tags, limit, offset, session=db)
+        return [{"id": k.id, "content": k.content, "tags": k.tags, "model": k.model} for k in entries]
+    if mode != "semantic":
+        raise HTTPException(status_code=400, detail="mode must be 'semantic' or 'keyword'")
+    matches = await async_db_manager.semantic_search_knowledge(q, current_user.id, top_k, session=db)
+    return [{"id": k.id, "content": k.content, "tags": k.tags, "model": k.model, "score": score} for k, score in matches]
+
+@router.get("/metrics", dependencies=[Depends(require_metrics_access)])
+async def prometheus_metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+@router.get("/debug/profile", dependencies=[Depends(require_metrics_access)])
+async def slow_request_profile(format: str = "collapsed"):
+    # Opt-in (PROFILER_ENABLED); collapsed output feeds flamegraph.pl or speedscope directly
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiler disabled; set PROFILER_ENABLED=true")
+    if format == "json":
+        return profiler.summary()
+    if format != "collapsed":
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    return PlainTextResponse(profiler.collapsed())
+
+@router.get("/metrics/logging", dependencies=[Depends(require_metrics_access)])
+async def logging_metrics():
+    return logging_stats()
+
+@router.get("/metrics/db_pool", dependencies=[Depends(require_metrics_access)])
+async def db_pool_metrics():
+    return {"sync": db_manager.pool_metrics(), "async": async_db_manager.pool_metrics(),
+            "backends": db_manager.backends.status()}
+
+@router.get("/metrics/auth", dependencies=[Depends(require_metrics_access)])
+async def auth_metrics():
+    return {"cache": user_cache.stats(), "latency": auth_latency.stats(), "password_hashing": password_hasher.stats()}
+
+@router.get("/metrics/cache", dependencies=[Depends(require_metrics_access)])
+async def cache_metrics():
+    completion_cache = agent.cache
+    return {"results": db_manager.cache.stats(),
+            "completions": completion_cache.stats() if completion_cache is not None else None}
+
+@router.get("/metrics/llm", dependencies=[Depends(require_metrics_access)])
+async def llm_metrics():
+    scheduler = agent.client.scheduler
+    return {"in_flight": agent.client.in_flight, "streams": agent.client.stream_stats.stats(),
+            "scheduler": scheduler.stats() if scheduler is not None else None}
+
+async def get_agent_user(current_user: User = Depends(get_current_user)):
+    # Model calls for this request queue fairly per user, ahead of background jobs (async, so the
+    # context variable is set in the request's own task)
+    set_llm_request_context(current_user.id, INTERACTIVE)
+    return current_user
+
+async def run_agent(call):
+    try:
+        return await call
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
 @router.post("/agent/query")
-async def agent_query(query: Query, current_user: User = Depends(get_current_user)):
-    result = await agent.process_query(query.query, current_user.id)
+async def agent_query(query: Query, stream: bool = False, current_user: User = Depends(get_agent_user)):
+    # stream=true answers with server-sent events: `token` events, then `done`
+    if stream:
+        return sse_response(agent.stream_query(query.query, current_user.id))
+    result = await run_agent(agent.process_query(query.query, current_user.id))
     return result
 
 @router.post("/agent/create_task")
-async def agent_create_task(task: TaskCreate, current_user: User = Depends(get_current_user)):
-    result = await agent.create_task(task.project_id, task.description, current_user.id)
+async def agent_create_task(task: TaskCreate, stream: bool = False, current_user: User = Depends(get_agent_user)):
+    if stream:
+        return sse_response(agent.stream_create_task(task.project_id, task.description, current_user.id))
+    result = await run_agent(agent.create_task(task.project_id, task.description, current_user.id))
     return result
 
+@router.post("/agent/summarize")
+async def agent_summarize(body: TextInput, stream: bool = False, current_user: User = Depends(get_agent_user)):
+    # Input of any length; stream=true sends a `chunk` event per chunk summary, then `done` with the token report
+    if stream:
+        return sse_response(agent.stream_chunked(SUMMARIZE_TEMPLATE, body.text))
+    summary, report = await run_agent(agent.summarize_long_text(body.text))
+    return {"summary": summary, "report": report}
+
+async def get_owned_project(project_id: int, user_id: int):
+    project = await async_db_manager.get_project_by_id(project_id)
+    if project is None or project.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
 @router.get("/agent/analyze_project/{project_id}")
-async def agent_analyze_project(project_id: int, current_user: User = Depends(get_current_user)):
-    result = await agent.analyze_project(project_id)
-    return result
\ No newline at end of file
+async def agent_analyze_project(project_id: int, current_user: User = Depends(get_agent_user)):
+    await get_owned_project(project_id, current_user.id)
+    result = await run_agent(agent.analyze_project(project_id))
+    return result
+
+# Background jobs: submit returns 202 with a job id straight away; the job is the
+# task row it creates, so its state is Task.status and its result Task.description.
+async def submit_job(response: Response, kind, user_id, payload, title, project_id=None, priority="normal"):
+    try:
+        job_id = await job_queue.submit(kind, user_id, payload, title, project_id, priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Job queue full, retry shortly", headers={"Retry-After": "5"})
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return {"job_id": job_id, "status": "Queued"}
+
+async def get_job_state(job_id: int, user_id: int):
+    task = await async_db_manager.get_task_by_id(job_id)
+    if task is None or task.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    state = {"job_id": task.id, "status": task.status, **job_queue.describe(task.id)}
+    if task.status in FINAL_STATUSES:
+        state["result"] = task.description
+    return state
+
+# Clients may only lower their job's lane; "high" is kept for jobs the server submits itself
+ClientJobPriority = Literal["normal", "low"]
+
+@router.post("/jobs/analyze_project/{project_id}")
+async def submit_analyze_project_job(project_id: int, response: Response, priority: ClientJobPriority = "normal",
+                                     current_user: User = Depends(get_current_user)):
+    await get_owned_project(project_id, current_user.id)
+    return await submit_job(response, "analyze_project", current_user.id, {"project_id": project_id},
+                            f"Analyze project {project_id}", priority=priority)
+
+@router.post("/jobs/create_task")
+async def submit_create_task_job(task: TaskCreate, response: Response, priority: ClientJobPriority = "normal",
+                                 current_user: User = Depends(get_current_user)):
+    title = task.description.strip().splitlines()[0][:100] if task.description.strip() else task.title
+    payload = {"description": task.description, "project_id": task.project_id, "user_id": current_user.id}
+    return await submit_job(response, "create_task", current_user.id, payload, title, task.project_id, priority)
+
+@router.post("/jobs/dedup_knowledge")
+async def submit_dedup_knowledge_job(response: Response, current_user: User = Depends(get_current_user)):
+    # Merges duplicates among the user's entries stored before deduplication; new entries never need it.
+    # A bulk maintenance pass, so it always takes the low lane
+    return await submit_job(response, "dedup_knowledge", current_user.id, {"user_id": current_user.id},
+                            "Deduplicate knowledge", priority="low")
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int, current_user: User = Depends(get_current_user)):
+    return await get_job_state(job_id, current_user.id)
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int, poll_interval: float = 0.5, current_user: User = Depends(get_current_user)):
+    # Server-sent events: a `status` event on every change, then `done` with the result
+    state = await get_job_state(job_id, current_user.id)
+
+    async def events():
+        nonlocal state
+        last_status = None
+        while True:
+            if state["status"] != last_status:
+                last_status = state["status"]
+                if last_status in FINAL_STATUSES:
+                    yield "done", state
+                    return
+                yield "status", state
+            await asyncio.sleep(max(0.1, poll_interval))
+            state = await get_job_state(job_id, current_user.id)
+
+    return sse_response(events())
+
+@router.get("/metrics/jobs", dependencies=[Depends(require_metrics_access)])
+async def job_metrics():
+    return job_queue.stats()
\ No newline at end of file
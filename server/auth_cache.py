@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+from sqlalchemy import event, inspect
+
+from server.database.database_manager import User
+
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_CACHE_MAX_ENTRIES', '10000'))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv('AUTH_CACHE_TTL_SECONDS', '60'))
+
+# Immutable snapshot of the fields authenticated routes read; never the password hash
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'email', 'created_at'])
+
+
+class UserCache:
+    """Bounded TTL cache of user records keyed by username (the JWT `sub`)."""
+
+    def __init__(self, max_entries=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return None
+
+    def set(self, user):
+        cached = CachedUser(user.id, user.username, user.email, user.created_at)
+        with self._lock:
+            self._entries[user.username] = (cached, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+        }
+
+
+class LatencyTracker:
+    """Keeps the most recent samples to report latency percentiles."""
+
+    def __init__(self, max_samples=4096):
+        self._samples = deque(maxlen=max_samples)
+
+    def record(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p):
+        samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def stats(self):
+        return {
+            'samples': len(self._samples),
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+        }
+
+
+user_cache = UserCache()
+auth_latency = LatencyTracker()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target):
+    # ORM writes from either DatabaseManager invalidate this worker's entry; the TTL
+    # bounds staleness for writes made by other processes.
+    user_cache.invalidate(target.username)
+    for old_username in inspect(target).attrs.username.history.deleted:
+        user_cache.invalidate(old_username)
@@ -0,0 +1,112 @@
+"""Request concurrency on a single worker: sync DatabaseManager vs AsyncDatabaseManager.
+
+Both apps serve the same `async def` route on one event loop. The "sync" app
+calls DatabaseManager directly (what the routes did before), the "async" app
+awaits AsyncDatabaseManager. --latency-ms adds a per-statement delay inside
+the SQLite driver thread to stand in for the network round trip to Postgres.
+
+Usage (from the repository root):
+    python -m server.benchmarks.async_db_load_test --requests 400 --concurrency 50 --latency-ms 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+
+
+def add_statement_latency(engine, latency):
+    def trace(statement):
+        time.sleep(latency)
+
+    @event.listens_for(engine, 'connect')
+    def install_trace(dbapi_connection, connection_record):
+        inner = getattr(dbapi_connection, '_connection', None)
+        if inner is None:
+            dbapi_connection.set_trace_callback(trace)
+        else:
+            # aiosqlite: register on the driver thread that actually runs the statements
+            dbapi_connection.await_(inner.set_trace_callback(trace))
+
+
+def build_apps(db_manager, async_db_manager):
+    sync_app = FastAPI()
+    async_app = FastAPI()
+
+    @sync_app.get('/tasks')
+    async def sync_tasks():
+        return [{'id': t.id, 'title': t.title} for t in db_manager.get_tasks_by_user(1)]
+
+    @async_app.get('/tasks')
+    async def async_tasks():
+        return [{'id': t.id, 'title': t.title} for t in await async_db_manager.get_tasks_by_user(1)]
+
+    return sync_app, async_app
+
+
+async def load(app, total_requests, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.get('/tasks')
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests_per_s': round(total_requests / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['KNOWLEDGE_INDEX_DIR'] = os.path.join(tmp, 'knowledge_index')
+        os.environ['DB_POOL_SIZE'] = str(args.concurrency)
+        from server.database.database_manager import DatabaseManager
+        from server.database.async_database_manager import AsyncDatabaseManager
+
+        db_manager = DatabaseManager()
+        user = db_manager.create_user('bench', 'bench@example.com', 'x')
+        db_manager.bulk_create_tasks([{'title': f'task {i}'} for i in range(20)], user.id)
+        async_db_manager = AsyncDatabaseManager(db_manager)
+        add_statement_latency(db_manager.engine, args.latency_ms / 1000)
+        add_statement_latency(async_db_manager.engine.sync_engine, args.latency_ms / 1000)
+        # Drop connections opened during setup so every pooled connection gets the delay
+        db_manager.engine.dispose()
+
+        sync_app, async_app = build_apps(db_manager, async_db_manager)
+        for name, app in (('sync DatabaseManager', sync_app), ('AsyncDatabaseManager', async_app)):
+            result = asyncio.run(load(app, args.requests, args.concurrency))
+            print(f"{name:<22} concurrency={args.concurrency} latency={args.latency_ms}ms {result}")
+        asyncio.run(async_db_manager.dispose())
+        db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""p50/p99 latency of each DatabaseManager read method on a seeded SQLite database.
+
+Seeds --users users with --projects-per-user projects each, --tasks tasks
+(10% without a project) and --knowledge knowledge entries, each linked to one
+of its owner's projects. The data comes from a fixed random seed, so runs are
+comparable. The database file (--db) is kept and reseeded only when its row
+counts differ from the arguments. Each read method is then called --repeat
+times with random arguments, with the result cache disabled so every call
+reaches SQL.
+
+--without-indexes drops the composite query-pattern indexes first, which
+measures the schema as it was before them. Without the flag they are
+recreated if missing.
+
+Usage (from the repository root):
+    python -m server.benchmarks.db_read_benchmark --tasks 1000000
+    python -m server.benchmarks.db_read_benchmark --tasks 1000000 --without-indexes
+"""
+import argparse
+import os
+import random
+import time
+
+from sqlalchemy import create_engine, func, select
+
+from server.database.cache import create_result_cache
+from server.database.database_manager import Base, DatabaseManager, Knowledge, Project, Task, User, project_knowledge
+
+STATUSES = ('To Do', 'In Progress', 'Done', 'Blocked')
+
+
+def seed(engine, args, batch_size=50000):
+    rng = random.Random(42)
+    projects = args.users * args.projects_per_user
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+            for i in range(1, args.users + 1)
+        ])
+        # Project p belongs to user (p - 1) // projects_per_user + 1
+        conn.execute(Project.__table__.insert(), [
+            {'id': p, 'name': f'project {p}', 'description': 'benchmark project',
+             'user_id': (p - 1) // args.projects_per_user + 1}
+            for p in range(1, projects + 1)
+        ])
+        for start in range(0, args.tasks, batch_size):
+            rows = []
+            for i in range(start, min(args.tasks, start + batch_size)):
+                user_id = rng.randint(1, args.users)
+                project_id = (user_id - 1) * args.projects_per_user + rng.randint(1, args.projects_per_user)
+                rows.append({'title': f'task {i}', 'description': f'work item {i}', 'status': rng.choice(STATUSES),
+                             'user_id': user_id, 'project_id': project_id if rng.random() >= 0.1 else None})
+            conn.execute(Task.__table__.insert(), rows)
+        for start in range(0, args.knowledge, batch_size):
+            count = min(args.knowledge, start + batch_size) - start
+            owners = [rng.randint(1, args.users) for _ in range(count)]
+            conn.execute(Knowledge.__table__.insert(), [
+                {'id': start + i + 1, 'content': f'note {start + i}', 'tags': 'bench', 'user_id': user_id}
+                for i, user_id in enumerate(owners)
+            ])
+            conn.execute(project_knowledge.insert(), [
+                {'knowledge_id': start + i + 1,
+                 'project_id': (user_id - 1) * args.projects_per_user + rng.randint(1, args.projects_per_user)}
+                for i, user_id in enumerate(owners)
+            ])
+
+
+def prepare(args):
+    if os.path.exists(args.db):
+        engine = create_engine(f'sqlite:///{args.db}')
+        with engine.connect() as conn:
+            counts = (conn.execute(select(func.count()).select_from(User.__table__)).scalar(),
+                      conn.execute(select(func.count()).select_from(Task.__table__)).scalar(),
+                      conn.execute(select(func.count()).select_from(Knowledge.__table__)).scalar())
+        engine.dispose()
+        if counts == (args.users, args.tasks, args.knowledge):
+            return
+        os.remove(args.db)
+    engine = create_engine(f'sqlite:///{args.db}')
+    Base.metadata.create_all(engine)
+    indexes = [index for table in Base.metadata.sorted_tables for index in table.indexes]
+    # Loading first and indexing afterwards is much faster than maintaining the indexes row by row
+    for index in indexes:
+        index.drop(engine)
+    started = time.perf_counter()
+    seed(engine, args)
+    print(f"seeded {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+    for index in indexes:
+        index.create(engine)
+    engine.dispose()
+
+
+def set_indexes(engine, enabled):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if enabled:
+                index.create(engine, checkfirst=True)
+            else:
+                index.drop(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.exec_driver_sql('ANALYZE')
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='db_read_benchmark.db')
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--projects-per-user', type=int, default=5)
+    parser.add_argument('--knowledge', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--without-indexes', action='store_true')
+    args = parser.parse_args()
+
+    prepare(args)
+    os.environ['DATABASE_URL'] = f'sqlite:///{args.db}'
+    db_manager = DatabaseManager(backend_factories={'cache': lambda: create_result_cache('none')})
+    set_indexes(db_manager.engine, not args.without_indexes)
+
+    projects = args.users * args.projects_per_user
+    rng = random.Random(7)
+    user = lambda: rng.randint(1, args.users)
+    project = lambda: rng.randint(1, projects)
+
+    def list_project_tasks():
+        project_id = project()
+        return db_manager.list_tasks((project_id - 1) // args.projects_per_user + 1, project_id=project_id)
+
+    reads = [
+        ('get_user_by_username', lambda: db_manager.get_user_by_username(f'user{user()}')),
+        ('get_projects_by_user', lambda: db_manager.get_projects_by_user(user())),
+        ('get_project_by_id', lambda: db_manager.get_project_by_id(project())),
+        ('get_tasks_by_user', lambda: db_manager.get_tasks_by_user(user())),
+        ('get_tasks_by_project', lambda: db_manager.get_tasks_by_project(project())),
+        ('get_task_by_id', lambda: db_manager.get_task_by_id(rng.randint(1, args.tasks))),
+        ('get_knowledge_entries', lambda: db_manager.get_knowledge_entries(user())),
+        ('get_knowledge_by_project', lambda: db_manager.get_knowledge_by_project(project())),
+        ('list_projects', lambda: db_manager.list_projects(user())),
+        ('list_tasks', lambda: db_manager.list_tasks(user())),
+        ('list_tasks(project_id)', list_project_tasks),
+        ('list_knowledge', lambda: db_manager.list_knowledge(user())),
+    ]
+    print(f"tasks={args.tasks} users={args.users} projects={projects} knowledge={args.knowledge} "
+          f"indexes={'off' if args.without_indexes else 'on'} repeat={args.repeat}")
+    print(f"{'method':<26} {'p50_ms':>8} {'p99_ms':>8}")
+    for name, read in reads:
+        read()  # Warm the statement cache and the pages this method touches
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            read()
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<26} {percentile(samples, 50):8.2f} {percentile(samples, 99):8.2f}")
+    db_manager.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Import-time report for the API, built on `python -X importtime`.
+
+Imports --module in a fresh interpreter, prints the slowest imports by
+cumulative and self time, and exits with status 1 when the total exceeds
+--budget-ms, so CI can hold cold start under a budget.
+
+Usage (from the repository root):
+    python -m server.benchmarks.import_time_report --budget-ms 800 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def collect(module, env):
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=env, check=True, capture_output=True, text=True,
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({'name': name, 'depth': len(indent) // 2,
+                            'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='server.api_routes')
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', '1000')))
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-depth', type=int, default=2, help='deepest import level listed by cumulative time')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('LLM_BACKEND', 'fake')
+    entries = collect(args.module, env)
+    total_ms = sum(e['cumulative_ms'] for e in entries if e['depth'] == 0)
+
+    print(f"Slowest imports by cumulative time (depth <= {args.max_depth}):")
+    shallow = [e for e in entries if e['depth'] <= args.max_depth]
+    for e in sorted(shallow, key=lambda e: e['cumulative_ms'], reverse=True)[:args.top]:
+        print(f"  {e['cumulative_ms']:8.1f}ms  {'  ' * e['depth']}{e['name']}")
+    print("Slowest imports by self time:")
+    for e in sorted(entries, key=lambda e: e['self_ms'], reverse=True)[:args.top]:
+        print(f"  {e['self_ms']:8.1f}ms  {e['name']}")
+
+    print(f"Total import time of {args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.0f}ms, "
+          f"{len(entries)} modules)")
+    if total_ms > args.budget_ms:
+        print("Over budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
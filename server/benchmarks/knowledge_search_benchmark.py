@@ -0,0 +1,106 @@
+"""Compare the original ILIKE knowledge search with the SQLite FTS5 index.
+
+Usage (from the repository root):
+    python -m server.benchmarks.knowledge_search_benchmark --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from server.database.database_manager import Base, Knowledge, User
+from server.database.fulltext import SQLiteFullTextIndex
+
+TAGS = ["ops", "research", "backend", "frontend", "ml", "infra", "docs", "planning"]
+VOCABULARY_SIZE = 20000
+
+
+def build_vocabulary(rng):
+    # Pseudo-words with Zipf-distributed frequencies, like natural-language text
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["".join(rng.choices(letters, k=rng.randint(4, 9))) for _ in range(VOCABULARY_SIZE)]
+    cum_weights = []
+    total = 0.0
+    for rank in range(1, VOCABULARY_SIZE + 1):
+        total += 1.0 / rank
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+def seed(engine, rows, words, cum_weights, users=10, batch_size=50000):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x"}
+            for i in range(1, users + 1)
+        ])
+        for start in range(0, rows, batch_size):
+            conn.execute(Knowledge.__table__.insert(), [
+                {
+                    "content": " ".join(rng.choices(words, cum_weights=cum_weights, k=40)),
+                    "tags": ",".join(rng.sample(TAGS, 2)),
+                    "model": "gpt-3.5-turbo",
+                    "user_id": rng.randint(1, users),
+                }
+                for _ in range(min(batch_size, rows - start))
+            ])
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(rows, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        rng = random.Random(7)
+        words, cum_weights = build_vocabulary(rng)
+        # Mid-frequency terms: common enough to match, rare enough to be selective
+        queries = [f"{words[rng.randint(50, 500)]} {words[rng.randint(50, 500)]}" for _ in range(3)]
+        queries += [words[rng.randint(10, 2000)] for _ in range(2)]
+        started = time.perf_counter()
+        seed(engine, rows, words, cum_weights)
+        seed_s = time.perf_counter() - started
+        index = SQLiteFullTextIndex(engine)
+        started = time.perf_counter()
+        index.setup()
+        index_s = time.perf_counter() - started
+        Session = sessionmaker(bind=engine)
+
+        for query in queries:
+            with Session() as session:
+                # The ILIKE baseline matches each term separately, like the FTS query does
+                ilike_ms = timed(lambda: session.query(Knowledge).filter(
+                    Knowledge.user_id == 1,
+                    *[Knowledge.content.ilike(f'%{term}%') for term in query.split()]
+                ).all(), repeat)
+                fts_ms = timed(lambda: index.search(session.connection(), query, 1, limit=50), repeat)
+                fts_tag_ms = timed(lambda: index.search(session.connection(), query, 1, tags="ml", limit=50), repeat)
+            print(f"rows={rows:>8} query={query!r:<20} ilike={ilike_ms:9.2f}ms "
+                  f"fts5={fts_ms:8.2f}ms fts5+tag={fts_tag_ms:8.2f}ms")
+        print(f"rows={rows:>8} seed={seed_s:.1f}s fts5 build={index_s:.1f}s")
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for rows in args.rows:
+        run(rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
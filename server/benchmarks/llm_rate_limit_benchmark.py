@@ -0,0 +1,114 @@
+"""Goodput of the agent's model calls against a rate-limited fake upstream.
+
+The fake upstream (FakeLLMBackend with requests_per_minute/tokens_per_minute)
+answers calls over its quota with 429s, like OpenAI. A few users run
+background jobs with long prompts while interactive users send short
+questions. "naive" retries 429s after a short random sleep, as a bare client
+would; "scheduled" routes calls through RateLimitScheduler, which starts from
+the default (too high) quotas and has to tune itself from the response headers.
+Goodput counts calls answered within their deadline.
+
+Usage (from the repository root):
+    python -m server.benchmarks.llm_rate_limit_benchmark --rpm 1200 --tpm 30000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from llm_client import AsyncLLMClient, FakeLLMBackend, LLMDeadlineExceeded, LLMRateLimitError
+from rate_limiter import BACKGROUND, INTERACTIVE, RateLimitScheduler, set_llm_request_context
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p / 100))] if samples else 0.0
+
+
+async def call(client, naive, user_id, priority, deadline, prompt, results):
+    set_llm_request_context(user_id, priority, timeout=deadline)
+    started = time.perf_counter()
+    outcome = "failed"
+    try:
+        for attempt in range(10 if naive else 1):
+            try:
+                await client.chat_completion([{"role": "user", "content": prompt}], max_tokens=50)
+                outcome = "completed" if time.perf_counter() - started <= deadline else "late"
+                break
+            except LLMRateLimitError:
+                if not naive:
+                    raise
+                await asyncio.sleep(random.uniform(0, 0.5))
+    except LLMDeadlineExceeded:
+        outcome = "dropped"
+    except LLMRateLimitError:
+        pass
+    results.append((priority, user_id, outcome, time.perf_counter() - started))
+
+
+async def run(mode, args):
+    backend = FakeLLMBackend(latency=0.05, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+    scheduler = RateLimitScheduler() if mode == "scheduled" else None
+    client = AsyncLLMClient(backend, max_concurrency=64, scheduler=scheduler)
+    naive = mode == "naive"
+    results = []
+    long_prompt = " ".join(["context"] * args.background_prompt_words)
+    calls = [
+        call(client, naive, f"batch-{u}", BACKGROUND, args.background_deadline, long_prompt, results)
+        for u in range(args.background_users) for _ in range(args.background_calls)
+    ]
+
+    async def interactive_user(u):
+        for _ in range(args.interactive_calls):
+            await asyncio.sleep(random.expovariate(1 / args.think_time))
+            await call(client, naive, f"user-{u}", INTERACTIVE, args.interactive_deadline, "short question", results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*calls, *(interactive_user(u) for u in range(args.interactive_users)))
+    elapsed = time.perf_counter() - started
+
+    summary = {"mode": mode, "elapsed_s": round(elapsed, 1), "upstream_calls": backend.calls,
+               "upstream_429s": backend.rate_limited}
+    for priority in (INTERACTIVE, BACKGROUND):
+        rows = [r for r in results if r[0] == priority]
+        completed = [r for r in rows if r[2] == "completed"]
+        per_user = {}
+        for r in completed:
+            per_user[r[1]] = per_user.get(r[1], 0) + 1
+        summary[priority] = {
+            "completed": len(completed),
+            "late": sum(r[2] == "late" for r in rows),
+            "dropped": sum(r[2] == "dropped" for r in rows),
+            "failed": sum(r[2] == "failed" for r in rows),
+            "goodput_per_s": round(len(completed) / elapsed, 2),
+            "p50_ms": round(percentile([r[3] for r in completed], 50) * 1000),
+            "p99_ms": round(percentile([r[3] for r in completed], 99) * 1000),
+            "per_user_min_max": (min(per_user.values(), default=0), max(per_user.values(), default=0)),
+        }
+    if scheduler is not None:
+        summary["scheduler"] = scheduler.stats()
+    await client.aclose()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=1200, help="Fake upstream requests per minute")
+    parser.add_argument("--tpm", type=int, default=30000, help="Fake upstream tokens per minute")
+    parser.add_argument("--background-users", type=int, default=4)
+    parser.add_argument("--background-calls", type=int, default=20)
+    parser.add_argument("--background-prompt-words", type=int, default=150)
+    parser.add_argument("--background-deadline", type=float, default=120)
+    parser.add_argument("--interactive-users", type=int, default=8)
+    parser.add_argument("--interactive-calls", type=int, default=10)
+    parser.add_argument("--interactive-deadline", type=float, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean seconds between a user's questions")
+    parser.add_argument("--mode", choices=("naive", "scheduled", "both"), default="both")
+    args = parser.parse_args()
+    for mode in ("naive", "scheduled") if args.mode == "both" else (args.mode,):
+        random.seed(0)
+        print(asyncio.run(run(mode, args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Per-call cost of the DatabaseManager read log line, before and after logging_config.
+
+"eager" is the old setup: an f-string formatted on every call and written
+synchronously by basicConfig's handler. "queued" is the new one: a
+SampledLogger with lazy %-formatting, writing from the QueueListener thread.
+Output goes to a file so terminal speed is not measured.
+
+Usage (from the repository root):
+    python -m server.benchmarks.logging_benchmark --calls 100000 --sample-rate 0.01
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from server import logging_config
+from server.database.sampled_logger import SampledLogger
+
+
+class User:
+    def __init__(self, username):
+        self.username = username
+        self.email = f"{username}@example.com"
+
+    def __repr__(self):
+        return f"User(username={self.username!r}, email={self.email!r})"
+
+
+def eager(calls, path):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger = logging.getLogger('benchmark.eager')
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    logger.propagate = False
+    user = User('alice')
+    started = time.perf_counter()
+    for _ in range(calls):
+        logger.info(f"Fetching user by username: {user.username}, found: {user}")
+    elapsed = time.perf_counter() - started
+    handler.close()
+    return elapsed
+
+
+def queued(calls, path, sample_rate):
+    stream = open(path, 'w')
+    logging_config.configure_logging(stream=stream)
+    logger = SampledLogger(logging.getLogger('benchmark.queued.reads'), rate=sample_rate)
+    user = User('alice')
+    started = time.perf_counter()
+    for _ in range(calls):
+        logger.info("Fetching user by username: %s, found: %s", user.username, user)
+    elapsed = time.perf_counter() - started
+    stats = logging_config.logging_stats()
+    logging_config.shutdown_logging()
+    stream.close()
+    return elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--sample-rate", type=float, default=0.01)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        eager_seconds = eager(args.calls, os.path.join(tmp, 'eager.log'))
+        queued_seconds, stats = queued(args.calls, os.path.join(tmp, 'queued.log'), args.sample_rate)
+    print(f"calls={args.calls} sample_rate={args.sample_rate}")
+    print(f"eager   {eager_seconds / args.calls * 1e6:6.2f}us/call")
+    print(f"queued  {queued_seconds / args.calls * 1e6:6.2f}us/call  {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Logins per second (bcrypt verifications) with the password hashing process pool.
+
+Usage (from the repository root):
+    python -m server.benchmarks.password_hashing_benchmark --workers 1 4 16 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from server.password_hashing import PasswordHasher, _hash
+
+
+async def run(workers, rounds, logins):
+    hasher = PasswordHasher(workers=workers, max_queue=logins, rounds=rounds)
+    hashed = _hash("correct horse battery staple", rounds)
+    # Warm the pool so process start-up is not counted
+    await asyncio.gather(*(hasher.verify("warmup", hashed) for _ in range(workers)))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(hasher.verify("correct horse battery staple", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    hasher.shutdown()
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--logins", type=int, default=64)
+    args = parser.parse_args()
+    print(f"cpu_count={os.cpu_count()} rounds={args.rounds} logins={args.logins}")
+    for workers in args.workers:
+        rate = asyncio.run(run(workers, args.rounds, args.logins))
+        print(f"workers={workers:>3} logins_per_s={rate:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
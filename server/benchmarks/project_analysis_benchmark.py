@@ -0,0 +1,86 @@
+"""End-to-end project analysis latency: single prompt vs map-reduce.
+
+Builds a project with --tasks tasks and --knowledge linked knowledge entries
+in a temporary SQLite database and analyzes it with the fake LLM backend,
+whose latency grows with prompt length (--prompt-token-ms) on top of a fixed
+per-call cost (--call-ms). Reports:
+
+  single       one prompt with everything (what analyze_project used to send)
+  map_reduce   cold: every chunk summarized, chunks in parallel
+  re-analysis  after editing one task: only the changed chunk and the merges
+               above it are recomputed; the other summaries come from the cache
+
+Usage (from the repository root):
+    python -m server.benchmarks.project_analysis_benchmark --tasks 2000 --knowledge 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def run(args):
+    from agent import ADAPTAgent
+    from completion_cache import CompletionCache
+    from llm_client import AsyncLLMClient, FakeLLMBackend
+    from project_analyzer import ProjectAnalyzer
+    from server.database.database_manager import DatabaseManager
+
+    db_manager = DatabaseManager()
+    user = db_manager.create_user('bench', 'bench@example.com', 'x')
+    project = db_manager.create_project('bench', 'Benchmark project', user.id)
+    db_manager.bulk_create_tasks([
+        {'title': f'task {i}', 'description': f'work item {i} touching module {i % 37} with follow-ups', 'project_id': project.id}
+        for i in range(args.tasks)
+    ], user.id)
+    db_manager.bulk_create_knowledge([
+        {'content': f'note {i}: decision record about component {i % 23} and its constraints', 'tags': 'bench'}
+        for i in range(args.knowledge)
+    ], user.id)
+    with db_manager.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO project_knowledge (project_id, knowledge_id) SELECT ?, id FROM knowledge", (project.id,)
+        )
+
+    backend = FakeLLMBackend(latency=args.call_ms / 1000, prompt_token_latency=args.prompt_token_ms / 1000,
+                             max_completion_words=args.summary_words)
+    agent = ADAPTAgent(client=AsyncLLMClient(backend, max_concurrency=args.parallel), db_manager=db_manager,
+                       cache=CompletionCache())
+    tasks = db_manager.get_tasks_by_project(project.id)
+    knowledge = db_manager.get_knowledge_by_project(project.id)
+
+    single = ProjectAnalyzer(agent._complete, single_prompt_tokens=10 ** 9)
+    started = time.perf_counter()
+    _, stats = await single.analyze(project, tasks, knowledge)
+    print(f"{'single':<12} {time.perf_counter() - started:7.2f}s  {stats}")
+
+    started = time.perf_counter()
+    result = await agent._analyze_project(project.id)
+    print(f"{'map_reduce':<12} {time.perf_counter() - started:7.2f}s  {result['stats']}")
+
+    db_manager.update_task(tasks[len(tasks) // 2].id, status='Blocked')
+    started = time.perf_counter()
+    result = await agent._analyze_project(project.id)
+    print(f"{'re-analysis':<12} {time.perf_counter() - started:7.2f}s  {result['stats']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=2000)
+    parser.add_argument('--knowledge', type=int, default=500)
+    parser.add_argument('--call-ms', type=float, default=300.0)
+    parser.add_argument('--prompt-token-ms', type=float, default=0.05)
+    parser.add_argument('--summary-words', type=int, default=60)
+    parser.add_argument('--parallel', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ['KNOWLEDGE_INDEX_DIR'] = os.path.join(tmp, 'knowledge_index')
+        os.environ['COMPLETION_CACHE_ENABLED'] = 'false'
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Cold-start time of the API: import, startup hooks and first request.
+
+Each run is a fresh interpreter so nothing is already imported or connected.
+Reports the median of --runs and which database backends exist after import
+(with lazy initialization there should be none).
+
+Usage (from the repository root):
+    python -m server.benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def child():
+    started = time.perf_counter()
+    from server import api_routes
+    imported = time.perf_counter()
+    after_import = {name: s['initialized'] for name, s in api_routes.db_manager.backends.status().items()}
+
+    import httpx
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    app.include_router(api_routes.router)
+
+    async def first_request():
+        await app.router.startup()
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            response = await client.get('/metrics/db_pool')
+            response.raise_for_status()
+        done = time.perf_counter()
+        await app.router.shutdown()
+        return ready, done
+
+    ready, done = asyncio.run(first_request())
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'startup_ms': (ready - imported) * 1000,
+        'first_request_ms': (done - ready) * 1000,
+        'total_ms': (done - started) * 1000,
+        'initialized_after_import': after_import,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LLM_BACKEND='fake')
+        env.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        env.setdefault('KNOWLEDGE_INDEX_DIR', os.path.join(tmp, 'knowledge_index'))
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, '-m', 'server.benchmarks.startup_benchmark', '--child'],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    for key in ('import_ms', 'startup_ms', 'first_request_ms', 'total_ms'):
+        print(f"{key:<18} median={statistics.median(r[key] for r in results):8.1f}")
+    print(f"initialized after import: {results[-1]['initialized_after_import']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 import os
-from google.cloud import secretmanager
+import threading
+from functools import lru_cache
+
+# Clients below are created on first use, not at import, to keep Cloud Run cold starts short.
+# With USE_LOCAL_RESOURCES=true they are replaced by in-process stand-ins (local dev and tests).
+USE_LOCAL_RESOURCES = os.environ.get('USE_LOCAL_RESOURCES', 'false').lower() == 'true'
 
 # GCP Project configuration
 GCP_PROJECT_ID = os.environ.get('GCP_PROJECT_ID')
@@ -9,7 +14,6 @@ GCP_REGION = os.environ.get('GCP_REGION', 'us-central1')
 CLOUD_SQL_INSTANCE_NAME = os.environ.get('CLOUD_SQL_INSTANCE_NAME')
 CLOUD_SQL_DATABASE_NAME = os.environ.get('CLOUD_SQL_DATABASE_NAME')
 CLOUD_SQL_USER = os.environ.get('CLOUD_SQL_USER')
-CLOUD_SQL_PASSWORD = os.environ.get('CLOUD_SQL_PASSWORD')
 
 # Cloud Memorystore (Redis) configuration
 REDIS_HOST = os.environ.get('REDIS_HOST')
@@ -21,26 +25,146 @@ FIRESTORE_COLLECTION = os.environ.get('FIRESTORE_COLLECTION', 'adapt_agent_data'
 # Vertex AI configuration
 VERTEX_AI_ENDPOINT = os.environ.get('VERTEX_AI_ENDPOINT')
 
+# Redis URL
+REDIS_URL = os.environ.get('LOCAL_REDIS_URL', 'redis://localhost:6379') if USE_LOCAL_RESOURCES \
+    else f"redis://{REDIS_HOST}:{REDIS_PORT}"
+
+
+class LocalSecretManager:
+    """Stand-in for Secret Manager: `cloud-sql-password` is read from SECRET_CLOUD_SQL_PASSWORD."""
+
+    def access(self, secret_id):
+        env_name = 'SECRET_' + secret_id.upper().replace('-', '_')
+        value = os.environ.get(env_name)
+        if value is None:
+            raise KeyError(f"Local secret not set: {env_name}")
+        return value
+
+
+class LocalFirestoreDocument:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def set(self, data):
+        self._collection._docs[self.id] = dict(data)
+
+    def get(self):
+        return LocalFirestoreSnapshot(self.id, self._collection._docs.get(self.id))
+
+    def delete(self):
+        self._collection._docs.pop(self.id, None)
+
+
+class LocalFirestoreSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class LocalFirestoreCollection:
+    def __init__(self):
+        self._docs = {}
+        self._next_id = 0
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            self._next_id += 1
+            doc_id = f"local-{self._next_id}"
+        return LocalFirestoreDocument(self, doc_id)
+
+    def add(self, data):
+        document = self.document()
+        document.set(data)
+        return None, document
+
+    def stream(self):
+        return [LocalFirestoreSnapshot(doc_id, data) for doc_id, data in list(self._docs.items())]
+
+
+class LocalFirestoreClient:
+    """In-memory stand-in for the subset of firestore.Client the server uses."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def collection(self, name):
+        return self._collections.setdefault(name, LocalFirestoreCollection())
+
+
+@lru_cache(maxsize=None)
+def _secret_manager_client():
+    if USE_LOCAL_RESOURCES:
+        return LocalSecretManager()
+    from google.cloud import secretmanager
+
+    return secretmanager.SecretManagerServiceClient()
+
+
+@lru_cache(maxsize=None)
 def get_secret(secret_id):
-    client = secretmanager.SecretManagerServiceClient()
+    client = _secret_manager_client()
+    if isinstance(client, LocalSecretManager):
+        return client.access(secret_id)
     name = f"projects/{GCP_PROJECT_ID}/secrets/{secret_id}/versions/latest"
     response = client.access_secret_version(request={"name": name})
     return response.payload.data.decode("UTF-8")
 
-# Use Secret Manager for sensitive information
-if not CLOUD_SQL_PASSWORD:
-    CLOUD_SQL_PASSWORD = get_secret('cloud-sql-password')
 
-# Database URL for SQLAlchemy
-DATABASE_URL = f"postgresql://{CLOUD_SQL_USER}:{CLOUD_SQL_PASSWORD}@/{CLOUD_SQL_DATABASE_NAME}?host=/cloudsql/{GCP_PROJECT_ID}:{GCP_REGION}:{CLOUD_SQL_INSTANCE_NAME}"
+def get_cloud_sql_password():
+    # Use Secret Manager for sensitive information
+    return os.environ.get('CLOUD_SQL_PASSWORD') or get_secret('cloud-sql-password')
 
-# Redis URL
-REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
 
-# Firestore client initialization
-from google.cloud import firestore
-db = firestore.Client(project=GCP_PROJECT_ID)
+@lru_cache(maxsize=None)
+def get_database_url():
+    """Database URL for SQLAlchemy."""
+    if USE_LOCAL_RESOURCES:
+        return os.environ.get('LOCAL_DB_URL', 'sqlite:///adapt_agent_gpt.db')
+    return (f"postgresql://{CLOUD_SQL_USER}:{get_cloud_sql_password()}@/{CLOUD_SQL_DATABASE_NAME}"
+            f"?host=/cloudsql/{GCP_PROJECT_ID}:{GCP_REGION}:{CLOUD_SQL_INSTANCE_NAME}")
+
+
+@lru_cache(maxsize=None)
+def get_firestore_client():
+    if USE_LOCAL_RESOURCES:
+        return LocalFirestoreClient()
+    from google.cloud import firestore
+
+    return firestore.Client(project=GCP_PROJECT_ID)
+
+
+_vertex_ai_lock = threading.Lock()
+_vertex_ai_ready = False
+
+
+def init_vertex_ai():
+    """Run aiplatform.init once, before the first Vertex AI call; a no-op locally."""
+    global _vertex_ai_ready
+    if _vertex_ai_ready:
+        return
+    with _vertex_ai_lock:
+        if not _vertex_ai_ready:
+            if not USE_LOCAL_RESOURCES:
+                from google.cloud import aiplatform
+
+                aiplatform.init(project=GCP_PROJECT_ID, location=GCP_REGION)
+            _vertex_ai_ready = True
+
+
+# Names that used to be computed at import; resolved on first access instead
+_LAZY_ATTRIBUTES = {
+    'CLOUD_SQL_PASSWORD': get_cloud_sql_password,
+    'DATABASE_URL': get_database_url,
+    'db': get_firestore_client,
+}
+
 
-# Vertex AI client initialization
-from google.cloud import aiplatform
-aiplatform.init(project=GCP_PROJECT_ID, location=GCP_REGION)
\ No newline at end of file
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,332 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker, selectinload
+from starlette.concurrency import run_in_threadpool
+
+from .database_manager import DatabaseManager, User, Project, Task, Knowledge, project_knowledge, get_db_manager
+from .cache import projects_by_user_key, tasks_by_project_key, project_keys
+from .db_config import load_pool_config
+from .knowledge_dedup import fingerprint
+from .pool import engine_options, install_sqlite_pragmas
+from .sampled_logger import SampledLogger
+
+logger = logging.getLogger(__name__)
+read_logger = SampledLogger(logging.getLogger(__name__ + '.reads'))
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def to_async_url(db_url):
+    scheme, rest = db_url.split('://', 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+class AsyncDatabaseManager:
+    """asyncio counterpart of DatabaseManager for the SQL models.
+
+    Schema setup, the full-text index and the vector index are owned by the
+    synchronous DatabaseManager passed in; this class only issues queries.
+    """
+
+    def __init__(self, sync_manager: DatabaseManager):
+        self.sync_manager = sync_manager
+        self.db_url = to_async_url(sync_manager.db_url)
+        self.pool_config = load_pool_config()
+        self.engine = create_async_engine(self.db_url, **engine_options(self.db_url, self.pool_config, use_async=True))
+        install_sqlite_pragmas(self.engine.sync_engine)
+        self.SessionLocal = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        logger.info("Async database initialized with URL: %s", self.db_url)
+
+    @property
+    def cache(self):
+        return self.sync_manager.cache
+
+    def get_session(self):
+        # The synchronous manager creates the schema; make sure that has happened
+        self.sync_manager.backends.get('sql')
+        return self.SessionLocal()
+
+    @asynccontextmanager
+    async def session_scope(self, session=None):
+        if session is not None:
+            yield session
+            return
+        async with self.get_session() as own_session:
+            yield own_session
+
+    def pool_metrics(self):
+        pool = self.engine.sync_engine.pool
+        if hasattr(pool, 'metrics'):
+            return pool.metrics()
+        return {'pool': pool.status()}
+
+    async def dispose(self):
+        await self.engine.dispose()
+
+    async def _add(self, obj, session=None):
+        async with self.session_scope(session) as session:
+            session.add(obj)
+            await session.commit()
+            return obj
+
+    async def _first(self, statement, session=None):
+        async with self.session_scope(session) as session:
+            return (await session.execute(statement)).scalars().first()
+
+    async def _all(self, statement, session=None):
+        async with self.session_scope(session) as session:
+            return (await session.execute(statement)).scalars().all()
+
+    # User operations
+    async def create_user(self, username, email, password_hash, session=None):
+        logger.info("Creating user: %s", username)
+        user = await self._add(User(username=username, email=email, password_hash=password_hash), session)
+        logger.info("User created: %s", username)
+        return user
+
+    async def get_user_by_username(self, username, session=None):
+        read_logger.info("Fetching user by username: %s", username)
+        return await self._first(select(User).where(User.username == username), session)
+
+    # Project operations
+    async def create_project(self, name, description, user_id, session=None):
+        logger.info("Creating project: %s for user_id: %s", name, user_id)
+        project = await self._add(Project(name=name, description=description, user_id=user_id), session)
+        await self.cache.ainvalidate(projects_by_user_key(user_id), *project_keys(project.id))
+        logger.info("Project created: %s", name)
+        return project
+
+    async def get_projects_by_user(self, user_id, session=None):
+        read_logger.info("Fetching projects for user_id: %s", user_id)
+        return await self.cache.aget_or_set(
+            projects_by_user_key(user_id),
+            lambda: self._all(select(Project).where(Project.user_id == user_id), session),
+        )
+
+    async def get_project_by_id(self, project_id, session=None):
+        read_logger.info("Fetching project by id: %s", project_id)
+        return await self._first(select(Project).where(Project.id == project_id), session)
+
+    # Task operations
+    async def create_task(self, title, description, user_id, project_id=None, session=None, **values):
+        logger.info("Creating task: %s for user_id: %s, project_id: %s", title, user_id, project_id)
+        task = await self._add(Task(title=title, description=description, user_id=user_id, project_id=project_id,
+                                    **values), session)
+        if project_id is not None:
+            await self.cache.ainvalidate(*project_keys(project_id))
+        logger.info("Task created: %s", title)
+        return task
+
+    async def get_tasks_by_user(self, user_id, session=None):
+        read_logger.info("Fetching tasks for user_id: %s", user_id)
+        return await self._all(select(Task).where(Task.user_id == user_id, Task.job_kind.is_(None)), session)
+
+    async def get_tasks_by_project(self, project_id, session=None):
+        read_logger.info("Fetching tasks for project_id: %s", project_id)
+        return await self.cache.aget_or_set(
+            tasks_by_project_key(project_id),
+            lambda: self._all(select(Task).where(Task.project_id == project_id, Task.job_kind.is_(None)), session),
+        )
+
+    async def get_task_by_id(self, task_id, session=None):
+        read_logger.info("Fetching task by id: %s", task_id)
+        return await self._first(select(Task).where(Task.id == task_id), session)
+
+    async def update_task(self, task_id, session=None, **values):
+        logger.info("Updating task: task_id: %s, fields: %s", task_id, sorted(values))
+        async with self.session_scope(session) as session:
+            task = (await session.execute(select(Task).where(Task.id == task_id))).scalars().first()
+            if task is None:
+                logger.warning("Task not found: %s", task_id)
+                return None
+            # Moving a task to another project changes what both projects derive from their tasks
+            project_ids = {task.project_id}
+            for name, value in values.items():
+                setattr(task, name, value)
+            project_ids.add(task.project_id)
+            project_ids.discard(None)
+            await session.commit()
+            if project_ids:
+                await self.cache.ainvalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+            return task
+
+    async def update_task_status(self, task_id, new_status, session=None):
+        logger.info("Updating task status: task_id: %s, new_status: %s", task_id, new_status)
+        async with self.session_scope(session) as session:
+            task = (await session.execute(select(Task).where(Task.id == task_id))).scalars().first()
+            if task:
+                task.status = new_status
+                await session.commit()
+                if task.project_id is not None:
+                    await self.cache.ainvalidate(*project_keys(task.project_id))
+                logger.info("Task status updated: %s", task_id)
+                return task
+            logger.warning("Task not found: %s", task_id)
+            return None
+
+    # Job rows (server.jobs): tasks with job_kind set
+    async def touch_jobs(self, task_ids, session=None):
+        async with self.session_scope(session) as session:
+            await session.execute(update(Task).where(Task.id.in_(task_ids), Task.job_heartbeat_at.isnot(None))
+                                  .values(job_heartbeat_at=datetime.utcnow()))
+            await session.commit()
+
+    async def finish_stale_jobs(self, older_than, status, description, session=None):
+        """Give live job rows whose heartbeat stopped before `older_than` a final state; returns how many."""
+        async with self.session_scope(session) as session:
+            result = await session.execute(
+                update(Task).where(Task.job_heartbeat_at < older_than)
+                .values(status=status, description=description, job_heartbeat_at=None)
+            )
+            await session.commit()
+        return result.rowcount
+
+    # Knowledge operations
+    async def create_knowledge(self, content, tags, model, user_id, session=None):
+        return (await self.store_knowledge(content, tags, model, user_id, session))[0]
+
+    async def store_knowledge(self, content, tags, model, user_id, session=None):
+        logger.info("Creating knowledge entry for user_id: %s", user_id)
+        # MinHash is CPU-bound for long content; keep it off the event loop
+        fp = await run_in_threadpool(fingerprint, content)
+        async with self.session_scope(session) as session:
+            knowledge, created, project_ids = await session.run_sync(
+                self.sync_manager._store_knowledge, content, tags, model, user_id, fp
+            )
+        if project_ids:
+            await self.cache.ainvalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+        if created:
+            try:
+                # Embedding may be CPU- or network-bound; keep it off the event loop
+                await run_in_threadpool(self.sync_manager.vector_index.add, user_id, knowledge.id, content)
+            except Exception:
+                logger.exception("Failed to index knowledge entry: %s", knowledge.id)
+        return knowledge, created
+
+    async def get_knowledge_entries(self, user_id, session=None):
+        read_logger.info("Fetching knowledge entries for user_id: %s", user_id)
+        return await self._all(select(Knowledge).where(Knowledge.user_id == user_id), session)
+
+    async def get_knowledge_by_project(self, project_id, session=None):
+        read_logger.info("Fetching knowledge entries for project_id: %s", project_id)
+        return await self._all(
+            select(Knowledge).join(project_knowledge, project_knowledge.c.knowledge_id == Knowledge.id)
+            .where(project_knowledge.c.project_id == project_id).order_by(Knowledge.id),
+            session,
+        )
+
+    async def _knowledge_by_ids(self, ids, session):
+        rows = await self._all(select(Knowledge).where(Knowledge.id.in_(ids)), session)
+        by_id = {k.id: k for k in rows}
+        return [by_id[knowledge_id] for knowledge_id in ids if knowledge_id in by_id]
+
+    async def search_knowledge(self, query, user_id, tags=None, limit=50, offset=0, session=None):
+        read_logger.info("Searching knowledge entries: query: %s, user_id: %s, tags: %s", query, user_id, tags)
+        fulltext_index = self.sync_manager.fulltext_index
+        async with self.session_scope(session) as session:
+            conn = await session.connection()
+            matches = await conn.run_sync(
+                lambda sync_conn: fulltext_index.search(sync_conn, query, user_id, tags, limit, offset)
+            )
+            if not matches:
+                return []
+            return await self._knowledge_by_ids([knowledge_id for knowledge_id, _ in matches], session)
+
+    async def semantic_search_knowledge(self, query, user_id, top_k=10, session=None):
+        read_logger.info("Semantic knowledge search: user_id: %s, top_k: %s", user_id, top_k)
+        matches = await run_in_threadpool(self.sync_manager.vector_index.search, user_id, query, top_k)
+        if not matches:
+            return []
+        scores = dict(matches)
+        rows = await self._knowledge_by_ids([knowledge_id for knowledge_id, _ in matches], session)
+        return [(k, scores[k.id]) for k in rows if k.user_id == user_id]
+
+    async def add_knowledge_to_project(self, knowledge_id, project_id, session=None):
+        logger.info("Adding knowledge to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
+        async with self.session_scope(session) as session:
+            knowledge = (await session.execute(select(Knowledge).where(Knowledge.id == knowledge_id))).scalars().first()
+            project = (await session.execute(
+                select(Project).where(Project.id == project_id).options(selectinload(Project.knowledge))
+            )).scalars().first()
+            if knowledge and project:
+                project.knowledge.append(knowledge)
+                await session.commit()
+                await self.cache.ainvalidate(*project_keys(project_id))
+                logger.info("Knowledge added to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
+                return True
+            logger.warning("Failed to add knowledge to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
+            return False
+
+    # Paginated/streamed list operations, mirroring DatabaseManager.list_* and stream_*
+    def _list_select(self, model, fields, filters):
+        columns = [getattr(model, f) for f in fields]
+        return select(*columns).where(*filters).order_by(model.id)
+
+    async def _list_page(self, model, resource, fields, filters, cursor=None, limit=100, session=None):
+        fields = self.sync_manager._resolve_fields(resource, fields)
+        statement = self._list_select(model, fields, filters)
+        if cursor is not None:
+            statement = statement.where(model.id > cursor)
+        async with self.session_scope(session) as session:
+            rows = (await session.execute(statement.limit(limit + 1))).all()
+        items = [row._asdict() for row in rows[:limit]]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return items, next_cursor
+
+    def _list_stream(self, model, resource, fields, filters, batch_size=1000):
+        fields = self.sync_manager._resolve_fields(resource, fields)
+        return self._iter_rows(model, fields, filters, batch_size)
+
+    async def _iter_rows(self, model, fields, filters, batch_size):
+        statement = self._list_select(model, fields, filters).execution_options(max_row_buffer=batch_size)
+        async with self.get_session() as session:
+            result = await session.stream(statement)
+            async for row in result:
+                yield row._asdict()
+
+    def list_projects(self, user_id, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing projects for user_id: %s, cursor: %s, limit: %s", user_id, cursor, limit)
+        return self._list_page(Project, 'projects', fields, [Project.user_id == user_id], cursor, limit, session)
+
+    def stream_projects(self, user_id, fields=None):
+        read_logger.info("Streaming projects for user_id: %s", user_id)
+        return self._list_stream(Project, 'projects', fields, [Project.user_id == user_id])
+
+    def list_tasks(self, user_id, project_id=None, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing tasks for user_id: %s, project_id: %s, cursor: %s, limit: %s", user_id, project_id, cursor, limit)
+        filters = self.sync_manager._task_filters(user_id, project_id)
+        return self._list_page(Task, 'tasks', fields, filters, cursor, limit, session)
+
+    def stream_tasks(self, user_id, project_id=None, fields=None):
+        read_logger.info("Streaming tasks for user_id: %s, project_id: %s", user_id, project_id)
+        return self._list_stream(Task, 'tasks', fields, self.sync_manager._task_filters(user_id, project_id))
+
+    def list_knowledge(self, user_id, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing knowledge entries for user_id: %s, cursor: %s, limit: %s", user_id, cursor, limit)
+        return self._list_page(Knowledge, 'knowledge', fields, [Knowledge.user_id == user_id], cursor, limit, session)
+
+    def stream_knowledge(self, user_id, fields=None):
+        read_logger.info("Streaming knowledge entries for user_id: %s", user_id)
+        return self._list_stream(Knowledge, 'knowledge', fields, [Knowledge.user_id == user_id])
+
+
+_async_db_manager = None
+_async_db_manager_lock = threading.Lock()
+
+
+def get_async_db_manager():
+    """Return the AsyncDatabaseManager shared by everything in this process."""
+    global _async_db_manager
+    if _async_db_manager is None:
+        with _async_db_manager_lock:
+            if _async_db_manager is None:
+                _async_db_manager = AsyncDatabaseManager(get_db_manager())
+    return _async_db_manager
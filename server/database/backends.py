@@ -0,0 +1,63 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackendRegistry:
+    """Creates named backends on first use and keeps a single instance of each.
+
+    Factories are plain callables, so a backend can be swapped (e.g. for an
+    in-memory fake) by registering another factory before it is first used.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._closers = {}
+        self._instances = {}
+        self.init_seconds = {}
+        # Re-entrant: a factory may fetch another backend it depends on
+        self._lock = threading.RLock()
+
+    def register(self, name, factory, close=None):
+        with self._lock:
+            if name in self._instances:
+                raise RuntimeError(f"Backend already initialized: {name}")
+            self._factories[name] = factory
+            self._closers[name] = close
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown backend: {name}")
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.init_seconds[name] = time.perf_counter() - started
+                logger.info("Backend initialized: %s in %.1fms", name, self.init_seconds[name] * 1000)
+            return self._instances[name]
+
+    def is_initialized(self, name):
+        return name in self._instances
+
+    def status(self):
+        return {
+            name: {'initialized': name in self._instances,
+                   'init_ms': round(self.init_seconds[name] * 1000, 3) if name in self.init_seconds else None}
+            for name in self._factories
+        }
+
+    def close_all(self):
+        with self._lock:
+            for name, instance in list(self._instances.items()):
+                close = self._closers.get(name)
+                if close is not None:
+                    try:
+                        close(instance)
+                    except Exception:
+                        logger.exception("Failed to close backend: %s", name)
+                del self._instances[name]
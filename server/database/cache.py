@@ -0,0 +1,355 @@
+import os
+import time
+import pickle
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+
+from .db_config import load_shared_config
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory')
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'adapt:')
+CACHE_DEFAULT_TTL_SECONDS = float(os.getenv('CACHE_DEFAULT_TTL_SECONDS', '300'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry TTL. Only shared by threads of one worker."""
+
+    blocking = False
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class NullCacheBackend:
+    """Caches nothing; for processes whose invalidations could never reach a private cache."""
+
+    blocking = False
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+class FakeRedis:
+    """Local stand-in for redis.Redis implementing the commands RedisCacheBackend uses."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match=None):
+        prefix = match.rstrip('*') if match else ''
+        with self._lock:
+            return [key for key in list(self._data) if key.startswith(prefix)]
+
+    def dbsize(self):
+        return len(self._data)
+
+
+class RedisCacheBackend:
+    """Cache shared by every worker and instance through Redis (e.g. Memorystore)."""
+
+    blocking = True
+
+    def __init__(self, client=None, url=None, prefix=CACHE_KEY_PREFIX):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.prefix + prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        self.delete_prefix('')
+
+    def size(self):
+        return len(list(self.client.scan_iter(match=self.prefix + '*')))
+
+
+class _LoadCancelled(Exception):
+    """Set on a shared load whose loading caller was cancelled."""
+
+
+class ResultCache:
+    """Read-through cache of query and agent results on top of a pluggable backend.
+
+    Values are pickled, so every backend returns an independent copy and ORM
+    objects come back detached. A miss is loaded once per key per process
+    (single-flight); concurrent callers for the same key wait for that load.
+    """
+
+    def __init__(self, backend, default_ttl=CACHE_DEFAULT_TTL_SECONDS):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def _read(self, key):
+        try:
+            raw = self.backend.get(key)
+        except Exception:
+            # A cache outage degrades to uncached reads instead of failing requests
+            self.errors += 1
+            logger.exception("Cache read failed: %s", key)
+            return False, None
+        if raw is None:
+            return False, None
+        return True, pickle.loads(raw)
+
+    def _write(self, key, value, ttl):
+        try:
+            self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl or self.default_ttl)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache write failed: %s", key)
+
+    def get(self, key):
+        found, value = self._read(key)
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._write(key, value, ttl)
+
+    def get_or_set(self, key, loader, ttl=None):
+        found, value = self._read(key)
+        if found:
+            self.hits += 1
+            return value
+        with self._locks_guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            # Another thread may have loaded it while we waited
+            found, value = self._read(key)
+            if found:
+                self.coalesced += 1
+                return value
+            self.misses += 1
+            self.loads += 1
+            try:
+                value = loader()
+                self._write(key, value, ttl)
+                return value
+            finally:
+                with self._locks_guard:
+                    self._locks.pop(key, None)
+
+    async def _aread(self, key):
+        if self.backend.blocking:
+            return await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+        return self._read(key)
+
+    async def _awrite(self, key, value, ttl):
+        if self.backend.blocking:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, key, value, ttl)
+        else:
+            self._write(key, value, ttl)
+
+    async def aget_or_set(self, key, loader, ttl=None):
+        """asyncio variant of get_or_set; `loader` is a coroutine function.
+
+        Concurrent callers for a key share one load. If the loading caller is
+        cancelled (its client went away), the waiters start the load again
+        instead of failing; loader errors are passed on to them.
+        """
+        while True:
+            found, value = await self._aread(key)
+            if found:
+                self.hits += 1
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LoadCancelled:
+                continue
+        self.misses += 1
+        self.loads += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+            await self._awrite(key, value, ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            # The waiters were not cancelled themselves; they retry rather than see CancelledError
+            future.set_exception(_LoadCancelled() if isinstance(e, asyncio.CancelledError) else e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, *keys):
+        try:
+            self.backend.delete(*keys)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache invalidation failed: %s", keys)
+
+    async def ainvalidate(self, *keys):
+        if self.backend.blocking:
+            await asyncio.get_running_loop().run_in_executor(None, self.invalidate, *keys)
+        else:
+            self.invalidate(*keys)
+
+    def invalidate_prefix(self, prefix):
+        """Drop every key starting with `prefix`; on Redis this scans the keyspace, so keep it off hot paths."""
+        try:
+            self.backend.delete_prefix(prefix)
+        except Exception:
+            self.errors += 1
+            logger.exception("Cache invalidation failed: %s*", prefix)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Cache keys, shared by both DatabaseManagers and the agent so invalidation matches reads
+def projects_by_user_key(user_id):
+    return f"projects:user:{user_id}"
+
+
+def tasks_by_project_key(project_id):
+    return f"tasks:project:{project_id}"
+
+
+def project_analysis_key(project_id):
+    return f"analysis:project:{project_id}"
+
+
+def project_keys(project_id):
+    """Everything derived from a project's tasks."""
+    return [tasks_by_project_key(project_id), project_analysis_key(project_id)]
+
+
+def create_result_cache(name=None):
+    name = name or CACHE_BACKEND
+    if name == 'memory':
+        backend = MemoryCacheBackend()
+    elif name == 'redis':
+        url = os.getenv('REDIS_URL') or load_shared_config().get('REDIS_URL', 'redis://localhost:6379')
+        backend = RedisCacheBackend(url=url)
+    elif name == 'fake':
+        backend = RedisCacheBackend(client=FakeRedis())
+    elif name == 'none':
+        backend = NullCacheBackend()
+    else:
+        raise ValueError(f"Unknown cache backend: {name}")
+    logger.info("Result cache initialized: %s", name)
+    return ResultCache(backend)
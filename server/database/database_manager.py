@@ -1,21 +1,53 @@
 import os
+import io
+import csv
+import time
 import logging
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Table
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from sqlalchemy import (create_engine, text, select, update, and_, or_, func, Column, Integer, SmallInteger,
+                        BigInteger, String, Text, DateTime, ForeignKey, Index, Table)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from contextlib import contextmanager
 from datetime import datetime
-from pymongo import MongoClient
-from azure.cosmos import CosmosClient, PartitionKey
+
+from .backends import BackendRegistry
+from .cache import create_result_cache, projects_by_user_key, tasks_by_project_key, project_keys
+from .db_config import load_pool_config
+from .fulltext import create_fulltext_index
+from .knowledge_dedup import (KNOWLEDGE_DEDUP_BATCH_SIZE, KNOWLEDGE_NEAR_DUP_MAX_CANDIDATES,
+                              KNOWLEDGE_NEAR_DUP_THRESHOLD, fingerprint, jaccard, merge_tags, shingles)
+from .pool import engine_options, install_sqlite_pragmas
+from .sampled_logger import SampledLogger
+from .vector_index import VectorIndex, create_embedder
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# Per-request reads are sampled so they don't dominate CPU and log volume
+read_logger = SampledLogger(logging.getLogger(__name__ + '.reads'))
+
+BULK_INSERT_BATCH_SIZE = int(os.getenv('BULK_INSERT_BATCH_SIZE', '1000'))
+BULK_USE_COPY = os.getenv('BULK_USE_COPY', 'true').lower() == 'true'
+MONGO_BACKEND = os.getenv('MONGO_BACKEND', 'mongo')
+MONGO_CURSOR_BATCH_SIZE = int(os.getenv('MONGO_CURSOR_BATCH_SIZE', '1000'))
+MONGO_BULK_BATCH_SIZE = int(os.getenv('MONGO_BULK_BATCH_SIZE', '1000'))
+COSMOS_BACKEND = os.getenv('COSMOS_BACKEND', 'cosmos')
+COSMOS_PAGE_SIZE = int(os.getenv('COSMOS_PAGE_SIZE', '100'))
+COSMOS_BULK_CONCURRENCY = int(os.getenv('COSMOS_BULK_CONCURRENCY', '8'))
 
 Base = declarative_base()
 
+# Indexes follow the read paths: per-user lists filter on user_id and page by id, project
+# reads filter on project_id. Existing databases get them from the db_migrations revision.
 project_knowledge = Table('project_knowledge', Base.metadata,
     Column('project_id', Integer, ForeignKey('projects.id')),
-    Column('knowledge_id', Integer, ForeignKey('knowledge.id'))
+    Column('knowledge_id', Integer, ForeignKey('knowledge.id')),
+    Index('ix_project_knowledge_project_id_knowledge_id', 'project_id', 'knowledge_id'),
+    Index('ix_project_knowledge_knowledge_id_project_id', 'knowledge_id', 'project_id'),
 )
 
 class User(Base):
@@ -39,6 +71,7 @@ class Project(Base):
     user = relationship('User', back_populates='projects')
     tasks = relationship('Task', back_populates='project')
     knowledge = relationship('Knowledge', secondary=project_knowledge, back_populates='projects')
+    __table_args__ = (Index('ix_projects_user_id_id', 'user_id', 'id'),)
 
 class Task(Base):
     __tablename__ = 'tasks'
@@ -49,8 +82,18 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     project_id = Column(Integer, ForeignKey('projects.id'), nullable=True)
+    # Set on the rows that carry background job state (server.jobs); task reads leave them out
+    job_kind = Column(String(50), nullable=True)
+    # Refreshed by the API process that holds the job while it is live, NULL once it is final
+    job_heartbeat_at = Column(DateTime, nullable=True)
     user = relationship('User', back_populates='tasks')
     project = relationship('Project', back_populates='tasks')
+    __table_args__ = (
+        Index('ix_tasks_user_id_id', 'user_id', 'id'),
+        # Leading project_id serves get_tasks_by_project; list_tasks with a project also matches user_id
+        Index('ix_tasks_project_id_user_id_id', 'project_id', 'user_id', 'id'),
+        Index('ix_tasks_job_heartbeat_at', 'job_heartbeat_at'),
+    )
 
 class Knowledge(Base):
     __tablename__ = 'knowledge'
@@ -60,14 +103,108 @@ class Knowledge(Base):
     model = Column(String(50), default='gpt-3.5-turbo')
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    # knowledge_dedup.content_hash(content); NULL until the dedup job has seen rows written before it existed
+    content_hash = Column(String(64))
     user = relationship('User', back_populates='knowledge_entries')
     projects = relationship('Project', secondary=project_knowledge, back_populates='knowledge')
+    __table_args__ = (
+        Index('ix_knowledge_user_id_id', 'user_id', 'id'),
+        Index('ix_knowledge_user_id_content_hash', 'user_id', 'content_hash', unique=True),
+    )
+
+# MinHash LSH buckets of each knowledge entry, one row per band (see knowledge_dedup)
+knowledge_lsh_buckets = Table('knowledge_lsh_buckets', Base.metadata,
+    Column('knowledge_id', Integer, ForeignKey('knowledge.id'), nullable=False),
+    Column('user_id', Integer, nullable=False),
+    Column('band', SmallInteger, nullable=False),
+    Column('bucket', BigInteger, nullable=False),
+    Index('ix_knowledge_lsh_buckets_user_id_band_bucket', 'user_id', 'band', 'bucket'),
+    Index('ix_knowledge_lsh_buckets_knowledge_id', 'knowledge_id'),
+)
+
+Duplicate = namedtuple('Duplicate', ['id', 'tags', 'exact'])
+
+
+def find_duplicate_knowledge(conn, user_id, fp):
+    """Return the Duplicate of `user_id`'s knowledge that `fp` matches, or None.
+
+    `conn` may be a Connection or a Session. An exact content hash match wins;
+    otherwise the most similar LSH candidate at or above the threshold, the
+    oldest on a tie, so repeated merges converge on one entry.
+    """
+    row = conn.execute(select(Knowledge.id, Knowledge.tags).where(
+        Knowledge.user_id == user_id, Knowledge.content_hash == fp.content_hash
+    )).first()
+    if row is not None:
+        return Duplicate(row.id, row.tags, True)
+    if not fp.bands:
+        return None
+    candidate_ids = select(knowledge_lsh_buckets.c.knowledge_id).where(
+        knowledge_lsh_buckets.c.user_id == user_id,
+        or_(*(and_(knowledge_lsh_buckets.c.band == band, knowledge_lsh_buckets.c.bucket == bucket)
+              for band, bucket in enumerate(fp.bands))),
+    ).distinct().order_by(knowledge_lsh_buckets.c.knowledge_id).limit(KNOWLEDGE_NEAR_DUP_MAX_CANDIDATES)
+    best, best_score = None, KNOWLEDGE_NEAR_DUP_THRESHOLD
+    for candidate in conn.execute(select(Knowledge.id, Knowledge.tags, Knowledge.content).where(
+        Knowledge.id.in_(candidate_ids.scalar_subquery())
+    ).order_by(Knowledge.id)):
+        score = jaccard(fp.shingles, shingles(candidate.content))
+        if score > best_score or (best is None and score == best_score):
+            best, best_score = Duplicate(candidate.id, candidate.tags, False), score
+    return best
+
+
+def add_lsh_buckets(conn, user_id, knowledge_id, bands):
+    if bands:
+        conn.execute(knowledge_lsh_buckets.insert(), [
+            {'knowledge_id': knowledge_id, 'user_id': user_id, 'band': band, 'bucket': bucket}
+            for band, bucket in enumerate(bands)
+        ])
+
+
+def merge_knowledge(conn, keeper, tags, duplicate_id=None):
+    """Union `tags` into the keeper; with `duplicate_id`, also move that entry's project links and delete it.
+
+    Returns the ids of the projects whose knowledge changed, for cache invalidation.
+    """
+    merged_tags = merge_tags(keeper.tags, tags)
+    if merged_tags != keeper.tags:
+        conn.execute(update(Knowledge).where(Knowledge.id == keeper.id).values(tags=merged_tags))
+    links = project_knowledge.c
+    project_ids = {row[0] for row in conn.execute(select(links.project_id).where(links.knowledge_id == keeper.id))}
+    if duplicate_id is not None:
+        moved = {row[0] for row in conn.execute(select(links.project_id).where(links.knowledge_id == duplicate_id))}
+        moved.discard(None)
+        if moved - project_ids:
+            conn.execute(project_knowledge.insert(), [
+                {'project_id': project_id, 'knowledge_id': keeper.id} for project_id in sorted(moved - project_ids)
+            ])
+        conn.execute(project_knowledge.delete().where(links.knowledge_id == duplicate_id))
+        conn.execute(knowledge_lsh_buckets.delete().where(knowledge_lsh_buckets.c.knowledge_id == duplicate_id))
+        conn.execute(Knowledge.__table__.delete().where(Knowledge.id == duplicate_id))
+        project_ids |= moved
+    project_ids.discard(None)
+    return project_ids
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class CosmosDBManager:
-    def __init__(self, url, key, database_name, container_name):
-        self.client = CosmosClient(url, credential=key)
-        self.database = self.client.get_database_client(database_name)
-        self.container = self.database.get_container_client(container_name)
+    def __init__(self, url, key, database_name, container_name, container=None):
+        # `container` skips the connection, e.g. for a FakeCosmosContainer
+        if container is None:
+            from azure.cosmos import CosmosClient
+
+            self.client = CosmosClient(url, credential=key)
+            self.database = self.client.get_database_client(database_name)
+            container = self.database.get_container_client(container_name)
+        self.container = container
 
     def create_item(self, item):
         return self.container.create_item(body=item)
@@ -76,7 +213,50 @@ class CosmosDBManager:
         return self.container.read_item(item=item_id, partition_key=partition_key)
 
     def query_items(self, query, parameters=None):
-        return list(self.container.query_items(query=query, parameters=parameters))
+        return list(self.stream_items(query, parameters))
+
+    def _pages(self, query, parameters, page_size, partition_key, continuation=None):
+        paged = self.container.query_items(
+            query=query, parameters=parameters, max_item_count=page_size, partition_key=partition_key,
+            enable_cross_partition_query=partition_key is None,
+        )
+        return paged.by_page(continuation)
+
+    def stream_items(self, query, parameters=None, page_size=COSMOS_PAGE_SIZE, partition_key=None):
+        """Yield matching items, fetching one page of `page_size` at a time."""
+        for page in self._pages(query, parameters, page_size, partition_key):
+            yield from page
+
+    def query_page(self, query, parameters=None, page_size=COSMOS_PAGE_SIZE, continuation=None, partition_key=None):
+        """Return (items, continuation); pass the continuation back for the next page, None means done."""
+        pages = self._pages(query, parameters, page_size, partition_key, continuation)
+        items = list(next(pages, []))
+        return items, pages.continuation_token
+
+    def upsert_items(self, items, max_concurrency=COSMOS_BULK_CONCURRENCY, batch_size=None):
+        """Upsert many items with at most `max_concurrency` requests in flight.
+
+        `items` may be a generator; it is consumed `batch_size` items at a time
+        (default 4 x max_concurrency), so memory stays bounded. Returns a report
+        with the count upserted and the (id, error) of each failure.
+        """
+        batch_size = batch_size or max_concurrency * 4
+        report = {'upserted': 0, 'failed': [], 'batches': 0}
+
+        def upsert(item):
+            try:
+                self.container.upsert_item(body=item)
+                return None
+            except Exception as e:
+                return item.get('id'), repr(e)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for batch in _batches(items, batch_size):
+                errors = [error for error in executor.map(upsert, batch) if error is not None]
+                report['upserted'] += len(batch) - len(errors)
+                report['failed'].extend(errors)
+                report['batches'] += 1
+        return report
 
     def update_item(self, item_id, updated_item):
         return self.container.upsert_item(body=updated_item)
@@ -84,170 +264,726 @@ class CosmosDBManager:
     def delete_item(self, item_id, partition_key):
         return self.container.delete_item(item=item_id, partition_key=partition_key)
 
+SQLBackend = namedtuple('SQLBackend', ['engine', 'SessionLocal', 'fulltext_index'])
+
+
+def create_sql_backend(db_url, pool_config):
+    engine = create_engine(db_url, **engine_options(db_url, pool_config))
+    install_sqlite_pragmas(engine)
+    # Objects stay readable after commit; callers use them once the session has closed
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    Base.metadata.create_all(engine)
+    logger.info("Database initialized with URL: %s", db_url)
+
+    # Knowledge full-text index setup
+    fulltext_index = create_fulltext_index(engine)
+    logger.info("Knowledge full-text index initialized: %s", fulltext_index.name)
+    return SQLBackend(engine, session_factory, fulltext_index)
+
+
+def create_vector_index():
+    index_dir = os.getenv('KNOWLEDGE_INDEX_DIR', 'knowledge_index')
+    vector_index = VectorIndex(index_dir, create_embedder())
+    logger.info("Knowledge vector index initialized in: %s", index_dir)
+    return vector_index
+
+
+def create_mongo_client():
+    if MONGO_BACKEND == 'fake':
+        from .document_fakes import FakeMongoClient
+
+        logger.info("MongoDB initialized: in-memory fake")
+        return FakeMongoClient()
+    from pymongo import MongoClient
+
+    mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
+    client = MongoClient(mongo_url)
+    logger.info("MongoDB initialized with URL: %s", mongo_url)
+    return client
+
+
+def create_cosmos_backend():
+    if COSMOS_BACKEND == 'fake':
+        from .document_fakes import FakeCosmosContainer
+
+        logger.info("Azure Cosmos DB initialized: in-memory fake")
+        return CosmosDBManager(None, None, None, None, container=FakeCosmosContainer())
+    cosmos_url = os.getenv('COSMOS_URL')
+    cosmos_db_name = os.getenv('COSMOS_DB_NAME')
+    cosmos_db = CosmosDBManager(cosmos_url, os.getenv('COSMOS_KEY'), cosmos_db_name, os.getenv('COSMOS_CONTAINER_NAME'))
+    logger.info("Azure Cosmos DB initialized with URL: %s, DB: %s", cosmos_url, cosmos_db_name)
+    return cosmos_db
+
+
 class DatabaseManager:
-    def __init__(self):
+    """Entry point for the SQL, vector, MongoDB and Cosmos stores.
+
+    Each store is a backend in `self.backends`, created on first use; pass
+    `backend_factories` (name -> callable) to plug in a different implementation.
+    Use get_db_manager() for the per-process shared instance.
+    """
+
+    def __init__(self, backend_factories=None):
         logger.info("Initializing DatabaseManager")
         self.db_url = os.getenv('DATABASE_URL', 'sqlite:///adapt_agent_gpt.db')
-        self.engine = create_engine(self.db_url)
-        self.SessionLocal = sessionmaker(bind=self.engine)
-        Base.metadata.create_all(self.engine)
-        logger.info(f"Database initialized with URL: {self.db_url}")
-
-        # MongoDB setup
-        mongo_url = os.getenv('MONGO_URL', 'mongodb://localhost:27017')
-        mongo_db_name = os.getenv('MONGO_DB_NAME', 'adapt_agent_gpt')
-        self.mongo_client = MongoClient(mongo_url)
-        self.mongo_db = self.mongo_client[mongo_db_name]
-        logger.info(f"MongoDB initialized with URL: {mongo_url}, DB: {mongo_db_name}")
-
-        # Azure Cosmos DB setup
-        cosmos_url = os.getenv('COSMOS_URL')
-        cosmos_key = os.getenv('COSMOS_KEY')
-        cosmos_db_name = os.getenv('COSMOS_DB_NAME')
-        cosmos_container_name = os.getenv('COSMOS_CONTAINER_NAME')
-        self.cosmos_db = CosmosDBManager(cosmos_url, cosmos_key, cosmos_db_name, cosmos_container_name)
-        logger.info(f"Azure Cosmos DB initialized with URL: {cosmos_url}, DB: {cosmos_db_name}")
+        self.pool_config = load_pool_config()
+        self.mongo_db_name = os.getenv('MONGO_DB_NAME', 'adapt_agent_gpt')
+
+        self.backends = BackendRegistry()
+        self.backends.register('sql', lambda: create_sql_backend(self.db_url, self.pool_config),
+                               close=lambda backend: backend.engine.dispose())
+        self.backends.register('vector_index', create_vector_index)
+        self.backends.register('mongo', create_mongo_client, close=lambda client: client.close())
+        self.backends.register('cosmos', create_cosmos_backend)
+        self.backends.register('cache', create_result_cache)
+        for name, factory in (backend_factories or {}).items():
+            self.backends.register(name, factory)
+
+    @property
+    def engine(self):
+        return self.backends.get('sql').engine
+
+    @property
+    def SessionLocal(self):
+        return self.backends.get('sql').SessionLocal
+
+    @property
+    def fulltext_index(self):
+        return self.backends.get('sql').fulltext_index
+
+    @property
+    def vector_index(self):
+        return self.backends.get('vector_index')
+
+    @property
+    def mongo_client(self):
+        return self.backends.get('mongo')
+
+    @property
+    def mongo_db(self):
+        return self.mongo_client[self.mongo_db_name]
+
+    @property
+    def cosmos_db(self):
+        return self.backends.get('cosmos')
+
+    @property
+    def cache(self):
+        return self.backends.get('cache')
+
+    def close(self):
+        self.backends.close_all()
 
     def get_session(self):
         return self.SessionLocal()
 
-    # User operations
-    def create_user(self, username, email, password_hash):
-        logger.info(f"Creating user: {username}")
+    @contextmanager
+    def session_scope(self, session=None):
+        # Reuse a request-scoped session when one is passed in; otherwise open and close our own
+        if session is not None:
+            yield session
+            return
+        with self.get_session() as own_session:
+            yield own_session
+
+    def pool_metrics(self):
+        pool = self.engine.pool
+        if hasattr(pool, 'metrics'):
+            return pool.metrics()
+        return {'pool': pool.status()}
+
+    # Fields that list endpoints may project; `id` is always included as the keyset cursor
+    LIST_FIELDS = {
+        'projects': ('id', 'name', 'description', 'created_at'),
+        'tasks': ('id', 'title', 'description', 'status', 'project_id', 'created_at'),
+        'knowledge': ('id', 'content', 'tags', 'model', 'created_at'),
+    }
+
+    def _resolve_fields(self, resource, fields):
+        allowed = self.LIST_FIELDS[resource]
+        fields = list(fields or allowed)
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown {resource} fields: {', '.join(unknown)}")
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        return fields
+
+    def _list_query(self, session, model, fields, filters):
+        columns = [getattr(model, f) for f in fields]
+        return session.query(*columns).filter(*filters).order_by(model.id)
+
+    def _list_page(self, model, resource, fields, filters, cursor=None, limit=100, session=None):
+        fields = self._resolve_fields(resource, fields)
+        with self.session_scope(session) as session:
+            query = self._list_query(session, model, fields, filters)
+            if cursor is not None:
+                query = query.filter(model.id > cursor)
+            rows = query.limit(limit + 1).all()
+        items = [row._asdict() for row in rows[:limit]]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return items, next_cursor
+
+    def _list_stream(self, model, resource, fields, filters, batch_size=1000):
+        # Validate eagerly so bad fields fail before a streaming response has started
+        fields = self._resolve_fields(resource, fields)
+        return self._iter_rows(model, fields, filters, batch_size)
+
+    def _iter_rows(self, model, fields, filters, batch_size):
+        # yield_per streams from a server-side cursor where the driver supports it
         with self.get_session() as session:
+            for row in self._list_query(session, model, fields, filters).yield_per(batch_size):
+                yield row._asdict()
+
+    def _task_filters(self, user_id, project_id=None):
+        filters = [Task.user_id == user_id, Task.job_kind.is_(None)]
+        if project_id is not None:
+            filters.append(Task.project_id == project_id)
+        return filters
+
+    def list_projects(self, user_id, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing projects for user_id: %s, cursor: %s, limit: %s", user_id, cursor, limit)
+        return self._list_page(Project, 'projects', fields, [Project.user_id == user_id], cursor, limit, session)
+
+    def stream_projects(self, user_id, fields=None):
+        read_logger.info("Streaming projects for user_id: %s", user_id)
+        return self._list_stream(Project, 'projects', fields, [Project.user_id == user_id])
+
+    def list_tasks(self, user_id, project_id=None, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing tasks for user_id: %s, project_id: %s, cursor: %s, limit: %s", user_id, project_id, cursor, limit)
+        return self._list_page(Task, 'tasks', fields, self._task_filters(user_id, project_id), cursor, limit, session)
+
+    def stream_tasks(self, user_id, project_id=None, fields=None):
+        read_logger.info("Streaming tasks for user_id: %s, project_id: %s", user_id, project_id)
+        return self._list_stream(Task, 'tasks', fields, self._task_filters(user_id, project_id))
+
+    def list_knowledge(self, user_id, fields=None, cursor=None, limit=100, session=None):
+        read_logger.info("Listing knowledge entries for user_id: %s, cursor: %s, limit: %s", user_id, cursor, limit)
+        return self._list_page(Knowledge, 'knowledge', fields, [Knowledge.user_id == user_id], cursor, limit, session)
+
+    def stream_knowledge(self, user_id, fields=None):
+        read_logger.info("Streaming knowledge entries for user_id: %s", user_id)
+        return self._list_stream(Knowledge, 'knowledge', fields, [Knowledge.user_id == user_id])
+
+    # User operations
+    def create_user(self, username, email, password_hash, session=None):
+        logger.info("Creating user: %s", username)
+        with self.session_scope(session) as session:
             new_user = User(username=username, email=email, password_hash=password_hash)
             session.add(new_user)
             session.commit()
-            logger.info(f"User created: {username}")
+            logger.info("User created: %s", username)
             return new_user
 
-    def get_user_by_username(self, username):
-        logger.info(f"Fetching user by username: {username}")
-        with self.get_session() as session:
+    def get_user_by_username(self, username, session=None):
+        read_logger.info("Fetching user by username: %s", username)
+        with self.session_scope(session) as session:
             return session.query(User).filter(User.username == username).first()
 
     # Project operations
-    def create_project(self, name, description, user_id):
-        logger.info(f"Creating project: {name} for user_id: {user_id}")
-        with self.get_session() as session:
+    def create_project(self, name, description, user_id, session=None):
+        logger.info("Creating project: %s for user_id: %s", name, user_id)
+        with self.session_scope(session) as session:
             new_project = Project(name=name, description=description, user_id=user_id)
             session.add(new_project)
             session.commit()
-            logger.info(f"Project created: {name}")
+            self.cache.invalidate(projects_by_user_key(user_id), *project_keys(new_project.id))
+            logger.info("Project created: %s", name)
             return new_project
 
-    def get_projects_by_user(self, user_id):
-        logger.info(f"Fetching projects for user_id: {user_id}")
-        with self.get_session() as session:
-            return session.query(Project).filter(Project.user_id == user_id).all()
+    def get_projects_by_user(self, user_id, session=None):
+        read_logger.info("Fetching projects for user_id: %s", user_id)
 
-    def get_project_by_id(self, project_id):
-        logger.info(f"Fetching project by id: {project_id}")
-        with self.get_session() as session:
+        def load():
+            with self.session_scope(session) as s:
+                return s.query(Project).filter(Project.user_id == user_id).all()
+
+        return self.cache.get_or_set(projects_by_user_key(user_id), load)
+
+    def get_project_by_id(self, project_id, session=None):
+        read_logger.info("Fetching project by id: %s", project_id)
+        with self.session_scope(session) as session:
             return session.query(Project).filter(Project.id == project_id).first()
 
     # Task operations
-    def create_task(self, title, description, user_id, project_id=None):
-        logger.info(f"Creating task: {title} for user_id: {user_id}, project_id: {project_id}")
-        with self.get_session() as session:
-            new_task = Task(title=title, description=description, user_id=user_id, project_id=project_id)
+    def create_task(self, title, description, user_id, project_id=None, session=None, **values):
+        logger.info("Creating task: %s for user_id: %s, project_id: %s", title, user_id, project_id)
+        with self.session_scope(session) as session:
+            new_task = Task(title=title, description=description, user_id=user_id, project_id=project_id, **values)
             session.add(new_task)
             session.commit()
-            logger.info(f"Task created: {title}")
+            if project_id is not None:
+                self.cache.invalidate(*project_keys(project_id))
+            logger.info("Task created: %s", title)
             return new_task
 
-    def get_tasks_by_user(self, user_id):
-        logger.info(f"Fetching tasks for user_id: {user_id}")
-        with self.get_session() as session:
-            return session.query(Task).filter(Task.user_id == user_id).all()
+    def get_tasks_by_user(self, user_id, session=None):
+        read_logger.info("Fetching tasks for user_id: %s", user_id)
+        with self.session_scope(session) as session:
+            return session.query(Task).filter(Task.user_id == user_id, Task.job_kind.is_(None)).all()
 
-    def get_tasks_by_project(self, project_id):
-        logger.info(f"Fetching tasks for project_id: {project_id}")
-        with self.get_session() as session:
-            return session.query(Task).filter(Task.project_id == project_id).all()
+    def get_tasks_by_project(self, project_id, session=None):
+        read_logger.info("Fetching tasks for project_id: %s", project_id)
 
-    def update_task_status(self, task_id, new_status):
-        logger.info(f"Updating task status: task_id: {task_id}, new_status: {new_status}")
-        with self.get_session() as session:
+        def load():
+            with self.session_scope(session) as s:
+                return s.query(Task).filter(Task.project_id == project_id, Task.job_kind.is_(None)).all()
+
+        return self.cache.get_or_set(tasks_by_project_key(project_id), load)
+
+    def get_task_by_id(self, task_id, session=None):
+        read_logger.info("Fetching task by id: %s", task_id)
+        with self.session_scope(session) as session:
+            return session.query(Task).filter(Task.id == task_id).first()
+
+    def update_task(self, task_id, session=None, **values):
+        logger.info("Updating task: task_id: %s, fields: %s", task_id, sorted(values))
+        with self.session_scope(session) as session:
+            task = session.query(Task).filter(Task.id == task_id).first()
+            if task is None:
+                logger.warning("Task not found: %s", task_id)
+                return None
+            # Moving a task to another project changes what both projects derive from their tasks
+            project_ids = {task.project_id}
+            for name, value in values.items():
+                setattr(task, name, value)
+            project_ids.add(task.project_id)
+            project_ids.discard(None)
+            session.commit()
+            if project_ids:
+                self.cache.invalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+            return task
+
+    def update_task_status(self, task_id, new_status, session=None):
+        logger.info("Updating task status: task_id: %s, new_status: %s", task_id, new_status)
+        with self.session_scope(session) as session:
             task = session.query(Task).filter(Task.id == task_id).first()
             if task:
                 task.status = new_status
                 session.commit()
-                logger.info(f"Task status updated: {task_id}")
+                if task.project_id is not None:
+                    self.cache.invalidate(*project_keys(task.project_id))
+                logger.info("Task status updated: %s", task_id)
                 return task
-            logger.warning(f"Task not found: {task_id}")
+            logger.warning("Task not found: %s", task_id)
             return None
 
     # Knowledge operations
-    def create_knowledge(self, content, tags, model, user_id):
-        logger.info(f"Creating knowledge entry for user_id: {user_id}")
-        with self.get_session() as session:
-            new_knowledge = Knowledge(content=content, tags=tags, model=model, user_id=user_id)
-            session.add(new_knowledge)
+    def _store_knowledge(self, session, content, tags, model, user_id, fp):
+        """Insert the entry, or merge it into the user's duplicate of it; commits.
+
+        Returns (entry, created, project_ids), project_ids being the projects whose
+        knowledge changed. Takes a synchronous session, so AsyncDatabaseManager can
+        share it through run_sync.
+        """
+        for attempt in range(2):
+            duplicate = find_duplicate_knowledge(session, user_id, fp)
+            if duplicate is not None:
+                project_ids = merge_knowledge(session, duplicate, tags)
+                session.commit()
+                logger.info("Knowledge entry merged into %s duplicate: %s",
+                            'exact' if duplicate.exact else 'near', duplicate.id)
+                return session.get(Knowledge, duplicate.id, populate_existing=True), False, project_ids
+            entry = Knowledge(content=content, tags=tags, model=model, user_id=user_id, content_hash=fp.content_hash)
+            session.add(entry)
+            try:
+                session.flush()
+            except IntegrityError:
+                # A concurrent writer stored the same content first; the retry merges into it
+                session.rollback()
+                if attempt:
+                    raise
+                continue
+            add_lsh_buckets(session, user_id, entry.id, fp.bands)
             session.commit()
-            logger.info(f"Knowledge entry created: {new_knowledge.id}")
-            return new_knowledge
-
-    def get_knowledge_entries(self, user_id):
-        logger.info(f"Fetching knowledge entries for user_id: {user_id}")
-        with self.get_session() as session:
+            logger.info("Knowledge entry created: %s", entry.id)
+            return entry, True, set()
+
+    def create_knowledge(self, content, tags, model, user_id, session=None):
+        return self.store_knowledge(content, tags, model, user_id, session)[0]
+
+    def store_knowledge(self, content, tags, model, user_id, session=None):
+        """Like create_knowledge, but returns (entry, created); a duplicate returns the entry it merged into."""
+        logger.info("Creating knowledge entry for user_id: %s", user_id)
+        fp = fingerprint(content)
+        with self.session_scope(session) as session:
+            knowledge, created, project_ids = self._store_knowledge(session, content, tags, model, user_id, fp)
+        if project_ids:
+            self.cache.invalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+        if created:
+            try:
+                self.vector_index.add(user_id, knowledge.id, content)
+            except Exception:
+                logger.exception("Failed to index knowledge entry: %s", knowledge.id)
+        return knowledge, created
+
+    def get_knowledge_entries(self, user_id, session=None):
+        read_logger.info("Fetching knowledge entries for user_id: %s", user_id)
+        with self.session_scope(session) as session:
             return session.query(Knowledge).filter(Knowledge.user_id == user_id).all()
 
-    def search_knowledge(self, query, user_id):
-        logger.info(f"Searching knowledge entries: query: {query}, user_id: {user_id}")
-        with self.get_session() as session:
-            return session.query(Knowledge).filter(
+    def get_knowledge_by_project(self, project_id, session=None):
+        read_logger.info("Fetching knowledge entries for project_id: %s", project_id)
+        with self.session_scope(session) as session:
+            return session.query(Knowledge).join(
+                project_knowledge, project_knowledge.c.knowledge_id == Knowledge.id
+            ).filter(project_knowledge.c.project_id == project_id).order_by(Knowledge.id).all()
+
+    def search_knowledge(self, query, user_id, tags=None, limit=50, offset=0, session=None):
+        read_logger.info("Searching knowledge entries: query: %s, user_id: %s, tags: %s", query, user_id, tags)
+        with self.session_scope(session) as session:
+            matches = self.fulltext_index.search(session.connection(), query, user_id, tags, limit, offset)
+            if not matches:
+                return []
+            rows = session.query(Knowledge).filter(
+                Knowledge.id.in_([knowledge_id for knowledge_id, _ in matches])
+            ).all()
+        by_id = {k.id: k for k in rows}
+        return [by_id[knowledge_id] for knowledge_id, _ in matches if knowledge_id in by_id]
+
+    def semantic_search_knowledge(self, query, user_id, top_k=10, session=None):
+        read_logger.info("Semantic knowledge search: user_id: %s, top_k: %s", user_id, top_k)
+        matches = self.vector_index.search(user_id, query, top_k)
+        if not matches:
+            return []
+        with self.session_scope(session) as session:
+            rows = session.query(Knowledge).filter(
                 Knowledge.user_id == user_id,
-                Knowledge.content.ilike(f'%{query}%')
+                Knowledge.id.in_([knowledge_id for knowledge_id, _ in matches])
             ).all()
+        by_id = {k.id: k for k in rows}
+        return [(by_id[knowledge_id], score) for knowledge_id, score in matches if knowledge_id in by_id]
 
-    def add_knowledge_to_project(self, knowledge_id, project_id):
-        logger.info(f"Adding knowledge to project: knowledge_id: {knowledge_id}, project_id: {project_id}")
+    def reindex_knowledge(self, user_id):
+        logger.info("Rebuilding knowledge vector index for user_id: %s", user_id)
         with self.get_session() as session:
+            rows = session.query(Knowledge.id, Knowledge.content).filter(
+                Knowledge.user_id == user_id
+            ).order_by(Knowledge.id).yield_per(1000)
+            self.vector_index.rebuild(user_id, rows)
+
+    def dedup_knowledge(self, user_id=None, batch_size=KNOWLEDGE_DEDUP_BATCH_SIZE, progress=None):
+        """Fingerprint entries stored without a content hash and merge the duplicates among them.
+
+        Walks those rows by id, `batch_size` per transaction, looking each one up
+        through the content hash index and the LSH buckets in SQL, so memory is
+        bounded by the batch. An interrupted run resumes where it stopped. The
+        vector indexes of users who had entries merged are rebuilt at the end.
+        `progress(percent)` is called after every batch.
+        """
+        logger.info("Deduplicating knowledge entries: user_id: %s, batch_size: %s", user_id, batch_size)
+        filters = [Knowledge.content_hash.is_(None)]
+        if user_id is not None:
+            filters.append(Knowledge.user_id == user_id)
+        with self.engine.connect() as conn:
+            total = conn.execute(select(func.count()).select_from(Knowledge.__table__).where(*filters)).scalar()
+        report = {'scanned': 0, 'kept': 0, 'exact_duplicates': 0, 'near_duplicates': 0, 'batches': 0}
+        merged_users = set()
+        last_id = 0
+        while True:
+            project_ids = set()
+            with self.engine.begin() as conn:
+                rows = conn.execute(
+                    select(Knowledge.id, Knowledge.user_id, Knowledge.content, Knowledge.tags)
+                    .where(*filters, Knowledge.id > last_id).order_by(Knowledge.id).limit(batch_size)
+                ).all()
+                for row in rows:
+                    fp = fingerprint(row.content)
+                    duplicate = find_duplicate_knowledge(conn, row.user_id, fp)
+                    if duplicate is None:
+                        conn.execute(update(Knowledge).where(Knowledge.id == row.id).values(content_hash=fp.content_hash))
+                        add_lsh_buckets(conn, row.user_id, row.id, fp.bands)
+                        report['kept'] += 1
+                        continue
+                    project_ids |= merge_knowledge(conn, duplicate, row.tags, duplicate_id=row.id)
+                    merged_users.add(row.user_id)
+                    report['exact_duplicates' if duplicate.exact else 'near_duplicates'] += 1
+            if not rows:
+                break
+            last_id = rows[-1].id
+            report['scanned'] += len(rows)
+            report['batches'] += 1
+            if project_ids:
+                self.cache.invalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+            if progress is not None:
+                progress(100 * report['scanned'] / max(total, 1))
+        for merged_user_id in sorted(merged_users):
+            # Merged-away ids would otherwise keep taking top_k slots in semantic search
+            self.reindex_knowledge(merged_user_id)
+        logger.info("Deduplicated knowledge entries: %s", report)
+        return report
+
+    def add_knowledge_to_project(self, knowledge_id, project_id, session=None):
+        logger.info("Adding knowledge to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
+        with self.session_scope(session) as session:
             knowledge = session.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
             project = session.query(Project).filter(Project.id == project_id).first()
             if knowledge and project:
                 project.knowledge.append(knowledge)
                 session.commit()
-                logger.info(f"Knowledge added to project: knowledge_id: {knowledge_id}, project_id: {project_id}")
+                self.cache.invalidate(*project_keys(project_id))
+                logger.info("Knowledge added to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
                 return True
-            logger.warning(f"Failed to add knowledge to project: knowledge_id: {knowledge_id}, project_id: {project_id}")
+            logger.warning("Failed to add knowledge to project: knowledge_id: %s, project_id: %s", knowledge_id, project_id)
             return False
 
+    # Bulk operations
+    def bulk_create_tasks(self, tasks, user_id, batch_size=BULK_INSERT_BATCH_SIZE, use_copy=BULK_USE_COPY):
+        logger.info("Bulk creating tasks for user_id: %s, batch_size: %s", user_id, batch_size)
+        now = datetime.utcnow()
+        project_ids = set()
+
+        def rows():
+            for t in tasks:
+                project_ids.add(t.get('project_id'))
+                yield {
+                    'title': t['title'],
+                    'description': t.get('description'),
+                    'status': t.get('status') or 'To Do',
+                    'created_at': now,
+                    'user_id': user_id,
+                    'project_id': t.get('project_id'),
+                }
+
+        try:
+            report = self._bulk_insert(Task.__table__, rows(), batch_size, use_copy)
+        finally:
+            # Earlier batches are committed even if a later one fails
+            project_ids.discard(None)
+            if project_ids:
+                self.cache.invalidate(*(key for project_id in project_ids for key in project_keys(project_id)))
+        logger.info("Bulk created %s tasks for user_id: %s", report['inserted'], user_id)
+        return report
+
+    def bulk_create_knowledge(self, entries, user_id, batch_size=BULK_INSERT_BATCH_SIZE, use_copy=BULK_USE_COPY):
+        logger.info("Bulk creating knowledge entries for user_id: %s, batch_size: %s", user_id, batch_size)
+        now = datetime.utcnow()
+        rows = ({
+            'content': k['content'],
+            'tags': k.get('tags'),
+            'model': k.get('model') or 'gpt-3.5-turbo',
+            'created_at': now,
+            'user_id': user_id,
+        } for k in entries)
+        merged = {'rows': 0, 'project_ids': set()}
+        batch_bands = []
+
+        def dedup_batch(conn, batch):
+            # Duplicates of stored entries merge into them; duplicates within the batch merge into its first copy
+            kept, kept_fps, by_hash, by_bucket = [], [], {}, {}
+            for row in batch:
+                fp = fingerprint(row['content'])
+                local = by_hash.get(fp.content_hash)
+                if local is None:
+                    candidates = sorted({by_bucket[key] for key in enumerate(fp.bands) if key in by_bucket})
+                    local = next((i for i in candidates
+                                  if jaccard(fp.shingles, kept_fps[i].shingles) >= KNOWLEDGE_NEAR_DUP_THRESHOLD), None)
+                if local is not None:
+                    kept[local]['tags'] = merge_tags(kept[local]['tags'], row['tags'])
+                    merged['rows'] += 1
+                    continue
+                duplicate = find_duplicate_knowledge(conn, user_id, fp)
+                if duplicate is not None:
+                    merged['project_ids'] |= merge_knowledge(conn, duplicate, row['tags'])
+                    merged['rows'] += 1
+                    continue
+                row['content_hash'] = fp.content_hash
+                by_hash[fp.content_hash] = len(kept)
+                for key in enumerate(fp.bands):
+                    by_bucket.setdefault(key, len(kept))
+                kept.append(row)
+                kept_fps.append(fp)
+            batch_bands[:] = [fp.bands for fp in kept_fps]
+            return kept
+
+        def add_batch_buckets(conn, ids, batch):
+            bucket_rows = [
+                {'knowledge_id': knowledge_id, 'user_id': user_id, 'band': band, 'bucket': bucket}
+                for knowledge_id, bands in zip(ids, batch_bands) for band, bucket in enumerate(bands)
+            ]
+            if bucket_rows:
+                conn.execute(knowledge_lsh_buckets.insert(), bucket_rows)
+
+        def index_batch(ids, batch):
+            try:
+                self.vector_index.add_many(user_id, ids, [row['content'] for row in batch])
+            except Exception:
+                logger.exception("Failed to index bulk knowledge batch for user_id: %s", user_id)
+
+        try:
+            report = self._bulk_insert(Knowledge.__table__, rows, batch_size, use_copy, on_batch=index_batch,
+                                       before_insert=dedup_batch, after_insert=add_batch_buckets)
+        finally:
+            if merged['project_ids']:
+                self.cache.invalidate(*(key for project_id in merged['project_ids'] for key in project_keys(project_id)))
+        report['merged'] = merged['rows']
+        logger.info("Bulk created %s knowledge entries for user_id: %s, merged %s duplicates",
+                    report['inserted'], user_id, report['merged'])
+        return report
+
+    def _bulk_insert(self, table, rows, batch_size, use_copy, on_batch=None, before_insert=None, after_insert=None):
+        postgres = self.engine.dialect.name == 'postgresql'
+        method = 'copy' if postgres and use_copy else 'executemany'
+        report = {'inserted': 0, 'method': method, 'batches': []}
+        hooks = (on_batch, before_insert, after_insert)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self._insert_batch(table, batch, method, report, *hooks)
+                batch = []
+        if batch:
+            self._insert_batch(table, batch, method, report, *hooks)
+        return report
+
+    def _insert_batch(self, table, batch, method, report, on_batch, before_insert=None, after_insert=None):
+        started = time.perf_counter()
+        ids = None
+        # One transaction, and so one commit, per batch; the hooks run inside it
+        with self.engine.begin() as conn:
+            if before_insert is not None:
+                batch = before_insert(conn, batch)
+            if not batch:
+                pass  # before_insert dropped every row
+            elif self.engine.dialect.name == 'postgresql':
+                # Reserve ids up front so COPY rows (and the vector index) know them
+                sequence = conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': table.name}).scalar()
+                ids = [r[0] for r in conn.execute(
+                    text("SELECT nextval(:s) FROM generate_series(1, :n)"), {'s': sequence, 'n': len(batch)}
+                )]
+                for row, row_id in zip(batch, ids):
+                    row['id'] = row_id
+                if method == 'copy':
+                    self._copy_rows(conn, table, batch)
+                else:
+                    conn.execute(table.insert(), batch)
+            else:
+                conn.execute(table.insert(), batch)
+                if self.engine.dialect.name == 'sqlite':
+                    # The write lock is held for the whole executemany, so its rowids are contiguous
+                    last_id = conn.execute(text("SELECT last_insert_rowid()")).scalar()
+                    ids = list(range(last_id - len(batch) + 1, last_id + 1))
+            if batch and after_insert is not None:
+                if ids is None:
+                    logger.warning("Inserted ids unknown on %s; hooks that need them are skipped", self.engine.dialect.name)
+                else:
+                    after_insert(conn, ids, batch)
+        elapsed = time.perf_counter() - started
+        report['inserted'] += len(batch)
+        report['batches'].append({'batch': len(report['batches']), 'rows': len(batch), 'seconds': round(elapsed, 4)})
+        if on_batch is not None and batch:
+            if ids is None:
+                logger.warning("Inserted ids unknown on %s; run reindex_knowledge to index them", self.engine.dialect.name)
+            else:
+                on_batch(ids, batch)
+
+    def _copy_rows(self, conn, table, batch):
+        columns = list(batch[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([row[c] for c in columns])
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
     # MongoDB operations
     def create_document(self, collection_name, document):
-        logger.info(f"Creating document in MongoDB collection: {collection_name}")
+        logger.info("Creating document in MongoDB collection: %s", collection_name)
         collection = self.mongo_db[collection_name]
         result = collection.insert_one(document)
-        logger.info(f"Document created in MongoDB: {result.inserted_id}")
+        logger.info("Document created in MongoDB: %s", result.inserted_id)
         return result.inserted_id
 
-    def get_documents(self, collection_name, query=None):
-        logger.info(f"Fetching documents from MongoDB collection: {collection_name}")
+    def create_documents(self, collection_name, documents, batch_size=MONGO_BULK_BATCH_SIZE, ordered=False):
+        """insert_many in batches; `documents` may be a generator. Returns a report like bulk_create_tasks."""
+        logger.info("Bulk creating documents in MongoDB collection: %s, batch_size: %s", collection_name, batch_size)
+        collection = self.mongo_db[collection_name]
+        report = {'inserted': 0, 'batches': []}
+        for batch in _batches(documents, batch_size):
+            started = time.perf_counter()
+            result = collection.insert_many(batch, ordered=ordered)
+            report['inserted'] += len(result.inserted_ids)
+            report['batches'].append({'batch': len(report['batches']), 'rows': len(batch),
+                                      'seconds': round(time.perf_counter() - started, 4)})
+        logger.info("Bulk created %s documents in MongoDB collection: %s", report['inserted'], collection_name)
+        return report
+
+    def bulk_write_documents(self, collection_name, operations, batch_size=MONGO_BULK_BATCH_SIZE, ordered=False):
+        """bulk_write pymongo operations (InsertOne, UpdateOne, DeleteOne, ...) in batches; returns summed counts."""
+        logger.info("Bulk writing to MongoDB collection: %s, batch_size: %s", collection_name, batch_size)
         collection = self.mongo_db[collection_name]
-        return list(collection.find(query or {}))
+        report = {'inserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0, 'upserted': 0, 'batches': 0}
+        for batch in _batches(operations, batch_size):
+            result = collection.bulk_write(batch, ordered=ordered)
+            report['inserted'] += result.inserted_count
+            report['matched'] += result.matched_count
+            report['modified'] += result.modified_count
+            report['deleted'] += result.deleted_count
+            report['upserted'] += result.upserted_count
+            report['batches'] += 1
+        return report
+
+    def stream_documents(self, collection_name, query=None, projection=None, batch_size=MONGO_CURSOR_BATCH_SIZE):
+        """Yield matching documents from a server-side cursor, `batch_size` per round trip."""
+        read_logger.info("Streaming documents from MongoDB collection: %s", collection_name)
+        cursor = self.mongo_db[collection_name].find(query or {}, projection, batch_size=batch_size)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def get_documents(self, collection_name, query=None, projection=None):
+        # Loads every match; use stream_documents for large collections
+        return list(self.stream_documents(collection_name, query, projection))
 
     # Azure Cosmos DB operations
     def create_cosmos_item(self, item):
-        logger.info(f"Creating item in Cosmos DB")
+        logger.info("Creating item in Cosmos DB")
         return self.cosmos_db.create_item(item)
 
     def get_cosmos_item(self, item_id, partition_key):
-        logger.info(f"Fetching item from Cosmos DB: item_id: {item_id}")
+        read_logger.info("Fetching item from Cosmos DB: item_id: %s", item_id)
         return self.cosmos_db.read_item(item_id, partition_key)
 
     def query_cosmos_items(self, query, parameters=None):
-        logger.info(f"Querying items from Cosmos DB")
+        read_logger.info("Querying items from Cosmos DB")
         return self.cosmos_db.query_items(query, parameters)
 
+    def stream_cosmos_items(self, query, parameters=None, page_size=COSMOS_PAGE_SIZE, partition_key=None):
+        read_logger.info("Streaming items from Cosmos DB")
+        return self.cosmos_db.stream_items(query, parameters, page_size, partition_key)
+
+    def query_cosmos_page(self, query, parameters=None, page_size=COSMOS_PAGE_SIZE, continuation=None):
+        read_logger.info("Querying a page of items from Cosmos DB: page_size: %s", page_size)
+        return self.cosmos_db.query_page(query, parameters, page_size, continuation)
+
+    def upsert_cosmos_items(self, items, max_concurrency=COSMOS_BULK_CONCURRENCY):
+        logger.info("Bulk upserting items in Cosmos DB: max_concurrency: %s", max_concurrency)
+        report = self.cosmos_db.upsert_items(items, max_concurrency)
+        logger.info("Bulk upserted %s items in Cosmos DB, %s failed", report['upserted'], len(report['failed']))
+        return report
+
     def update_cosmos_item(self, item_id, updated_item):
-        logger.info(f"Updating item in Cosmos DB: item_id: {item_id}")
+        logger.info("Updating item in Cosmos DB: item_id: %s", item_id)
         return self.cosmos_db.update_item(item_id, updated_item)
 
     def delete_cosmos_item(self, item_id, partition_key):
-        logger.info(f"Deleting item from Cosmos DB: item_id: {item_id}")
+        logger.info("Deleting item from Cosmos DB: item_id: %s", item_id)
         return self.cosmos_db.delete_item(item_id, partition_key)
 
-# Initialize the database manager
-db_manager = DatabaseManager()
-logger.info("DatabaseManager initialized")
\ No newline at end of file
+_db_manager = None
+_db_manager_lock = threading.Lock()
+
+
+def get_db_manager():
+    """Return the DatabaseManager shared by everything in this process."""
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager()
+    return _db_manager
@@ -0,0 +1,40 @@
+import os
+import json
+
+SHARED_CONFIG_PATH = os.getenv(
+    'SHARED_CONFIG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared_config.json')
+)
+
+POOL_DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_QUERY_CACHE_SIZE': 500,
+}
+
+
+def load_shared_config(path=SHARED_CONFIG_PATH):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _coerce(value, default):
+    if isinstance(default, bool):
+        return str(value).lower() in ('1', 'true', 'yes')
+    return type(default)(value)
+
+
+def load_pool_config(shared_config=None):
+    # Precedence: environment variable, then shared_config.json, then the default
+    shared_config = load_shared_config() if shared_config is None else shared_config
+    config = {}
+    for key, default in POOL_DEFAULTS.items():
+        value = os.getenv(key, shared_config.get(key, default))
+        config[key] = _coerce(value, default)
+    return config
@@ -0,0 +1,324 @@
+"""In-memory stand-ins for the MongoDB and Cosmos DB clients.
+
+They implement the subset of pymongo and azure-cosmos that DatabaseManager and
+CosmosDBManager use, so the document paths run locally (MONGO_BACKEND=fake,
+COSMOS_BACKEND=fake) without a server.
+"""
+import re
+import copy
+import itertools
+import threading
+from collections import namedtuple
+
+InsertOneResult = namedtuple('InsertOneResult', ['inserted_id'])
+InsertManyResult = namedtuple('InsertManyResult', ['inserted_ids'])
+BulkWriteResult = namedtuple('BulkWriteResult', ['inserted_count', 'matched_count', 'modified_count',
+                                                 'deleted_count', 'upserted_count'])
+
+_COMPARISONS = {
+    '$eq': lambda value, arg: value == arg,
+    '$ne': lambda value, arg: value != arg,
+    '$gt': lambda value, arg: value is not None and value > arg,
+    '$gte': lambda value, arg: value is not None and value >= arg,
+    '$lt': lambda value, arg: value is not None and value < arg,
+    '$lte': lambda value, arg: value is not None and value <= arg,
+    '$in': lambda value, arg: value in arg,
+    '$nin': lambda value, arg: value not in arg,
+    '$exists': lambda value, arg: (value is not None) == arg,
+}
+
+
+def _get_path(document, path):
+    for part in path.split('.'):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def _matches(document, query):
+    for field, condition in (query or {}).items():
+        value = _get_path(document, field)
+        if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+            for operator, arg in condition.items():
+                if operator not in _COMPARISONS:
+                    raise NotImplementedError(f"FakeCollection does not support {operator}")
+                if not _COMPARISONS[operator](value, arg):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    if not projection:
+        return copy.deepcopy(document)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include = {field for field, keep in projection.items() if keep and field != '_id'}
+    if include:
+        result = {field: copy.deepcopy(document[field]) for field in include if field in document}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        return result
+    return {field: copy.deepcopy(value) for field, value in document.items() if projection.get(field, 1)}
+
+
+def _apply_update(document, update):
+    for operator, fields in update.items():
+        for field, value in fields.items():
+            if operator == '$set':
+                document[field] = copy.deepcopy(value)
+            elif operator == '$inc':
+                document[field] = document.get(field, 0) + value
+            elif operator == '$unset':
+                document.pop(field, None)
+            else:
+                raise NotImplementedError(f"FakeCollection does not support {operator}")
+
+
+class FakeCursor:
+    def __init__(self, documents, batch_size=0):
+        self._documents = documents
+        self.batch_size = batch_size
+        self.closed = False
+        # Batches handed out so far; a server cursor makes one round trip per batch (101 documents by default)
+        self.batches_fetched = 0
+
+    def __iter__(self):
+        for i, document in enumerate(self._documents):
+            if self.closed:
+                return
+            if i % (self.batch_size or 101) == 0:
+                self.batches_fetched += 1
+            yield document
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, name):
+        self.name = name
+        self._documents = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _insert(self, document):
+        document = copy.deepcopy(document)
+        document.setdefault('_id', next(self._ids))
+        if document['_id'] in self._documents:
+            raise ValueError(f"Duplicate _id: {document['_id']}")
+        self._documents[document['_id']] = document
+        return document['_id']
+
+    def insert_one(self, document):
+        with self._lock:
+            return InsertOneResult(self._insert(document))
+
+    def insert_many(self, documents, ordered=True):
+        with self._lock:
+            return InsertManyResult([self._insert(document) for document in documents])
+
+    def find(self, filter=None, projection=None, batch_size=0):
+        with self._lock:
+            documents = [_project(d, projection) for d in self._documents.values() if _matches(d, filter)]
+        return FakeCursor(documents, batch_size)
+
+    def _update(self, filter, update, upsert, many, replace=False):
+        matched = modified = upserted = 0
+        for document in list(self._documents.values()):
+            if _matches(document, filter):
+                matched += 1
+                if replace:
+                    replacement = copy.deepcopy(update)
+                    replacement['_id'] = document['_id']
+                    self._documents[document['_id']] = replacement
+                else:
+                    _apply_update(document, update)
+                modified += 1
+                if not many:
+                    break
+        if not matched and upsert:
+            document = {k: v for k, v in (filter or {}).items() if not isinstance(v, dict)}
+            if replace:
+                document.update(copy.deepcopy(update))
+            else:
+                _apply_update(document, update)
+            self._insert(document)
+            upserted = 1
+        return matched, modified, upserted
+
+    def _delete(self, filter, many):
+        deleted = 0
+        for document_id, document in list(self._documents.items()):
+            if _matches(document, filter):
+                del self._documents[document_id]
+                deleted += 1
+                if not many:
+                    break
+        return deleted
+
+    def bulk_write(self, requests, ordered=True):
+        # Reads the same attributes of pymongo's InsertOne/UpdateOne/... objects that mongomock does
+        inserted = matched = modified = deleted = upserted = 0
+        with self._lock:
+            for request in requests:
+                kind = type(request).__name__
+                if kind == 'InsertOne':
+                    self._insert(request._doc)
+                    inserted += 1
+                elif kind in ('UpdateOne', 'UpdateMany', 'ReplaceOne'):
+                    m, mod, up = self._update(request._filter, request._doc, request._upsert,
+                                              many=kind == 'UpdateMany', replace=kind == 'ReplaceOne')
+                    matched, modified, upserted = matched + m, modified + mod, upserted + up
+                elif kind in ('DeleteOne', 'DeleteMany'):
+                    deleted += self._delete(request._filter, many=kind == 'DeleteMany')
+                else:
+                    raise NotImplementedError(f"FakeCollection does not support {kind}")
+        return BulkWriteResult(inserted, matched, modified, deleted, upserted)
+
+    def count_documents(self, filter):
+        with self._lock:
+            return sum(1 for d in self._documents.values() if _matches(d, filter))
+
+
+class FakeMongoDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(name)
+        return self._collections[name]
+
+
+class FakeMongoClient:
+    """mongomock-style stand-in for pymongo.MongoClient."""
+
+    def __init__(self):
+        self._databases = {}
+
+    def __getitem__(self, name):
+        if name not in self._databases:
+            self._databases[name] = FakeMongoDatabase()
+        return self._databases[name]
+
+    def close(self):
+        pass
+
+
+class FakeCosmosError(Exception):
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_CONDITION = re.compile(r"c\.(\w+)\s*=\s*(@\w+|'[^']*'|-?\d+(?:\.\d+)?|true|false)", re.IGNORECASE)
+
+
+def _query_filter(query, parameters):
+    """Supports `SELECT * FROM c [WHERE c.a = @p AND c.b = 'x' ...]`, which covers this repo's queries."""
+    match = re.match(r"\s*SELECT\s+\*\s+FROM\s+c\b(?:\s+WHERE\s+(.*))?\s*$", query, re.IGNORECASE | re.DOTALL)
+    if not match:
+        raise NotImplementedError(f"FakeCosmosContainer does not support query: {query}")
+    values = {p['name']: p['value'] for p in parameters or []}
+    conditions = {}
+    for clause in re.split(r"\s+AND\s+", match.group(1) or '', flags=re.IGNORECASE):
+        if not clause.strip():
+            continue
+        condition = _CONDITION.fullmatch(clause.strip())
+        if not condition:
+            raise NotImplementedError(f"FakeCosmosContainer does not support condition: {clause}")
+        field, raw = condition.groups()
+        if raw.startswith('@'):
+            value = values[raw]
+        elif raw.startswith("'"):
+            value = raw[1:-1]
+        elif raw.lower() in ('true', 'false'):
+            value = raw.lower() == 'true'
+        else:
+            value = float(raw) if '.' in raw else int(raw)
+        conditions[field] = value
+    return lambda item: all(item.get(field) == value for field, value in conditions.items())
+
+
+class FakeCosmosPager:
+    def __init__(self, items, page_size, continuation_token):
+        self._items = items
+        self._page_size = page_size
+        self._offset = int(continuation_token or 0)
+        self.continuation_token = continuation_token
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._offset >= len(self._items):
+            raise StopIteration
+        page = self._items[self._offset:self._offset + self._page_size]
+        self._offset += len(page)
+        # Like the service, the token is opaque to callers and None after the last page
+        self.continuation_token = str(self._offset) if self._offset < len(self._items) else None
+        return iter(page)
+
+
+class FakeItemPaged:
+    def __init__(self, items, page_size):
+        self._items = items
+        self._page_size = page_size
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def by_page(self, continuation_token=None):
+        return FakeCosmosPager(self._items, self._page_size, continuation_token)
+
+
+class FakeCosmosContainer:
+    """In-memory stand-in for azure.cosmos ContainerProxy; items are keyed by (partition key, id)."""
+
+    def __init__(self, partition_key_path='/id'):
+        self.partition_key_field = partition_key_path.lstrip('/')
+        self._items = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _key(self, item):
+        return item.get(self.partition_key_field), item['id']
+
+    def create_item(self, body):
+        with self._lock:
+            self.requests += 1
+            if self._key(body) in self._items:
+                raise FakeCosmosError(409, f"Item already exists: {body['id']}")
+            self._items[self._key(body)] = copy.deepcopy(body)
+            return copy.deepcopy(body)
+
+    def upsert_item(self, body):
+        with self._lock:
+            self.requests += 1
+            self._items[self._key(body)] = copy.deepcopy(body)
+            return copy.deepcopy(body)
+
+    def read_item(self, item, partition_key):
+        with self._lock:
+            self.requests += 1
+            if (partition_key, item) not in self._items:
+                raise FakeCosmosError(404, f"Item not found: {item}")
+            return copy.deepcopy(self._items[(partition_key, item)])
+
+    def delete_item(self, item, partition_key):
+        with self._lock:
+            self.requests += 1
+            if self._items.pop((partition_key, item), None) is None:
+                raise FakeCosmosError(404, f"Item not found: {item}")
+
+    def query_items(self, query, parameters=None, partition_key=None, enable_cross_partition_query=None,
+                    max_item_count=None):
+        predicate = _query_filter(query, parameters)
+        with self._lock:
+            self.requests += 1
+            items = [copy.deepcopy(item) for (pk, _), item in sorted(self._items.items(), key=lambda kv: str(kv[0]))
+                     if (partition_key is None or pk == partition_key) and predicate(item)]
+        return FakeItemPaged(items, max_item_count or 100)
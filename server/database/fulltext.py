@@ -0,0 +1,159 @@
+import logging
+import re
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_tags(tags):
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return [tag.strip() for tag in tags if tag.strip()]
+
+
+def like_escape(value):
+    """`value` with LIKE wildcards escaped, for patterns used with ESCAPE '\\'."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def tag_clauses(tags, params):
+    """SQL requiring every tag in `tags` on k.tags; binds the patterns into `params`."""
+    sql = ""
+    for i, tag in enumerate(parse_tags(tags)):
+        sql += f" AND (',' || REPLACE(k.tags, ', ', ',') || ',') LIKE :tag_{i} ESCAPE '\\'"
+        params[f"tag_{i}"] = f"%,{like_escape(tag)},%"
+    return sql
+
+
+class SQLiteFullTextIndex:
+    """FTS5 external-content table over `knowledge`, kept in sync by triggers."""
+
+    name = "fts5"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def setup(self):
+        with self.engine.begin() as conn:
+            existed = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'"
+            )).first() is not None
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5("
+                "content, tags, content='knowledge', content_rowid='id', tokenize='porter unicode61')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS knowledge_fts_ai AFTER INSERT ON knowledge BEGIN "
+                "INSERT INTO knowledge_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS knowledge_fts_ad AFTER DELETE ON knowledge BEGIN "
+                "INSERT INTO knowledge_fts(knowledge_fts, rowid, content, tags) "
+                "VALUES ('delete', old.id, old.content, old.tags); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS knowledge_fts_au AFTER UPDATE ON knowledge BEGIN "
+                "INSERT INTO knowledge_fts(knowledge_fts, rowid, content, tags) "
+                "VALUES ('delete', old.id, old.content, old.tags); "
+                "INSERT INTO knowledge_fts(rowid, content, tags) VALUES (new.id, new.content, new.tags); END"
+            ))
+            if not existed:
+                # Backfill rows written before the index existed
+                conn.execute(text("INSERT INTO knowledge_fts(knowledge_fts) VALUES ('rebuild')"))
+
+    def search(self, conn, query, user_id, tags=None, limit=50, offset=0):
+        tokens = TOKEN_RE.findall(query)
+        if not tokens:
+            return []
+        # Quote every token so user input can never be parsed as FTS5 syntax
+        match = " ".join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+        sql = (
+            "SELECT k.id, bm25(knowledge_fts, 1.0, 0.5) AS rank FROM knowledge_fts "
+            "JOIN knowledge k ON k.id = knowledge_fts.rowid "
+            "WHERE knowledge_fts MATCH :match AND k.user_id = :user_id"
+        )
+        params = {"match": match, "user_id": user_id, "limit": limit, "offset": offset}
+        sql += tag_clauses(tags, params)
+        sql += " ORDER BY rank LIMIT :limit OFFSET :offset"
+        # bm25() is lower-is-better; flip it so callers always see higher-is-better
+        return [(row.id, -row.rank) for row in conn.execute(text(sql), params)]
+
+
+class PostgresFullTextIndex:
+    """Generated tsvector column with a GIN index, ranked with ts_rank_cd."""
+
+    name = "tsvector"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def setup(self):
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE knowledge ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, '') || ' ' || coalesce(tags, ''))) STORED"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_knowledge_search_vector ON knowledge USING GIN (search_vector)"
+            ))
+
+    def search(self, conn, query, user_id, tags=None, limit=50, offset=0):
+        sql = (
+            "SELECT k.id, ts_rank_cd(k.search_vector, q) AS rank "
+            "FROM knowledge k, plainto_tsquery('english', :query) q "
+            "WHERE k.user_id = :user_id AND k.search_vector @@ q"
+        )
+        params = {"query": query, "user_id": user_id, "limit": limit, "offset": offset}
+        for i, tag in enumerate(parse_tags(tags)):
+            sql += f" AND :tag_{i} = ANY(string_to_array(replace(k.tags, ', ', ','), ','))"
+            params[f"tag_{i}"] = tag
+        sql += " ORDER BY rank DESC LIMIT :limit OFFSET :offset"
+        return [(row.id, row.rank) for row in conn.execute(text(sql), params)]
+
+
+class LikeFullTextIndex:
+    """Fallback for databases without a full-text engine: the original case-insensitive substring scan.
+
+    ILIKE on PostgreSQL (reached when the tsvector column cannot be created),
+    lower() on both sides elsewhere; user input never acts as a wildcard.
+    """
+
+    name = "ilike"
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def setup(self):
+        pass
+
+    def search(self, conn, query, user_id, tags=None, limit=50, offset=0):
+        if self.engine.dialect.name == "postgresql":
+            match = "k.content ILIKE :pattern ESCAPE '\\'"
+        else:
+            match = "lower(k.content) LIKE lower(:pattern) ESCAPE '\\'"
+        sql = f"SELECT k.id FROM knowledge k WHERE k.user_id = :user_id AND {match}"
+        params = {"pattern": f"%{like_escape(query)}%", "user_id": user_id, "limit": limit, "offset": offset}
+        sql += tag_clauses(tags, params)
+        sql += " ORDER BY k.id LIMIT :limit OFFSET :offset"
+        return [(row.id, 0.0) for row in conn.execute(text(sql), params)]
+
+
+def create_fulltext_index(engine):
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        index = PostgresFullTextIndex(engine)
+    elif dialect == "sqlite":
+        index = SQLiteFullTextIndex(engine)
+    else:
+        index = LikeFullTextIndex(engine)
+    try:
+        index.setup()
+    except Exception:
+        logger.exception("Full-text index '%s' unavailable, falling back to LIKE search", index.name)
+        index = LikeFullTextIndex(engine)
+    return index
@@ -0,0 +1,85 @@
+import time
+import threading
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetricsMixin:
+    """Records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                self.wait_count += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def metrics(self):
+        with self._metrics_lock:
+            avg_wait = self.wait_seconds_total / self.wait_count if self.wait_count else 0.0
+            return {
+                'size': self.size(),
+                'checked_in': self.checkedin(),
+                'checked_out': self.checkedout(),
+                'overflow': self.overflow(),
+                'checkouts': self.wait_count,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(avg_wait * 1000, 3),
+                'max_wait_ms': round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+class MeteredQueuePool(PoolMetricsMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(db_url, pool_config, use_async=False):
+    options = {'query_cache_size': pool_config['DB_QUERY_CACHE_SIZE']}
+    if db_url.split('://')[1] in ('', '/:memory:'):
+        # In-memory SQLite lives inside a single connection; keep SQLAlchemy's default pool
+        return options
+    options.update(
+        poolclass=MeteredAsyncAdaptedQueuePool if use_async else MeteredQueuePool,
+        pool_size=pool_config['DB_POOL_SIZE'],
+        max_overflow=pool_config['DB_MAX_OVERFLOW'],
+        pool_timeout=pool_config['DB_POOL_TIMEOUT'],
+        pool_recycle=pool_config['DB_POOL_RECYCLE'],
+        pool_pre_ping=pool_config['DB_POOL_PRE_PING'],
+    )
+    if db_url.startswith('sqlite') and not use_async:
+        # Pooled SQLite connections are handed between request threads
+        options['connect_args'] = {'check_same_thread': False}
+    return options
+
+
+def install_sqlite_pragmas(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
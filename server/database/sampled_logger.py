@@ -0,0 +1,28 @@
+import os
+import random
+import logging
+
+# Fraction of INFO/DEBUG records kept from high-frequency read logs
+LOG_READ_SAMPLE_RATE = float(os.getenv('LOG_READ_SAMPLE_RATE', '0.01'))
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """Logger adapter that keeps `rate` of INFO and DEBUG records; warnings and errors always pass.
+
+    The decision is made in isEnabledFor, before the LogRecord is built, so a
+    dropped record costs one random() call.
+    """
+
+    dropped = 0
+
+    def __init__(self, logger, rate=LOG_READ_SAMPLE_RATE):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level):
+        if not self.logger.isEnabledFor(level):
+            return False
+        if level >= logging.WARNING or self.rate >= 1 or random.random() < self.rate:
+            return True
+        SampledLogger.dropped += 1
+        return False
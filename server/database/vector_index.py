@@ -0,0 +1,176 @@
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Deterministic local embedder: signed feature hashing of words and word bigrams."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = TOKEN_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                matrix[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return matrix
+
+
+class OpenAIEmbedder:
+    def __init__(self, model="text-embedding-ada-002", dim=1536):
+        self.model = model
+        self.dim = dim
+        self.name = f"{model}-{dim}"
+
+    def embed(self, texts):
+        import openai
+        from embeddings import get_embeddings_sync
+        return get_embeddings_sync(openai.Embedding.create, texts, model=self.model)
+
+
+def create_embedder(name=None):
+    name = name or os.getenv("KNOWLEDGE_EMBEDDER", "hashing")
+    if name == "hashing":
+        return HashingEmbedder()
+    if name == "openai":
+        return OpenAIEmbedder()
+    raise ValueError(f"Unknown knowledge embedder: {name}")
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Per-user append-only float32 matrices on disk, searched through np.memmap.
+
+    Each user has `user_<id>.f32` (unit-length vectors, row-major) and
+    `user_<id>.ids` (int64 knowledge ids, same row order) under a directory
+    named after the embedder, so switching embedders never mixes dimensions.
+    Several processes (API workers, job workers) write the same files, so
+    writers hold an exclusive flock on `user_<id>.lock`; readers reopen their
+    memmap whenever the files have changed.
+    """
+
+    def __init__(self, directory, embedder):
+        self.embedder = embedder
+        self.directory = os.path.join(directory, embedder.name)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._maps = {}
+
+    def _paths(self, user_id):
+        base = os.path.join(self.directory, f"user_{user_id}")
+        return base + ".f32", base + ".ids"
+
+    @contextmanager
+    def _writer(self, user_id):
+        lock_path = os.path.join(self.directory, f"user_{user_id}.lock")
+        with self._write_lock, open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rows(self, sizes):
+        vectors_size, ids_size = sizes
+        return min(vectors_size // (4 * self.embedder.dim), ids_size // 8)
+
+    def _append_locked(self, user_id, ids, vectors):
+        vectors_path, ids_path = self._paths(user_id)
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0 for path in (vectors_path, ids_path)]
+        rows = self._rows(sizes)
+        # A writer that died between the two files leaves one of them long; cut both back to whole rows
+        for path, size, expected in zip((vectors_path, ids_path), sizes, (rows * 4 * self.embedder.dim, rows * 8)):
+            if size != expected:
+                os.truncate(path, expected)
+        with open(vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(ids_path, "ab") as f:
+            f.write(np.asarray(ids, dtype=np.int64).tobytes())
+        with self._lock:
+            self._maps.pop(user_id, None)
+
+    def add(self, user_id, knowledge_id, content):
+        self.add_many(user_id, [knowledge_id], [content])
+
+    def add_many(self, user_id, knowledge_ids, contents):
+        if not knowledge_ids:
+            return
+        vectors = _normalize(self.embedder.embed(list(contents)))
+        with self._writer(user_id):
+            self._append_locked(user_id, knowledge_ids, vectors)
+
+    def rebuild(self, user_id, rows):
+        # rows: iterable of (knowledge_id, content); appends from other writers wait until the rebuild is done
+        with self._writer(user_id):
+            for path in self._paths(user_id):
+                if os.path.exists(path):
+                    os.remove(path)
+            ids, contents = [], []
+            for knowledge_id, content in rows:
+                ids.append(knowledge_id)
+                contents.append(content)
+                if len(ids) >= 512:
+                    self._append_locked(user_id, ids, _normalize(self.embedder.embed(contents)))
+                    ids, contents = [], []
+            if ids:
+                self._append_locked(user_id, ids, _normalize(self.embedder.embed(contents)))
+
+    def _load(self, user_id):
+        vectors_path, ids_path = self._paths(user_id)
+        try:
+            stats = (os.stat(vectors_path), os.stat(ids_path))
+        except FileNotFoundError:
+            return None
+        # Other processes append or rebuild behind our back; the inode and size tell us when
+        version = tuple((stat.st_ino, stat.st_size) for stat in stats)
+        with self._lock:
+            cached = self._maps.get(user_id)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            rows = self._rows([stat.st_size for stat in stats])
+            if rows == 0:
+                return None
+            vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.embedder.dim))
+            ids = np.fromfile(ids_path, dtype=np.int64, count=rows)
+            self._maps[user_id] = (version, (vectors, ids))
+            return vectors, ids
+
+    def search(self, user_id, query, top_k=10):
+        """Return [(knowledge_id, cosine_score)] best first."""
+        loaded = self._load(user_id) if top_k >= 1 else None
+        if loaded is None:
+            return []
+        vectors, ids = loaded
+        query_vector = _normalize(self.embedder.embed([query]))[0]
+        scores = vectors @ query_vector
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(ids[i]), float(scores[i])) for i in best]
@@ -2,10 +2,8 @@ import os
 import logging
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
-from database.database_manager import Base, User, Project, Task, Knowledge, DatabaseManager
+from database.database_manager import Base, User, Project, Task, Knowledge, get_db_manager
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -13,14 +11,14 @@ load_dotenv()
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///adapt_agent_gpt.db')
 
 def setup_database():
-    logger.info(f"Setting up database with URL: {DATABASE_URL}")
+    logger.info("Setting up database with URL: %s", DATABASE_URL)
     engine = create_engine(DATABASE_URL)
     Base.metadata.create_all(engine)
     logger.info("Database tables created successfully.")
 
 def create_initial_data():
     logger.info("Creating initial data")
-    db_manager = DatabaseManager()
+    db_manager = get_db_manager()
 
     # Create an admin user
     admin_user = db_manager.create_user(
@@ -28,7 +26,7 @@ def create_initial_data():
         email="admin@example.com",
         password_hash="hashed_password"  # In a real scenario, use a proper password hashing function
     )
-    logger.info(f"Admin user created with id: {admin_user.id}")
+    logger.info("Admin user created with id: %s", admin_user.id)
 
     # Create an initial project
     initial_project = db_manager.create_project(
@@ -36,7 +34,7 @@ def create_initial_data():
         description="This is your first project in ADAPT-Agent-GPT.",
         user_id=admin_user.id
     )
-    logger.info(f"Initial project created with id: {initial_project.id}")
+    logger.info("Initial project created with id: %s", initial_project.id)
 
     # Create an initial task
     initial_task = db_manager.create_task(
@@ -45,7 +43,7 @@ def create_initial_data():
         user_id=admin_user.id,
         project_id=initial_project.id
     )
-    logger.info(f"Initial task created with id: {initial_task.id}")
+    logger.info("Initial task created with id: %s", initial_task.id)
 
     # Create an initial knowledge entry
     initial_knowledge = db_manager.create_knowledge(
@@ -54,11 +52,12 @@ def create_initial_data():
         model="gpt-3.5-turbo",
         user_id=admin_user.id
     )
-    logger.info(f"Initial knowledge entry created with id: {initial_knowledge.id}")
+    logger.info("Initial knowledge entry created with id: %s", initial_knowledge.id)
 
     logger.info("Initial data created successfully.")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
     logger.info("Starting database setup")
     setup_database()
     create_initial_data()
@@ -0,0 +1,38 @@
+"""Composite indexes for the per-user and per-project read paths
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-09-20 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_projects_user_id_id', 'projects', ['user_id', 'id']),
+    ('ix_tasks_user_id_id', 'tasks', ['user_id', 'id']),
+    ('ix_tasks_project_id_user_id_id', 'tasks', ['project_id', 'user_id', 'id']),
+    ('ix_knowledge_user_id_id', 'knowledge', ['user_id', 'id']),
+    ('ix_project_knowledge_project_id_knowledge_id', 'project_knowledge', ['project_id', 'knowledge_id']),
+    ('ix_project_knowledge_knowledge_id_project_id', 'project_knowledge', ['knowledge_id', 'project_id']),
+)
+
+
+def upgrade():
+    # Databases created since these indexes joined the models already have them (create_all)
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,47 @@
+"""Knowledge content hash and MinHash LSH buckets for deduplication
+
+Existing rows keep a NULL content_hash, which the unique index allows any
+number of; `python -m server.dedup_knowledge` fingerprints them and merges
+the duplicates among them.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-10-04 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app's create_all may already have added knowledge_lsh_buckets, but never the column
+    inspector = sa.inspect(op.get_bind())
+    if 'content_hash' not in {column['name'] for column in inspector.get_columns('knowledge')}:
+        op.add_column('knowledge', sa.Column('content_hash', sa.String(64), nullable=True))
+    if 'ix_knowledge_user_id_content_hash' not in {index['name'] for index in inspector.get_indexes('knowledge')}:
+        op.create_index('ix_knowledge_user_id_content_hash', 'knowledge', ['user_id', 'content_hash'], unique=True)
+    if not inspector.has_table('knowledge_lsh_buckets'):
+        op.create_table(
+            'knowledge_lsh_buckets',
+            sa.Column('knowledge_id', sa.Integer, sa.ForeignKey('knowledge.id'), nullable=False),
+            sa.Column('user_id', sa.Integer, nullable=False),
+            sa.Column('band', sa.SmallInteger, nullable=False),
+            sa.Column('bucket', sa.BigInteger, nullable=False),
+        )
+        op.create_index('ix_knowledge_lsh_buckets_user_id_band_bucket', 'knowledge_lsh_buckets',
+                        ['user_id', 'band', 'bucket'])
+        op.create_index('ix_knowledge_lsh_buckets_knowledge_id', 'knowledge_lsh_buckets', ['knowledge_id'])
+
+
+def downgrade():
+    op.drop_table('knowledge_lsh_buckets')
+    op.drop_index('ix_knowledge_user_id_content_hash', table_name='knowledge')
+    with op.batch_alter_table('knowledge') as batch_op:
+        batch_op.drop_column('content_hash')
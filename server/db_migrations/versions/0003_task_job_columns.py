@@ -0,0 +1,50 @@
+"""Tag background job rows in tasks and track their heartbeat
+
+Job rows written before this revision are recognised by their job-only
+statuses; the unfinished ones can never complete (the queue was in memory),
+so they are marked Failed.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-10-11 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+LOST_JOB_DESCRIPTION = "Job lost: the server holding it stopped before it finished; submit it again"
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {column['name'] for column in inspector.get_columns('tasks')}
+    if 'job_kind' not in columns:
+        op.add_column('tasks', sa.Column('job_kind', sa.String(50), nullable=True))
+    if 'job_heartbeat_at' not in columns:
+        op.add_column('tasks', sa.Column('job_heartbeat_at', sa.DateTime, nullable=True))
+    if 'ix_tasks_job_heartbeat_at' not in {index['name'] for index in inspector.get_indexes('tasks')}:
+        op.create_index('ix_tasks_job_heartbeat_at', 'tasks', ['job_heartbeat_at'])
+
+    tasks = sa.table('tasks', sa.column('status', sa.String), sa.column('description', sa.Text),
+                     sa.column('job_kind', sa.String))
+    unfinished = sa.or_(tasks.c.status == 'Queued', tasks.c.status.like('Running%'),
+                        tasks.c.status.like('Retrying%'))
+    legacy = tasks.c.job_kind.is_(None)
+    op.execute(tasks.update().where(legacy, unfinished)
+               .values(status='Failed', description=LOST_JOB_DESCRIPTION, job_kind='unknown'))
+    op.execute(tasks.update().where(legacy, tasks.c.status == 'Failed', tasks.c.description.like('Job failed:%'))
+               .values(job_kind='unknown'))
+
+
+def downgrade():
+    op.drop_index('ix_tasks_job_heartbeat_at', table_name='tasks')
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('job_heartbeat_at')
+        batch_op.drop_column('job_kind')
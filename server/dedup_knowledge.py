@@ -0,0 +1,40 @@
+"""Merge duplicate knowledge entries stored before deduplication existed.
+
+Entries written since are deduplicated as they arrive; this job fingerprints
+the older ones (those without a content_hash) and merges exact and near
+duplicates into the oldest copy: tags are unioned and project links moved.
+It holds one batch in memory at a time and can be rerun or interrupted.
+Users can also run it on their own entries with POST /jobs/dedup_knowledge.
+
+Usage (from the repository root, after `alembic -c server/alembic.ini upgrade head`):
+    python -m server.dedup_knowledge
+    python -m server.dedup_knowledge --user-id 42 --batch-size 1000
+"""
+import argparse
+import logging
+
+from server.database.database_manager import get_db_manager
+from server.database.knowledge_dedup import KNOWLEDGE_DEDUP_BATCH_SIZE
+from server.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', type=int, default=None, help="Only this user's entries (default: everyone's)")
+    parser.add_argument('--batch-size', type=int, default=KNOWLEDGE_DEDUP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    configure_logging()
+    db_manager = get_db_manager()
+    try:
+        report = db_manager.dedup_knowledge(args.user_id, max(1, args.batch_size),
+                                            progress=lambda percent: logger.info("Dedup progress: %d%%", percent))
+    finally:
+        db_manager.close()
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
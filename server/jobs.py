@@ -0,0 +1,326 @@
+import os
+import random
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from server.database.cache import CACHE_BACKEND, create_result_cache, project_keys
+from server.database.database_manager import DatabaseManager
+from server.database.knowledge_dedup import KNOWLEDGE_DEDUP_BATCH_SIZE
+from server.logging_config import configure_logging, correlation_id
+from rate_limiter import BACKGROUND, LLM_BACKGROUND_SHARE, limit_process_share, set_llm_request_context
+
+logger = logging.getLogger(__name__)
+
+# Per API process: run_adapt_platform starts API_WORKERS of them, each with its own pool and queue
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_MAX_PER_USER = int(os.getenv('JOB_MAX_PER_USER', '2'))
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '1000'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '1'))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', '30'))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '10'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+
+# Dispatch order; within a lane jobs run first in, first out
+PRIORITIES = ('high', 'normal', 'low')
+
+# Job state lives in the Task.status column of the task row that represents the job. Job rows
+# have Task.job_kind set, which keeps them out of task listings, and a Task.job_heartbeat_at that
+# the API process holding the job refreshes; the queue itself is in memory, so a row whose
+# heartbeat stops (its process died or restarted) is failed by whichever process sweeps next.
+STATUS_QUEUED = 'Queued'
+STATUS_RUNNING = 'Running'
+STATUS_RETRYING = 'Retrying'
+STATUS_DONE = 'Done'
+STATUS_FAILED = 'Failed'
+FINAL_STATUSES = (STATUS_DONE, STATUS_FAILED)
+LOST_JOB_DESCRIPTION = "Job lost: the server holding it stopped before it finished; submit it again"
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for failures that retrying cannot fix."""
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+# Worker process side. Each worker keeps one event loop, agent and DatabaseManager
+# for its lifetime so connection pools are reused across jobs.
+_worker_state = {}
+
+
+def _worker_runtime():
+    if not _worker_state:
+        from agent import ADAPTAgent
+
+        configure_logging()
+        # Only background calls go out from here, and the API process's interactive queue cannot
+        # hold them back, so this process's schedulers keep to their share of the quota
+        limit_process_share(LLM_BACKGROUND_SHARE)
+        backend_factories = {}
+        if CACHE_BACKEND != 'redis':
+            # Only Redis is shared: API-side writes invalidate the API process's own memory or
+            # fake cache, so a private cache here could serve stale project data; go uncached
+            backend_factories['cache'] = lambda: create_result_cache('none')
+        db_manager = DatabaseManager(backend_factories=backend_factories)
+        _worker_state['loop'] = asyncio.new_event_loop()
+        _worker_state['db_manager'] = db_manager
+        _worker_state['agent'] = ADAPTAgent(db_manager=db_manager)
+    return _worker_state
+
+
+async def analyze_project_job(agent, payload, progress):
+    result = await agent.analyze_project(payload['project_id'], progress)
+    if result['analysis'] is None:
+        raise PermanentJobError(f"Project not found: {payload['project_id']}")
+    return result['analysis']
+
+
+async def create_task_job(agent, payload, progress):
+    # Saves the planned task like POST /agent/create_task; the job row itself stays out of task listings
+    result = await agent.create_task(payload['project_id'], payload['description'], payload['user_id'])
+    return f"Created task {result['task_id']}"
+
+
+async def dedup_knowledge_job(agent, payload, progress):
+    report = await agent._run_db(agent.db_manager.dedup_knowledge, payload['user_id'], KNOWLEDGE_DEDUP_BATCH_SIZE,
+                                 progress)
+    return (f"Scanned {report['scanned']} knowledge entries: merged {report['exact_duplicates']} exact and "
+            f"{report['near_duplicates']} near duplicates, kept {report['kept']}")
+
+
+JOB_HANDLERS = {
+    'analyze_project': analyze_project_job,
+    'create_task': create_task_job,
+    'dedup_knowledge': dedup_knowledge_job,
+}
+
+
+def run_job(kind, task_id, user_id, payload):
+    """Runs in a worker process; writes progress and the result to the job's task row."""
+    runtime = _worker_runtime()
+    db_manager = runtime['db_manager']
+    correlation_id.set(f"job-{task_id}")
+    # Jobs get the longer background deadline; the quota share comes from _worker_runtime
+    set_llm_request_context(user_id, BACKGROUND)
+
+    def progress(percent):
+        db_manager.update_task_status(task_id, f"{STATUS_RUNNING} {int(percent)}%")
+
+    db_manager.update_task_status(task_id, STATUS_RUNNING)
+    result = runtime['loop'].run_until_complete(JOB_HANDLERS[kind](runtime['agent'], payload, progress))
+    db_manager.update_task(task_id, status=STATUS_DONE, description=result, job_heartbeat_at=None)
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'user_id', 'project_id', 'payload', 'priority', 'attempts')
+
+    def __init__(self, job_id, kind, user_id, project_id, payload, priority):
+        self.id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.project_id = project_id
+        self.payload = payload
+        self.priority = priority
+        self.attempts = 0
+
+
+class JobQueue:
+    """Runs agent jobs on a process pool from the API's event loop.
+
+    Jobs wait in priority lanes; the dispatcher takes the oldest job from the
+    highest lane whose user is below `max_per_user` running jobs in this
+    queue; with several API processes the cap applies per process. Failed
+    attempts are retried with exponential backoff and full jitter, except for
+    PermanentJobError. Queued jobs are held in memory only.
+    """
+
+    def __init__(self, db_manager, workers=JOB_WORKERS, max_per_user=JOB_MAX_PER_USER, max_queued=JOB_MAX_QUEUED,
+                 max_attempts=JOB_MAX_ATTEMPTS, retry_base=JOB_RETRY_BASE_SECONDS, retry_max=JOB_RETRY_MAX_SECONDS,
+                 heartbeat_seconds=JOB_HEARTBEAT_SECONDS, lease_seconds=JOB_LEASE_SECONDS):
+        self.db_manager = db_manager
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.heartbeat_seconds = heartbeat_seconds
+        self.lease_seconds = lease_seconds
+        self.jobs = {}
+        self._lanes = {priority: deque() for priority in PRIORITIES}
+        self._running = {}
+        self._executor = None
+        self._dispatcher = None
+        self._heartbeat_task = None
+        self._wakeup = None
+        self._background = set()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.lost = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, not fork: the API process already runs driver and executor threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _ensure_started(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = self._spawn(self._dispatch())
+
+    def queued(self):
+        return sum(len(lane) for lane in self._lanes.values())
+
+    async def submit(self, kind, user_id, payload, title, project_id=None, priority='normal'):
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of: {', '.join(PRIORITIES)}")
+        if self.queued() >= self.max_queued:
+            raise JobQueueFull(f"{self.queued()} jobs already queued")
+        task = await self.db_manager.create_task(title, None, user_id, project_id, status=STATUS_QUEUED,
+                                                 job_kind=kind, job_heartbeat_at=datetime.utcnow())
+        job = self.jobs[task.id] = Job(task.id, kind, user_id, project_id, payload, priority)
+        self._enqueue(job)
+        logger.info("Job queued: id: %s, kind: %s, user_id: %s, priority: %s", job.id, kind, user_id, priority)
+        return job.id
+
+    def _enqueue(self, job):
+        self._lanes[job.priority].append(job)
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _next_job(self):
+        for priority in PRIORITIES:
+            lane = self._lanes[priority]
+            for i, job in enumerate(lane):
+                if self._running.get(job.user_id, 0) < self.max_per_user:
+                    del lane[i]
+                    return job
+        return None
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            job = self._next_job()
+            while job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                job = self._next_job()
+            self._running[job.user_id] = self._running.get(job.user_id, 0) + 1
+            self._spawn(self._run(job, slots))
+
+    def _backoff(self, attempts):
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempts - 1)))
+
+    async def _run(self, job, slots):
+        job.attempts += 1
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._get_executor(), run_job, job.kind, job.id, job.user_id, job.payload)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. OOM-killed); start a fresh pool for the retry
+                self._executor = None
+            await self._handle_failure(job, e)
+        else:
+            self.completed += 1
+            self.jobs.pop(job.id, None)
+            if job.project_id is not None:
+                # The worker wrote the row from another process; drop this process's cached copies
+                await self.db_manager.cache.ainvalidate(*project_keys(job.project_id))
+            logger.info("Job done: id: %s, attempts: %s", job.id, job.attempts)
+        finally:
+            self._running[job.user_id] -= 1
+            if not self._running[job.user_id]:
+                del self._running[job.user_id]
+            slots.release()
+            self._wakeup.set()
+
+    async def _handle_failure(self, job, error):
+        if isinstance(error, PermanentJobError) or job.attempts >= self.max_attempts:
+            self.failed += 1
+            self.jobs.pop(job.id, None)
+            logger.error("Job failed: id: %s, attempts: %s, error: %r", job.id, job.attempts, error)
+            await self.db_manager.update_task(job.id, status=STATUS_FAILED, description=f"Job failed: {error}",
+                                              job_heartbeat_at=None)
+            return
+        self.retried += 1
+        delay = self._backoff(job.attempts)
+        logger.warning("Job attempt failed, retrying in %.1fs: id: %s, error: %r", delay, job.id, error)
+        await self.db_manager.update_task_status(job.id, f"{STATUS_RETRYING} {job.attempts}/{self.max_attempts}")
+        asyncio.get_running_loop().call_later(delay, self._enqueue, job)
+
+    def start(self):
+        """Start the heartbeat; call from the API's startup, inside its event loop."""
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = self._spawn(self._heartbeat())
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                if self.jobs:
+                    await self.db_manager.touch_jobs(list(self.jobs))
+                lost = await self.db_manager.finish_stale_jobs(
+                    datetime.utcnow() - timedelta(seconds=self.lease_seconds), STATUS_FAILED, LOST_JOB_DESCRIPTION
+                )
+                if lost:
+                    self.lost += lost
+                    logger.warning("Failed %s jobs whose server stopped before they finished", lost)
+            except Exception:
+                logger.exception("Job heartbeat failed")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    def describe(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {}
+        return {'kind': job.kind, 'priority': job.priority, 'attempts': job.attempts}
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queued': {priority: len(lane) for priority, lane in self._lanes.items()},
+            'running': sum(self._running.values()),
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'lost': self.lost,
+        }
+
+    async def shutdown(self):
+        for task in list(self._background):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        from server.database.async_database_manager import get_async_db_manager
+
+        _job_queue = JobQueue(get_async_db_manager())
+    return _job_queue
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import contextvars
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+from fastapi.routing import APIRoute
+
+from server.database.sampled_logger import SampledLogger
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+CORRELATION_ID_HEADER = 'X-Request-ID'
+
+correlation_id = contextvars.ContextVar('correlation_id', default='-')
+
+# LogRecord attributes; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class CorrelationIdFilter(logging.Filter):
+    def filter(self, record):
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != 'correlation_id':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking the caller.
+
+    The message is merged here, on the calling thread, so arguments are read
+    while they are still valid; formatting and I/O happen on the listener thread.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room rather than fail when stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+_listener = None
+_handler = None
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Route the root logger through a queue to one stream handler on a background thread.
+
+    Safe to call more than once; only the first call takes effect.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _handler.addFilter(CorrelationIdFilter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_handler)
+    _listener = DrainingQueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
+
+
+def logging_stats():
+    return {
+        'queued': _handler.queue.qsize() if _listener is not None else 0,
+        'dropped_queue_full': _handler.dropped if _handler is not None else 0,
+        'dropped_sampled': SampledLogger.dropped,
+    }
+
+
+class CorrelationIdRoute(APIRoute):
+    """APIRoute that gives each request a correlation id for its log records.
+
+    The id comes from the X-Request-ID header when the client sends one and is
+    echoed back in the response.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def correlated_handler(request):
+            # Each request runs in its own task, so the value is not reset: a streaming
+            # body that runs after the handler returns still logs with it
+            correlation_id.set((request.headers.get(CORRELATION_ID_HEADER) or uuid4().hex)[:64])
+            response = await handler(request)
+            response.headers[CORRELATION_ID_HEADER] = correlation_id.get()
+            return response
+
+        return correlated_handler
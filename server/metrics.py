@@ -0,0 +1,272 @@
+import os
+import re
+import hmac
+import sys
+import time
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, GCCollector, Histogram,
+                               PlatformCollector, ProcessCollector, generate_latest)
+from sqlalchemy import event
+from starlette.exceptions import HTTPException
+
+from server.logging_config import CorrelationIdRoute
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '10'))
+PROFILER_SLOW_REQUEST_SECONDS = float(os.getenv('PROFILER_SLOW_REQUEST_SECONDS', '1'))
+PROFILER_MAX_PROFILES = int(os.getenv('PROFILER_MAX_PROFILES', '50'))
+# Bearer token for /metrics, /metrics/* and /debug/profile; unset, only loopback clients may read them
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LOOPBACK_HOSTS = ('127.0.0.1', '::1', 'localhost')
+
+# Same metric names as server/metrics.js so dashboards work for both servers
+registry = CollectorRegistry()
+ProcessCollector(registry=registry)
+PlatformCollector(registry=registry)
+GCCollector(registry=registry)
+
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Duration of HTTP requests in seconds', ['method', 'route', 'code'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), registry=registry,
+)
+http_requests_in_progress = Gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled', ['method', 'route'], registry=registry,
+)
+db_query_duration = Histogram(
+    'db_query_duration_seconds', 'Duration of database queries in seconds', ['operation', 'table'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5), registry=registry,
+)
+db_query_errors = Counter(
+    'db_query_errors_total', 'Database queries that raised an error', ['operation', 'table'], registry=registry,
+)
+llm_request_duration = Histogram(
+    'llm_request_duration_seconds', 'Duration of LLM calls in seconds', ['operation', 'model', 'outcome'],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60), registry=registry,
+)
+llm_tokens = Counter('llm_tokens', 'Tokens sent to (prompt) and received from (completion) the LLM',
+                     ['model', 'kind'], registry=registry)
+
+
+def render_metrics():
+    """Returns (body, content_type) in the Prometheus text format."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def require_metrics_access(request: Request):
+    """Dependency for the operational endpoints: they expose internals and must not be public.
+
+    With METRICS_TOKEN set, callers send it as a bearer token. Without it only
+    clients connecting from loopback are let in, which a reverse proxy on the
+    same host defeats, so set METRICS_TOKEN behind one.
+    """
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            raise HTTPException(status_code=401, detail="Metrics token required",
+                                headers={'WWW-Authenticate': 'Bearer'})
+    elif request.client is None or request.client.host not in LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Metrics are only served to local clients; set METRICS_TOKEN")
+
+
+def observe_llm_call(operation, model, outcome, seconds, prompt_tokens=0, completion_tokens=0):
+    llm_request_duration.labels(operation, model, outcome).observe(seconds)
+    if prompt_tokens:
+        llm_tokens.labels(model, 'prompt').inc(prompt_tokens)
+    if completion_tokens:
+        llm_tokens.labels(model, 'completion').inc(completion_tokens)
+
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+(?!ON\b)["`\[]?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _statement_labels(statement):
+    # SQLAlchemy reuses compiled statement strings, so this parses each distinct query once
+    words = statement.split(None, 1)
+    match = _TABLE.search(statement)
+    return (words[0].upper() if words else 'UNKNOWN'), (match.group(1).lower() if match else '')
+
+
+def install_query_metrics(engine):
+    """Time every statement run on `engine`.
+
+    Pass the Engine class to cover every engine in the process, including the
+    ones the database managers create lazily and the sync_engine under an
+    AsyncEngine.
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def observe_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        db_query_duration.labels(*_statement_labels(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def count_query_error(context):
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
+        db_query_errors.labels(*_statement_labels(context.statement or '')).inc()
+
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _is_app_code(filename):
+    return filename.startswith(_APP_ROOT) and 'site-packages' not in filename and filename != __file__
+
+
+def _fold(frame):
+    # Only stacks running application code are kept; idle event loops, pool
+    # workers and driver threads waiting for work would otherwise dominate
+    frames = []
+    in_app = False
+    while frame is not None:
+        code = frame.f_code
+        in_app = in_app or _is_app_code(code.co_filename)
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    if not in_app:
+        return None
+    return ';'.join(reversed(frames))
+
+
+class SlowRequestProfiler:
+    """Sampling profiler that keeps stacks of slow requests.
+
+    While requests are in flight a background thread samples every thread's
+    stack each `interval` seconds. When a request takes longer than
+    `slow_seconds`, the samples taken during it are kept as folded stacks
+    ("route;thread;file:function;... count"), the input format of
+    flamegraph.pl and speedscope. Only stacks that pass through application
+    code are sampled. Samples are per process, not per request, so concurrent
+    requests share attribution.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL_MS / 1000, slow_seconds=PROFILER_SLOW_REQUEST_SECONDS,
+                 max_profiles=PROFILER_MAX_PROFILES, window_seconds=60):
+        self.interval = interval
+        self.slow_seconds = slow_seconds
+        self.enabled = False
+        self.profiles = deque(maxlen=max_profiles)
+        self._samples = deque(maxlen=max(1, int(window_seconds / interval)))
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.enabled = True
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+        logger.info("Slow request profiler started: interval: %ss, threshold: %ss", self.interval, self.slow_seconds)
+
+    def stop(self):
+        self.enabled = False
+        self._wakeup.set()
+
+    def request_started(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active += 1
+        self._wakeup.set()
+
+    def request_finished(self, method, route, started, elapsed):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._active = max(0, self._active - 1)
+        if elapsed < self.slow_seconds:
+            return
+        ended = started + elapsed
+        stacks = {}
+        for sampled_at, sample in list(self._samples):
+            if started <= sampled_at <= ended:
+                for stack in sample:
+                    key = f"{method} {route};{stack}"
+                    stacks[key] = stacks.get(key, 0) + 1
+        self.profiles.append({'method': method, 'route': route, 'seconds': round(elapsed, 3),
+                              'finished_at': time.time(), 'samples': sum(stacks.values()), 'stacks': stacks})
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while self.enabled:
+            if not self._active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            sampled_at = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sample = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _fold(frame)
+                if stack is not None:
+                    sample.append(f"{names.get(ident, ident)};{stack}")
+            self._samples.append((sampled_at, sample))
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        """All kept profiles merged into one folded-stack text."""
+        merged = {}
+        for profile in list(self.profiles):
+            for stack, count in profile['stacks'].items():
+                merged[stack] = merged.get(stack, 0) + count
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def summary(self):
+        return [{key: value for key, value in profile.items() if key != 'stacks'} for profile in list(self.profiles)]
+
+
+profiler = SlowRequestProfiler()
+
+
+class InstrumentedRoute(CorrelationIdRoute):
+    """Route class that records latency, in-flight count and slow-request profiles per route template.
+
+    Latency runs until the handler returns its response, so for streaming
+    responses it measures time to the first byte, not the whole stream.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def instrumented_handler(request):
+            method = request.method
+            in_progress = http_requests_in_progress.labels(method, route)
+            in_progress.inc()
+            profiler.request_started()
+            started = time.perf_counter()
+            code = 500
+            try:
+                response = await handler(request)
+                code = response.status_code
+                return response
+            except HTTPException as e:
+                code = e.status_code
+                raise
+            except RequestValidationError:
+                code = 422
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                in_progress.dec()
+                http_request_duration.labels(method, route, str(code)).observe(elapsed)
+                profiler.request_finished(method, route, started, elapsed)
+
+        return instrumented_handler
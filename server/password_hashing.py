@@ -0,0 +1,83 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+# Per API process; with one API worker per core, one bcrypt process each already fills the CPUs
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '1'))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '64'))
+
+
+class PasswordHashingOverloaded(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _context(rounds):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# These run inside the worker processes, so they must stay importable module-level functions
+def _hash(password, rounds):
+    return _context(rounds).hash(password)
+
+
+def _verify(password, hashed_password):
+    return _context(BCRYPT_ROUNDS).verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so it never holds the event loop or the GIL.
+
+    At most `max_queue` calls may be queued or running; beyond that calls fail
+    fast with PasswordHashingOverloaded so the API can shed load with a 503.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, not fork: the API process already runs driver and executor threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _submit(self, func, *args):
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingOverloaded(f"{self.pending} password hashing calls already queued")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password):
+        return await self._submit(_hash, password, self.rounds)
+
+    async def verify(self, password, hashed_password):
+        return await self._submit(_verify, password, hashed_password)
+
+    def stats(self):
+        return {'workers': self.workers, 'pending': self.pending, 'max_queue': self.max_queue,
+                'rejected': self.rejected, 'rounds': self.rounds}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
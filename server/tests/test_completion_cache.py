@@ -0,0 +1,62 @@
+import pytest
+
+from completion_cache import CompletionCache, SQLiteCacheTier, make_cache_key
+from server.database.cache import create_result_cache
+
+
+def test_cache_key_ignores_surrounding_whitespace_only():
+    key = make_cache_key("m", [{"role": "user", "content": "def f():\n    return 1"}])
+    assert make_cache_key("m", [{"role": "user", "content": "\n def f():\n    return 1  \n"}]) == key
+    assert make_cache_key("m", [{"role": "user", "content": "def f():\n  return 1"}]) != key
+    assert make_cache_key("m", [{"role": "user", "content": "def f(): return 1"}]) != key
+
+
+def test_disk_tier_trims_to_max_entries_every_few_writes(tmp_path, monkeypatch):
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), max_entries=10, evict_every=5)
+    statements = []
+    monkeypatch.setattr(tier, "_evict", lambda now, evict=tier._evict: statements.append(now) or evict(now))
+    for i in range(23):
+        tier.set(f"k{i}", "v", expires_at=1e12, now=i)
+    assert len(statements) == 4
+    (count,) = tier._conn.execute("SELECT COUNT(*) FROM completion_cache").fetchone()
+    assert count == 13  # trimmed to 10 at write 20, plus three since
+    assert tier.get("k9", 100) is None and tier.get("k10", 100) == "v"
+    tier.close()
+
+
+def test_disk_tier_serves_entries_after_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = CompletionCache(path=path)
+    first.set("k", "answer")
+    first.disk.close()
+    second = CompletionCache(path=path)
+    assert second.get("k") == "answer" and second.stats()["disk_hits"] == 1
+    second.disk.close()
+
+
+@pytest.mark.parametrize('backend', ['memory', 'fake'])
+def test_clear_also_drops_shared_completions(backend):
+    shared = create_result_cache(backend)
+    shared.set('projects:user:1', ['kept'])
+    cache = CompletionCache(shared=shared)
+    cache.set("k", "answer")
+    # Another worker's cache sees the entry through the shared tier until it is cleared
+    assert CompletionCache(shared=shared).get("k") == "answer"
+    cache.clear()
+    assert CompletionCache(shared=shared).get("k") is None
+    assert shared.get('projects:user:1') == ['kept']
+
+
+def test_disk_hits_only_refresh_stale_access_times(tmp_path):
+    tier = SQLiteCacheTier(str(tmp_path / "cache.db"), touch_after=60)
+    tier.set("k", "v", expires_at=1e12, now=0)
+    statements = []
+    tier._conn.set_trace_callback(statements.append)
+
+    assert tier.get("k", 30) == "v"
+    assert not any(statement.startswith("UPDATE") for statement in statements)
+    assert tier.get("k", 90) == "v"
+    assert sum(statement.startswith("UPDATE") for statement in statements) == 1
+    (accessed_at,) = tier._conn.execute("SELECT accessed_at FROM completion_cache").fetchone()
+    assert accessed_at == 90
+    tier.close()
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from server.database.database_manager import CosmosDBManager, DatabaseManager
+from server.database.document_fakes import FakeCosmosContainer, FakeCosmosError, FakeMongoClient
+
+
+@pytest.fixture
+def mongo_manager():
+    client = FakeMongoClient()
+    manager = DatabaseManager(backend_factories={'mongo': lambda: client})
+    yield manager
+    manager.close()
+
+
+def test_stream_documents_applies_query_and_projection(mongo_manager):
+    mongo_manager.create_documents('notes', ({'n': i, 'body': 'x' * 10, 'even': i % 2 == 0} for i in range(10)))
+    streamed = list(mongo_manager.stream_documents('notes', {'even': True}, {'n': 1, '_id': 0}))
+    assert streamed == [{'n': i} for i in range(0, 10, 2)]
+
+
+def test_stream_documents_fetches_batch_size_documents_per_round_trip(mongo_manager, monkeypatch):
+    mongo_manager.create_documents('notes', ({'n': i} for i in range(25)))
+    collection = mongo_manager.mongo_db['notes']
+    find = collection.find
+    cursors = []
+
+    def recording_find(*args, **kwargs):
+        cursors.append(find(*args, **kwargs))
+        return cursors[-1]
+
+    monkeypatch.setattr(collection, 'find', recording_find)
+    stream = mongo_manager.stream_documents('notes', batch_size=10)
+    first = [next(stream) for _ in range(3)]
+    # Lazy: only the first batch has been requested so far
+    assert [d['n'] for d in first] == [0, 1, 2]
+    assert cursors[0].batch_size == 10 and cursors[0].batches_fetched == 1
+    rest = list(stream)
+    assert len(first) + len(rest) == 25
+    assert cursors[0].batches_fetched == 3
+    assert cursors[0].closed
+
+
+def test_stream_documents_closes_cursor_when_abandoned(mongo_manager, monkeypatch):
+    mongo_manager.create_documents('notes', ({'n': i} for i in range(5)))
+    collection = mongo_manager.mongo_db['notes']
+    find = collection.find
+    cursors = []
+    monkeypatch.setattr(collection, 'find', lambda *a, **k: cursors.append(find(*a, **k)) or cursors[-1])
+    stream = mongo_manager.stream_documents('notes')
+    next(stream)
+    stream.close()
+    assert cursors[0].closed
+
+
+def test_get_documents_matches_stream_documents(mongo_manager):
+    mongo_manager.create_documents('notes', ({'n': i} for i in range(7)))
+    assert mongo_manager.get_documents('notes', {'n': {'$gte': 3}}, {'_id': 0}) == [{'n': n} for n in range(3, 7)]
+
+
+def test_create_documents_reports_batches(mongo_manager):
+    report = mongo_manager.create_documents('notes', ({'n': i} for i in range(25)), batch_size=10)
+    assert report['inserted'] == 25
+    assert [batch['rows'] for batch in report['batches']] == [10, 10, 5]
+
+
+def test_bulk_write_documents_sums_counts_across_batches(mongo_manager):
+    from pymongo import DeleteOne, InsertOne, UpdateOne
+
+    mongo_manager.create_documents('notes', ({'_id': i, 'n': i} for i in range(5)))
+    operations = [InsertOne({'_id': 10, 'n': 10}), UpdateOne({'_id': 1}, {'$inc': {'n': 100}}),
+                  UpdateOne({'_id': 99}, {'$set': {'n': 0}}, upsert=True), DeleteOne({'_id': 2})]
+    report = mongo_manager.bulk_write_documents('notes', iter(operations), batch_size=3)
+    assert report == {'inserted': 1, 'matched': 1, 'modified': 1, 'deleted': 1, 'upserted': 1, 'batches': 2}
+    assert mongo_manager.get_documents('notes', {'_id': 1})[0]['n'] == 101
+
+
+@pytest.fixture
+def cosmos():
+    container = FakeCosmosContainer(partition_key_path='/user')
+    for i in range(23):
+        container.upsert_item({'id': str(i), 'user': f'u{i % 2}', 'v': i})
+    return CosmosDBManager(None, None, None, None, container=container)
+
+
+def test_query_page_follows_continuation_tokens_to_the_end(cosmos):
+    seen, continuation, pages = [], None, 0
+    while True:
+        items, continuation = cosmos.query_page('SELECT * FROM c', page_size=5, continuation=continuation)
+        seen.extend(item['id'] for item in items)
+        pages += 1
+        if continuation is None:
+            break
+    assert pages == 5
+    assert sorted(seen, key=int) == [str(i) for i in range(23)]
+
+
+def test_query_page_with_partition_key_and_parameters(cosmos):
+    items, continuation = cosmos.query_page('SELECT * FROM c WHERE c.v = @v', [{'name': '@v', 'value': 4}],
+                                            page_size=10, partition_key='u0')
+    assert [item['id'] for item in items] == ['4'] and continuation is None
+
+
+def test_stream_items_reads_every_page(cosmos):
+    assert len(list(cosmos.stream_items('SELECT * FROM c WHERE c.user = @u', [{'name': '@u', 'value': 'u1'}],
+                                        page_size=4))) == 11
+
+
+class SlowContainer(FakeCosmosContainer):
+    """Records peak concurrent upserts and fails the items listed in `fail_ids`."""
+
+    def __init__(self, fail_ids=()):
+        super().__init__()
+        self.fail_ids = set(fail_ids)
+        self.active = 0
+        self.peak = 0
+        self._active_lock = threading.Lock()
+
+    def upsert_item(self, body):
+        with self._active_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(0.005)
+            if body['id'] in self.fail_ids:
+                raise FakeCosmosError(429, 'Request rate is large')
+            return super().upsert_item(body)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+
+def test_upsert_items_bounds_concurrency_and_reports_partial_failures():
+    container = SlowContainer(fail_ids={'3', '17'})
+    cosmos = CosmosDBManager(None, None, None, None, container=container)
+    report = cosmos.upsert_items(({'id': str(i)} for i in range(40)), max_concurrency=4)
+    assert report['upserted'] == 38
+    assert sorted(item_id for item_id, _ in report['failed']) == ['17', '3']
+    assert all('Request rate is large' in error for _, error in report['failed'])
+    assert report['batches'] == 3  # batches of 4 x max_concurrency
+    assert 1 < container.peak <= 4
+    assert container.read_item('5', '5') == {'id': '5'}
+    with pytest.raises(FakeCosmosError):
+        container.read_item('3', '3')
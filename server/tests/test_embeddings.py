@@ -0,0 +1,53 @@
+import asyncio
+
+from embeddings import EmbeddingBatcher
+
+
+class SlowClient:
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    async def embedding(self, texts, model=None):
+        self.calls.append(list(texts))
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"data": [{"index": i, "embedding": [float(len(text)), 1.0]} for i, text in enumerate(texts)]}
+
+
+def test_concurrent_calls_share_one_upstream_request():
+    async def run():
+        client = SlowClient()
+        batcher = EmbeddingBatcher(client, max_wait=0.01)
+        vectors = await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 6)))
+        await batcher.aclose()
+        return client, vectors
+
+    client, vectors = asyncio.run(run())
+    assert len(client.calls) == 1
+    assert [vector[0] for vector in vectors] == [1, 2, 3, 4, 5]
+
+
+def test_upstream_errors_reach_every_caller():
+    async def run():
+        batcher = EmbeddingBatcher(SlowClient(error=RuntimeError("upstream 500")), max_wait=0.01)
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+        await batcher.aclose()
+        return results
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+
+def test_aclose_releases_callers_of_in_flight_and_queued_batches():
+    async def run():
+        batcher = EmbeddingBatcher(SlowClient(delay=10), max_batch_size=2, max_wait=0.01)
+        callers = [asyncio.ensure_future(batcher.embed(text)) for text in "abc"]
+        await asyncio.sleep(0.05)
+        assert len(batcher._flushes) == 2
+        await batcher.aclose()
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
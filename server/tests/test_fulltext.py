@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from server.database.fulltext import LikeFullTextIndex, SQLiteFullTextIndex
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE knowledge (id INTEGER PRIMARY KEY, user_id INTEGER, content TEXT, tags TEXT)"))
+        conn.execute(text("INSERT INTO knowledge (id, user_id, content, tags) VALUES (:id, 1, :content, :tags)"), [
+            {'id': 1, 'content': 'Deploy at 100% capacity', 'tags': 'ops,a_b'},
+            {'id': 2, 'content': 'Deploy at 100 capacity', 'tags': 'ops,axb'},
+            {'id': 3, 'content': 'DEPLOY notes', 'tags': 'ops'},
+        ])
+    return engine
+
+
+def search(index, engine, query, tags=None):
+    with engine.connect() as conn:
+        return [knowledge_id for knowledge_id, _ in index.search(conn, query, 1, tags)]
+
+
+def test_like_fallback_is_case_insensitive(engine):
+    assert search(LikeFullTextIndex(engine), engine, 'deploy') == [1, 2, 3]
+
+
+def test_like_fallback_treats_wildcards_literally(engine):
+    index = LikeFullTextIndex(engine)
+    assert search(index, engine, '100%') == [1]
+    assert search(index, engine, 'deploy', tags='a_b') == [1]
+    assert search(index, engine, 'deploy', tags='a%') == []
+
+
+def test_fts_tag_filter_treats_wildcards_literally(engine):
+    index = SQLiteFullTextIndex(engine)
+    index.setup()
+    assert sorted(search(index, engine, 'deploy', tags='a_b')) == [1]
+    assert sorted(search(index, engine, 'deploy', tags='ops')) == [1, 2, 3]
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from server.database.async_database_manager import AsyncDatabaseManager
+from server.database.cache import create_result_cache
+from server.database.database_manager import DatabaseManager
+from server.jobs import LOST_JOB_DESCRIPTION, STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, JobQueue
+
+
+@pytest.fixture
+def managers(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'jobs.db'}")
+    sync_manager = DatabaseManager(backend_factories={'cache': lambda: create_result_cache('none')})
+    user = sync_manager.create_user('u', 'u@example.com', 'x')
+    project = sync_manager.create_project('p', '', user.id)
+    yield sync_manager, user, project
+    sync_manager.close()
+
+
+def test_task_reads_leave_out_job_rows(managers):
+    db_manager, user, project = managers
+    task = db_manager.create_task('real task', 'd', user.id, project.id)
+    db_manager.create_task('Analyze project', None, user.id, project.id, status=STATUS_QUEUED,
+                           job_kind='analyze_project', job_heartbeat_at=datetime.utcnow())
+    assert [t.id for t in db_manager.get_tasks_by_user(user.id)] == [task.id]
+    assert [t.id for t in db_manager.get_tasks_by_project(project.id)] == [task.id]
+    assert [t['id'] for t in db_manager.list_tasks(user.id)[0]] == [task.id]
+    assert [t['id'] for t in db_manager.stream_tasks(user.id, project.id)] == [task.id]
+
+
+def test_heartbeat_keeps_held_jobs_and_fails_abandoned_ones(managers):
+    db_manager, user, project = managers
+
+    async def run():
+        async_manager = AsyncDatabaseManager(db_manager)
+        queue = JobQueue(async_manager, heartbeat_seconds=0.05, lease_seconds=30)
+        stale = datetime.utcnow() - timedelta(seconds=120)
+        # Left behind by a process that died, and one this queue still holds
+        abandoned = await async_manager.create_task('lost', None, user.id, status=STATUS_QUEUED,
+                                                    job_kind='create_task', job_heartbeat_at=stale)
+        held = await async_manager.create_task('held', None, user.id, status=STATUS_QUEUED,
+                                               job_kind='create_task', job_heartbeat_at=stale)
+        queue.jobs[held.id] = object()
+        queue.start()
+        await asyncio.sleep(0.2)
+        await queue.shutdown()
+        rows = {task_id: await async_manager.get_task_by_id(task_id) for task_id in (abandoned.id, held.id)}
+        await async_manager.dispose()
+        return queue, rows, abandoned.id, held.id
+
+    queue, rows, abandoned_id, held_id = asyncio.run(run())
+    assert rows[abandoned_id].status == STATUS_FAILED
+    assert rows[abandoned_id].description == LOST_JOB_DESCRIPTION
+    assert rows[abandoned_id].job_heartbeat_at is None
+    assert rows[held_id].status == STATUS_QUEUED
+    assert rows[held_id].job_heartbeat_at > datetime.utcnow() - timedelta(seconds=5)
+    assert queue.stats()['lost'] == 1
+
+
+def test_create_task_job_saves_a_task_the_user_can_list(managers, monkeypatch):
+    db_manager, user, project = managers
+    # Read again by the spawned worker process
+    monkeypatch.setenv('LLM_BACKEND', 'fake')
+    monkeypatch.setenv('CACHE_BACKEND', 'none')
+
+    async def run():
+        async_manager = AsyncDatabaseManager(db_manager)
+        queue = JobQueue(async_manager, workers=1)
+        job_id = await queue.submit('create_task', user.id, {'description': 'Write the release notes',
+                                                             'project_id': project.id, 'user_id': user.id},
+                                    'Write the release notes', project.id)
+        for _ in range(600):
+            job = await async_manager.get_task_by_id(job_id)
+            if job.status in (STATUS_DONE, STATUS_FAILED):
+                break
+            await asyncio.sleep(0.1)
+        await queue.shutdown()
+        await async_manager.dispose()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == STATUS_DONE, job.description
+    tasks = db_manager.list_tasks(user.id)[0]
+    assert [t['title'] for t in tasks] == ['Write the release notes']
+    assert job.description == f"Created task {tasks[0]['id']}"
+    assert [t.id for t in db_manager.get_tasks_by_project(project.id)] == [tasks[0]['id']]
+
+
+@pytest.mark.parametrize('backend', ['memory', 'fake'])
+def test_worker_processes_never_keep_a_private_result_cache(monkeypatch, tmp_path, backend):
+    from server import jobs
+
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'worker.db'}")
+    monkeypatch.setattr(jobs, 'CACHE_BACKEND', backend)
+    monkeypatch.setattr(jobs, '_worker_state', {})
+    monkeypatch.setattr(jobs, 'configure_logging', lambda: None)
+    runtime = jobs._worker_runtime()
+    try:
+        assert runtime['db_manager'].cache.stats()['backend'] == 'NullCacheBackend'
+    finally:
+        runtime['loop'].close()
+        runtime['db_manager'].close()
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from server.database.async_database_manager import AsyncDatabaseManager
+from server.database.cache import create_result_cache
+from server.database.database_manager import DatabaseManager
+
+NOTE = ("The deployment pipeline builds the docker image, runs the unit tests and pushes "
+        "the image to the registry before rolling out to staging")
+
+
+@pytest.fixture
+def db_manager(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'knowledge.db'}")
+    monkeypatch.setenv('KNOWLEDGE_INDEX_DIR', str(tmp_path / 'index'))
+    manager = DatabaseManager(backend_factories={'cache': lambda: create_result_cache('none')})
+    yield manager
+    manager.close()
+
+
+def test_store_knowledge_reports_exact_duplicates(db_manager):
+    user = db_manager.create_user('u', 'u@example.com', 'x')
+
+    async def run():
+        async_manager = AsyncDatabaseManager(db_manager)
+        first = await async_manager.store_knowledge(NOTE, 'ci', 'm', user.id)
+        again = await async_manager.store_knowledge(f"  {NOTE}\n", 'docker', 'm', user.id)
+        await async_manager.dispose()
+        return first, again
+
+    (entry, created), (duplicate, duplicate_created) = asyncio.run(run())
+    assert created and not duplicate_created
+    assert duplicate.id == entry.id and duplicate.tags == 'ci,docker'
+
+
+def test_near_duplicates_are_kept_by_default(db_manager):
+    user = db_manager.create_user('u', 'u@example.com', 'x')
+    entry, _ = db_manager.store_knowledge(NOTE, 'ci', 'm', user.id)
+    edited, created = db_manager.store_knowledge(NOTE.replace('unit tests', 'integration tests'), 'ci', 'm', user.id)
+    assert created and edited.id != entry.id
+    assert len(db_manager.get_knowledge_entries(user.id)) == 2
@@ -0,0 +1,29 @@
+import pytest
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+
+from server import metrics
+from server.metrics import require_metrics_access
+
+
+def make_request(host, authorization=None):
+    headers = [(b'authorization', authorization.encode())] if authorization else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/metrics', 'headers': headers, 'client': (host, 4000)})
+
+
+def test_without_a_token_only_loopback_clients_get_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', None)
+    require_metrics_access(make_request('127.0.0.1'))
+    require_metrics_access(make_request('::1'))
+    with pytest.raises(HTTPException) as error:
+        require_metrics_access(make_request('203.0.113.7'))
+    assert error.value.status_code == 403
+
+
+def test_with_a_token_every_client_must_send_it(monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', 's3cret')
+    require_metrics_access(make_request('203.0.113.7', 'Bearer s3cret'))
+    for authorization in (None, 'Bearer wrong', 's3cret'):
+        with pytest.raises(HTTPException) as error:
+            require_metrics_access(make_request('127.0.0.1', authorization))
+        assert error.value.status_code == 401
@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import prompt_budget
+from project_analyzer import ProjectAnalyzer, chunk_lines
+
+
+class CharEncoding:
+    """One token per character, much denser than the four-characters-per-token estimate."""
+
+    def encode(self, text):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def test_chunks_respect_the_budget_in_model_tokens(monkeypatch):
+    monkeypatch.setitem(prompt_budget._encodings, "test-model", CharEncoding())
+    lines = [f"- [Open] task {i}: {'x' * 30}" for i in range(40)] + ["- " + "y" * 500]
+    chunks = chunk_lines(lines, max_tokens=200, target_items=10 ** 6, model="test-model")
+    assert all(sum(len(line) for line in chunk) <= 200 for chunk in chunks)
+    assert len(chunks[-1][-1]) == 200
+    assert [line[:20] for chunk in chunks for line in chunk] == [line[:20] for line in lines]
+
+
+def test_single_prompt_check_counts_model_tokens(monkeypatch):
+    monkeypatch.setitem(prompt_budget._encodings, "test-model", CharEncoding())
+    prompts = []
+
+    async def complete(prompt):
+        prompts.append(prompt)
+        return "summary"
+
+    project = SimpleNamespace(name="p", description="")
+    tasks = [SimpleNamespace(status="Open", title=f"t{i}", description="d" * 40) for i in range(20)]
+    # About 1000 characters: 250 tokens by the estimate, but 1000 for this model
+    analyzer = ProjectAnalyzer(complete, model="test-model", single_prompt_tokens=500, chunk_tokens=300)
+    analysis, stats = asyncio.run(analyzer.analyze(project, tasks))
+    assert stats["mode"] == "map_reduce"
+    assert all(len(prompt) < 500 for prompt in prompts[:stats["chunks"]])
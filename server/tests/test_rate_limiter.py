@@ -0,0 +1,30 @@
+import asyncio
+
+from rate_limiter import RateLimitScheduler, TokenBucket
+
+
+def test_shared_scheduler_spends_only_its_share():
+    async def run():
+        scheduler = RateLimitScheduler(requests_per_minute=600, tokens_per_minute=60000, share=0.25)
+        await scheduler.acquire('m', 10)
+        stats = scheduler.stats()['m']
+        await scheduler.aclose()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats['requests_per_minute'] == 150
+    assert stats['tokens_per_minute'] == 15000
+
+
+def test_shared_bucket_leaves_the_interactive_reserve_untouched():
+    bucket = TokenBucket(10, 60, share=0.5)
+    # 600/minute over 6s bursts: half of the 60-unit burst stays with interactive callers
+    bucket.sync(600, 40, bucket.updated, 6)
+    assert bucket.rate == 5
+    assert bucket.available(bucket.updated) == 10
+    bucket.sync(600, 20, bucket.updated, 6)
+    assert bucket.wait_time(1, bucket.updated) > 0
+
+    full = TokenBucket(10, 60)
+    full.sync(600, 20, full.updated, 6)
+    assert full.available(full.updated) == 20
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from server.database.async_database_manager import AsyncDatabaseManager
+from server.database.cache import create_result_cache
+from server.database.database_manager import DatabaseManager
+
+
+@pytest.fixture
+def db_manager(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'cache.db'}")
+    manager = DatabaseManager(backend_factories={'cache': lambda: create_result_cache('memory')})
+    yield manager
+    manager.close()
+
+
+def test_moving_a_task_invalidates_both_projects(db_manager):
+    user = db_manager.create_user('u', 'u@example.com', 'x')
+    source = db_manager.create_project('source', '', user.id)
+    target = db_manager.create_project('target', '', user.id)
+    task = db_manager.create_task('t', 'd', user.id, source.id)
+    # Warm both cached task lists
+    assert [t.id for t in db_manager.get_tasks_by_project(source.id)] == [task.id]
+    assert db_manager.get_tasks_by_project(target.id) == []
+
+    db_manager.update_task(task.id, project_id=target.id)
+    assert db_manager.get_tasks_by_project(source.id) == []
+    assert [t.id for t in db_manager.get_tasks_by_project(target.id)] == [task.id]
+
+
+def test_async_update_task_invalidates_both_projects(db_manager):
+    user = db_manager.create_user('u', 'u@example.com', 'x')
+    source = db_manager.create_project('source', '', user.id)
+    target = db_manager.create_project('target', '', user.id)
+
+    async def run():
+        async_manager = AsyncDatabaseManager(db_manager)
+        task = await async_manager.create_task('t', 'd', user.id, source.id)
+        assert [t.id for t in await async_manager.get_tasks_by_project(source.id)] == [task.id]
+        assert await async_manager.get_tasks_by_project(target.id) == []
+        await async_manager.update_task(task.id, project_id=target.id)
+        result = (await async_manager.get_tasks_by_project(source.id),
+                  [t.id for t in await async_manager.get_tasks_by_project(target.id)])
+        await async_manager.dispose()
+        return task.id, result
+
+    task_id, (source_tasks, target_tasks) = asyncio.run(run())
+    assert source_tasks == [] and target_tasks == [task_id]
+
+
+def test_waiters_reload_when_the_loading_caller_is_cancelled():
+    cache = create_result_cache('memory')
+    loads = []
+
+    async def loader():
+        loads.append(len(loads))
+        await asyncio.sleep(0.05)
+        return f"value {len(loads)}"
+
+    async def run():
+        first = asyncio.ensure_future(cache.aget_or_set('key', loader))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.aget_or_set('key', loader))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, asyncio.CancelledError)
+    assert second == "value 2" and len(loads) == 2
+
+
+def test_waiters_see_the_loaders_error():
+    cache = create_result_cache('memory')
+
+    async def loader():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("database down")
+
+    async def run():
+        return await asyncio.gather(cache.aget_or_set('key', loader), cache.aget_or_set('key', loader),
+                                    return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(run())] == [RuntimeError, RuntimeError]
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'routes.db'}")
+    monkeypatch.setenv('LLM_BACKEND', 'fake')
+    from server import api_routes
+
+    app = FastAPI()
+    app.include_router(api_routes.router)
+    app.dependency_overrides[api_routes.get_current_user] = lambda: SimpleNamespace(id=1, username='u')
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('priority', ['high', 'urgent'])
+def test_clients_cannot_pick_the_high_lane(client, priority):
+    response = client.post('/jobs/create_task', params={'priority': priority},
+                           json={'title': 't', 'description': 'd', 'project_id': 1})
+    assert response.status_code == 422
+    assert [error['loc'] for error in response.json()['detail']] == [['query', 'priority']]
+
+
+@pytest.mark.parametrize('params', [{'limit': -1}, {'limit': 0}, {'limit': 201}, {'offset': -1}])
+def test_keyword_search_rejects_out_of_range_paging(client, params):
+    response = client.get('/knowledge/search', params={'q': 'x', 'mode': 'keyword', **params})
+    assert response.status_code == 422
@@ -0,0 +1,61 @@
+import multiprocessing
+
+import numpy as np
+
+from server.database.vector_index import HashingEmbedder, VectorIndex
+
+
+def _append_many(directory, worker, count):
+    index = VectorIndex(directory, HashingEmbedder())
+    for i in range(count):
+        knowledge_id = worker * 1000 + i
+        index.add(1, knowledge_id, f"note {knowledge_id}")
+
+
+def test_concurrent_writer_processes_keep_ids_and_vectors_aligned(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_append_many, args=(str(tmp_path), w, 40)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    index = VectorIndex(str(tmp_path), HashingEmbedder())
+    vectors, ids = index._load(1)
+    assert len(ids) == 160 and len(set(ids.tolist())) == 160
+    expected = index.embedder.embed([f"note {knowledge_id}" for knowledge_id in ids.tolist()])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    # Every row's vector is the embedding of the id stored in the same row
+    assert np.allclose(vectors, expected, atol=1e-6)
+
+
+def test_reader_sees_rows_written_by_another_instance(tmp_path):
+    reader = VectorIndex(str(tmp_path), HashingEmbedder())
+    writer = VectorIndex(str(tmp_path), HashingEmbedder())
+    writer.add(1, 1, "alpha beta")
+    assert [knowledge_id for knowledge_id, _ in reader.search(1, "alpha beta")] == [1]
+    writer.add(1, 2, "gamma delta")
+    assert reader.search(1, "gamma delta")[0][0] == 2
+    writer.rebuild(1, [(3, "epsilon")])
+    assert [knowledge_id for knowledge_id, _ in reader.search(1, "epsilon")] == [3]
+
+
+def test_append_repairs_a_torn_write(tmp_path):
+    index = VectorIndex(str(tmp_path), HashingEmbedder())
+    index.add(1, 1, "alpha")
+    vectors_path, _ = index._paths(1)
+    # A writer died after the vector and before its id
+    with open(vectors_path, "ab") as f:
+        f.write(np.zeros(index.embedder.dim, dtype=np.float32).tobytes())
+    index.add(1, 2, "beta")
+    vectors, ids = index._load(1)
+    assert ids.tolist() == [1, 2]
+    assert index.search(1, "beta")[0][0] == 2
+
+
+def test_search_with_non_positive_top_k_returns_nothing(tmp_path):
+    index = VectorIndex(str(tmp_path), HashingEmbedder())
+    index.add(1, 1, "alpha")
+    assert index.search(1, "alpha", top_k=0) == []
+    assert index.search(1, "alpha", top_k=-1) == []
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import random
+import signal
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUPERVISOR_BACKOFF_BASE_SECONDS = float(os.getenv('SUPERVISOR_BACKOFF_BASE_SECONDS', '1'))
+SUPERVISOR_BACKOFF_MAX_SECONDS = float(os.getenv('SUPERVISOR_BACKOFF_MAX_SECONDS', '60'))
+# A child that stays up this long is considered healthy again and its backoff resets
+SUPERVISOR_STABLE_SECONDS = float(os.getenv('SUPERVISOR_STABLE_SECONDS', '30'))
+SUPERVISOR_STOP_TIMEOUT_SECONDS = float(os.getenv('SUPERVISOR_STOP_TIMEOUT_SECONDS', '10'))
+SUPERVISOR_SAMPLE_SECONDS = float(os.getenv('SUPERVISOR_SAMPLE_SECONDS', '5'))
+
+
+class ProcessSampler:
+    """CPU and RSS of process trees, read from /proc (Linux); a child's tree covers e.g. npm's node process."""
+
+    def __init__(self):
+        self.available = os.path.isdir('/proc/self')
+        self._ticks_per_second = os.sysconf('SC_CLK_TCK') if self.available else 100
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if self.available else 4096
+        self._previous = None
+        self._previous_at = None
+
+    def _scan(self):
+        processes = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            # The command name may contain spaces and parentheses; fields follow the last ')'
+            fields = data[data.rindex(')') + 2:].split()
+            processes[int(entry)] = (int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21]))
+        return processes
+
+    def sample(self, root_pids):
+        """Returns {root_pid: {'cpu_percent', 'rss_bytes', 'processes'}}; cpu_percent is None on the first call."""
+        if not self.available:
+            return {}
+        now = time.monotonic()
+        processes = self._scan()
+        children = {}
+        for pid, (ppid, _, _) in processes.items():
+            children.setdefault(ppid, []).append(pid)
+        report = {}
+        for root in root_pids:
+            if root not in processes:
+                continue
+            tree, stack = [], [root]
+            while stack:
+                pid = stack.pop()
+                tree.append(pid)
+                stack.extend(children.get(pid, ()))
+            cpu_percent = None
+            if self._previous is not None:
+                # Processes not seen last time started since then, so all of their ticks are new
+                ticks = sum(processes[pid][1] - self._previous.get(pid, 0) for pid in tree)
+                cpu_percent = round(100 * ticks / self._ticks_per_second / (now - self._previous_at), 1)
+            report[root] = {
+                'cpu_percent': cpu_percent,
+                'rss_bytes': sum(processes[pid][2] for pid in tree) * self._page_size,
+                'processes': len(tree),
+            }
+        self._previous = {pid: ticks for pid, (_, ticks, _) in processes.items()}
+        self._previous_at = now
+        return report
+
+
+class Child:
+    """One supervised command, restarted with exponential backoff and full jitter when it exits."""
+
+    def __init__(self, name, argv, cwd=None, env=None, pass_fds=()):
+        self.name = name
+        self.argv = argv
+        self.cwd = cwd
+        self.env = env
+        self.pass_fds = pass_fds
+        self.process = None
+        self.state = 'pending'
+        self.started_at = None
+        self.restarts = 0
+        self.failures = 0
+        self.last_exit_code = None
+        self.usage = {}
+
+    def backoff(self):
+        return random.uniform(0, min(SUPERVISOR_BACKOFF_MAX_SECONDS, SUPERVISOR_BACKOFF_BASE_SECONDS * 2 ** self.failures))
+
+    def status(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'pid': self.process.pid if self.process is not None and self.state == 'running' else None,
+            'uptime_seconds': round(time.monotonic() - self.started_at, 1) if self.state == 'running' else None,
+            'restarts': self.restarts,
+            'last_exit_code': self.last_exit_code,
+            **self.usage,
+        }
+
+
+class Supervisor:
+    """Starts children, waits on them and on signals without polling, and restarts crashed children.
+
+    SIGINT/SIGTERM stop restarts and send SIGTERM to every child's process
+    group; groups still alive after `stop_timeout` get SIGKILL. GET /status on
+    `status_port` reports each child's state, restarts and CPU/RSS.
+    """
+
+    def __init__(self, children, status_host='127.0.0.1', status_port=None, stop_timeout=SUPERVISOR_STOP_TIMEOUT_SECONDS,
+                 sample_seconds=SUPERVISOR_SAMPLE_SECONDS):
+        self.children = children
+        self.status_host = status_host
+        self.status_port = status_port
+        self.stop_timeout = stop_timeout
+        self.sample_seconds = sample_seconds
+        self.sampler = ProcessSampler()
+        self._stopping = None
+
+    async def _spawn(self, child):
+        # A new session per child, so a signal to its group also reaches grandchildren (npm -> node)
+        child.process = await asyncio.create_subprocess_exec(
+            *child.argv, cwd=child.cwd, env=child.env, pass_fds=child.pass_fds, start_new_session=True,
+        )
+        child.state = 'running'
+        child.started_at = time.monotonic()
+        logger.info("Started %s: pid: %s", child.name, child.process.pid)
+
+    async def _supervise(self, child):
+        while not self._stopping.is_set():
+            try:
+                await self._spawn(child)
+            except OSError as e:
+                logger.error("Failed to start %s: %r", child.name, e)
+                child.last_exit_code = None
+            else:
+                child.last_exit_code = await child.process.wait()
+                if self._stopping.is_set():
+                    break
+                logger.warning("%s exited with code %s", child.name, child.last_exit_code)
+                if time.monotonic() - child.started_at >= SUPERVISOR_STABLE_SECONDS:
+                    child.failures = 0
+            delay = child.backoff()
+            child.failures += 1
+            child.restarts += 1
+            child.state = 'backoff'
+            logger.info("Restarting %s in %.1fs", child.name, delay)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        child.state = 'stopped'
+
+    def _signal_group(self, child, signum):
+        if child.process is None or child.process.returncode is not None:
+            return
+        try:
+            os.killpg(child.process.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    async def _stop_children(self):
+        for child in self.children:
+            self._signal_group(child, signal.SIGTERM)
+        running = [c.process.wait() for c in self.children if c.process is not None and c.process.returncode is None]
+        if running:
+            done, pending = await asyncio.wait([asyncio.ensure_future(w) for w in running], timeout=self.stop_timeout)
+            if pending:
+                logger.warning("%s children still running after %ss, killing them", len(pending), self.stop_timeout)
+                for child in self.children:
+                    self._signal_group(child, signal.SIGKILL)
+                await asyncio.wait(pending)
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            running = {c.process.pid: c for c in self.children if c.state == 'running'}
+            usage = await loop.run_in_executor(None, self.sampler.sample, list(running))
+            for child in self.children:
+                child.usage = usage.get(child.process.pid, {}) if child.state == 'running' else {}
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.sample_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def status(self):
+        return {'pid': os.getpid(), 'stopping': self._stopping.is_set(), 'children': [c.status() for c in self.children]}
+
+    async def _serve_status(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()).strip():
+                pass  # Headers are not needed
+            if len(request_line) >= 2 and request_line[0] == 'GET' and request_line[1] == '/status':
+                code, body = '200 OK', json.dumps(self.status())
+            else:
+                code, body = '404 Not Found', json.dumps({'detail': 'Not Found'})
+            payload = body.encode()
+            writer.write(f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + payload)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopping.set)
+        server = None
+        if self.status_port:
+            server = await asyncio.start_server(self._serve_status, self.status_host, self.status_port)
+            logger.info("Supervisor status on http://%s:%s/status", self.status_host, self.status_port)
+        tasks = [asyncio.ensure_future(self._supervise(child)) for child in self.children]
+        sampler = asyncio.ensure_future(self._sample())
+        await self._stopping.wait()
+        logger.info("Stopping %s children", len(self.children))
+        await self._stop_children()
+        await asyncio.gather(*tasks, sampler)
+        if server is not None:
+            server.close()
+            await server.wait_closed()